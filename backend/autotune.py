@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import platform
+import argparse
+import statistics
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TUNING_PATH = os.path.join(SCRIPT_DIR, "autotune.json")
+
+TUNING_VERSION = 1
+DEFAULT_TARGET_MS = 100.0       # p99 per-batch latency budget (frames arrive every 330 ms)
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8)
+DEFAULT_RESERVE_IO = 1          # cores kept free for Flask-SocketIO / OpenCV / decoding
+
+
+# -------------------------------
+# Cores + affinity
+# -------------------------------
+def allowed_cores():
+    """CPUs this process may run on (respects taskset / cgroup limits on Linux)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def pin_current_thread(cores):
+    """
+    Restrict the calling thread to `cores` (Linux only; a no-op elsewhere).
+    Threads it starts afterwards, including PyTorch's OpenMP team, inherit it.
+    """
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, cores)
+    return True
+
+
+def plan_cores(cores, inference_threads, reserve_io=DEFAULT_RESERVE_IO):
+    """
+    Split `cores` into (inference_cores, io_cores). Inference takes the last
+    cores (core 0 tends to get the interrupts), at least `reserve_io` stay for
+    I/O. On a machine too small to split, both sides share every core.
+    """
+    usable = max(1, len(cores) - reserve_io)
+    count = max(1, min(inference_threads, usable))
+    inference_cores, io_cores = cores[-count:], cores[:-count]
+    return inference_cores, io_cores or list(cores)
+
+
+def split_cores(cores, parts):
+    """`parts` disjoint, near-equal slices of `cores` (one per worker process)."""
+    if parts > len(cores):
+        return [[cores[i % len(cores)]] for i in range(parts)]
+    size, extra = divmod(len(cores), parts)
+    slices, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(cores[start:end])
+        start = end
+    return slices
+
+
+def apply_torch_threads(torch, threads):
+    """Intra-op threads; interop pool off (inference is one op graph at a time)."""
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # only settable before the first parallel op; harmless if already running
+
+
+# -------------------------------
+# Machine / model identity
+# -------------------------------
+def cpu_model():
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def machine_signature():
+    """What a saved tuning is only valid for: same CPUs, same PyTorch build."""
+    import torch
+
+    return {"cpu_model": cpu_model(), "cpu_count": os.cpu_count(), "allowed_cores": allowed_cores(),
+            "torch": torch.__version__}
+
+
+def model_backbone(model_path):
+    import torch
+    from train import infer_architecture
+
+    return infer_architecture(torch.load(model_path, map_location="cpu", weights_only=True))[0]
+
+
+# -------------------------------
+# Benchmark
+# -------------------------------
+def _bench_main(model_path, cores, threads, batch_sizes, iters, warmup):
+    """
+    Runs in a fresh spawned process, pinned before torch is imported, so
+    every thread count gets a cold OpenMP pool on exactly the cores it
+    would own in the server.
+    """
+    pin_current_thread(cores)
+
+    import torch
+    from train import load_drive_model
+
+    apply_torch_threads(torch, threads)
+    model = load_drive_model(model_path)
+
+    rows = []
+    with torch.inference_mode():
+        for batch_size in batch_sizes:
+            x = torch.rand(batch_size, 3, 224, 224)
+            times = []
+            for i in range(warmup + iters):
+                start = time.perf_counter()
+                model(x)
+                if i >= warmup:
+                    times.append((time.perf_counter() - start) * 1000)
+            times.sort()
+            p50 = statistics.median(times)
+            rows.append({
+                "threads": threads,
+                "batch": batch_size,
+                "p50_ms": round(p50, 2),
+                "p99_ms": round(times[int(0.99 * (len(times) - 1))], 2),
+                "frames_per_s": round(batch_size * 1000 / p50, 1),
+            })
+    return rows
+
+
+def candidate_threads(max_threads):
+    """1, 2, 4, ... up to max_threads (always included)."""
+    counts, n = [], 1
+    while n < max_threads:
+        counts.append(n)
+        n *= 2
+    counts.append(max_threads)
+    return counts
+
+
+def choose_config(results, target_ms):
+    """
+    Highest throughput whose p99 batch latency meets the target (fewest
+    threads on a tie, leaving more cores to I/O). If nothing meets it, the
+    lowest-p99 batch-1 configuration.
+    """
+    within = [r for r in results if r["p99_ms"] <= target_ms]
+    if within:
+        best = max(within, key=lambda r: (r["frames_per_s"], -r["threads"], -r["batch"]))
+        return best, True
+    single = [r for r in results if r["batch"] == 1] or results
+    return min(single, key=lambda r: (r["p99_ms"], r["threads"])), False
+
+
+def autotune(model_path, target_ms=DEFAULT_TARGET_MS, batch_sizes=DEFAULT_BATCH_SIZES,
+             reserve_io=DEFAULT_RESERVE_IO, max_threads=None, iters=30, warmup=5, quiet=False):
+    """Benchmark DriveModel over thread counts x batch sizes and pick a configuration."""
+    cores = allowed_cores()
+    usable = max(1, len(cores) - reserve_io)
+    max_threads = min(max_threads or usable, usable)
+
+    results = []
+    ctx = mp.get_context("spawn")
+    for threads in candidate_threads(max_threads):
+        inference_cores, _ = plan_cores(cores, threads, reserve_io)
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            rows = executor.submit(_bench_main, model_path, inference_cores, threads,
+                                   list(batch_sizes), iters, warmup).result()
+        results.extend(rows)
+        if not quiet:
+            for r in rows:
+                print(f"   threads={r['threads']:<3} batch={r['batch']:<3} p50 {r['p50_ms']:>8.2f} ms   "
+                      f"p99 {r['p99_ms']:>8.2f} ms   {r['frames_per_s']:>7.1f} frames/s")
+
+    best, meets_target = choose_config(results, target_ms)
+    inference_cores, io_cores = plan_cores(cores, best["threads"], reserve_io)
+    return {
+        "version": TUNING_VERSION,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": machine_signature(),
+        "backbone": model_backbone(model_path),
+        "target_ms": target_ms,
+        "meets_target": meets_target,
+        "intra_op_threads": best["threads"],
+        "interop_threads": 1,
+        "max_batch": best["batch"],
+        "reserve_io": reserve_io,
+        "inference_cores": inference_cores,
+        "io_cores": io_cores,
+        "expected": {k: best[k] for k in ("p50_ms", "p99_ms", "frames_per_s")},
+        "results": results,
+    }
+
+
+# -------------------------------
+# Saved tuning
+# -------------------------------
+def save_tuning(tuning, path=TUNING_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(tuning, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def load_tuning(path, model_path, target_ms=None):
+    """
+    (tuning, None) if the file at `path` still fits this machine, model
+    backbone and latency target, else (None, reason).
+    """
+    if not os.path.exists(path):
+        return None, "no saved tuning"
+    try:
+        with open(path, encoding="utf-8") as f:
+            tuning = json.load(f)
+    except (OSError, ValueError) as e:
+        return None, f"unreadable ({e})"
+
+    if tuning.get("version") != TUNING_VERSION:
+        return None, "old format"
+    if tuning.get("machine") != machine_signature():
+        return None, "tuned on another machine / CPU set / PyTorch"
+    if tuning.get("backbone") != model_backbone(model_path):
+        return None, f"tuned for a {tuning.get('backbone')} model"
+    if target_ms is not None and tuning.get("target_ms") != target_ms:
+        return None, f"tuned for a {tuning.get('target_ms')} ms target"
+    return tuning, None
+
+
+def describe(tuning):
+    expected = tuning["expected"]
+    status = "meets" if tuning["meets_target"] else "MISSES"
+    return (f"{tuning['intra_op_threads']} threads, batch ≤ {tuning['max_batch']}: "
+            f"p99 {expected['p99_ms']} ms ({status} {tuning['target_ms']} ms), "
+            f"{expected['frames_per_s']} frames/s; inference cores {tuning['inference_cores']}, "
+            f"I/O cores {tuning['io_cores']}")
+
+
+# =================================================================
+#                            MAIN
+# =================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark DriveModel thread counts / batch sizes on this machine and save the best fit")
+    parser.add_argument("--model", default=os.path.join(SCRIPT_DIR, "model.pth"))
+    parser.add_argument("--out", default=TUNING_PATH, help="where inferenceServer.py looks for it")
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS,
+                        help="p99 latency budget per batch")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--max-threads", type=int, help="largest intra-op thread count to try")
+    parser.add_argument("--reserve-io", type=int, default=DEFAULT_RESERVE_IO,
+                        help="cores kept free for server / display / decode threads")
+    parser.add_argument("--iters", type=int, default=30, help="timed forward passes per configuration")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"❌ model.pth not found at: {args.model}")
+        raise SystemExit(1)
+
+    print(f"⏱️  Tuning {args.model} on {len(allowed_cores())} cores (target p99 ≤ {args.target_ms} ms)...")
+    tuning = autotune(args.model, target_ms=args.target_ms, batch_sizes=args.batch_sizes,
+                      reserve_io=args.reserve_io, max_threads=args.max_threads, iters=args.iters)
+    save_tuning(tuning, args.out)
+
+    print(f"\n✅ {describe(tuning)}")
+    print(f"💾 Saved to {args.out}")
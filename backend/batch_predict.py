@@ -0,0 +1,243 @@
+import os
+import csv
+import json
+import time
+import argparse
+
+import torch
+from torch.utils.data import DataLoader, Subset
+
+from train import DriveDataset, load_drive_model
+from stabilizer import StreakStabilizer
+from frame_index import default_mapping_paths
+from prediction_cache import PredictionCache, content_key, model_fingerprint, CACHE_PATH, DEFAULT_MAX_ENTRIES
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "dataset"))
+FOLDERS = ["A", "B", "C", "D"]
+
+MOOD_LABELS = ["Relaxed", "Focused", "Stressed", "Tired", "Distracted"]
+SCENE_LABELS = ["City", "Highway", "Forest", "Garage", "Offroad", "Traffic"]
+
+CHANGE_THRESHOLD = 10  # same hysteresis as the server
+
+
+# -------------------------------
+# Metrics
+# -------------------------------
+def confusion_matrix(true, pred, num_classes):
+    """rows = true label, cols = predicted label"""
+    flat = torch.as_tensor(true) * num_classes + torch.as_tensor(pred)
+    return torch.bincount(flat, minlength=num_classes ** 2).reshape(num_classes, num_classes)
+
+
+def per_class_accuracy(cm, labels):
+    out = {}
+    for i, name in enumerate(labels):
+        support = cm[i].sum().item()
+        out[name] = {
+            "support": support,
+            "accuracy": round(cm[i, i].item() / support, 4) if support else None,
+        }
+    return out
+
+
+def format_confusion(cm, labels):
+    width = max(len(name) for name in labels) + 2
+    lines = [" " * width + "".join(f"{name[:8]:>9}" for name in labels)]
+    for i, name in enumerate(labels):
+        lines.append(f"{name:<{width}}" + "".join(f"{v:>9}" for v in cm[i].tolist()))
+    return "\n".join(lines)
+
+
+def stable_accuracy(pred, true, threshold=CHANGE_THRESHOLD):
+    """
+    Replays predictions (in frame order) through the server's N-in-a-row
+    hysteresis and scores the stable state against the labels.
+    Frames before the first stable state are not scored.
+    Returns (correct, scored).
+    """
+    tracker = StreakStabilizer(threshold)
+    correct = scored = 0
+    for p, t in zip(pred, true):
+        tracker.update(p)
+        if tracker.stable is not None:
+            scored += 1
+            correct += int(tracker.stable == t)
+    return correct, scored
+
+
+# -------------------------------
+# Prediction
+# -------------------------------
+def predict_mapping(model, mapping_path, batch_size, num_workers, cache=None, fingerprint=None):
+    """
+    Batched forward over one mapping file, in frame order.
+    With a PredictionCache, only frames this model hasn't seen are run.
+    """
+    frames_root = os.path.dirname(mapping_path)
+    dataset = DriveDataset(mapping_path, frames_root)
+    frames = [dataset.data.frame(i) for i in range(len(dataset))]
+
+    mood_logits = [None] * len(dataset)
+    scene_logits = [None] * len(dataset)
+    keys = [None] * len(dataset)
+    todo = list(range(len(dataset)))
+
+    if cache is not None:
+        todo = []
+        for i, frame in enumerate(frames):
+            with open(os.path.join(frames_root, frame), "rb") as f:
+                keys[i] = content_key(f.read())
+            hit = cache.get(fingerprint, keys[i])
+            if hit is None:
+                todo.append(i)
+            else:
+                mood_logits[i], scene_logits[i] = hit
+        print(f"   📦 {len(dataset) - len(todo)}/{len(dataset)} frames from the prediction cache")
+
+    if todo:
+        loader = DataLoader(Subset(dataset, todo), batch_size=batch_size, shuffle=False,
+                            num_workers=num_workers)
+        pos = 0
+        with torch.inference_mode():
+            for imgs, _, _ in loader:
+                batch_mood, batch_scene = model(imgs)
+                for m, s in zip(batch_mood.tolist(), batch_scene.tolist()):
+                    i = todo[pos]
+                    pos += 1
+                    mood_logits[i], scene_logits[i] = m, s
+                    if cache is not None:
+                        cache.put(fingerprint, keys[i], m, s)
+
+    mood_true = torch.from_numpy(dataset.data.mood_labels).long()
+    scene_true = torch.from_numpy(dataset.data.scene_labels).long()
+    # reshape: an empty mapping gives [0, C] rather than a 1-D tensor softmax(dim=1) rejects
+    mood_p = torch.tensor(mood_logits, dtype=torch.float32).reshape(-1, len(MOOD_LABELS)).softmax(dim=1)
+    scene_p = torch.tensor(scene_logits, dtype=torch.float32).reshape(-1, len(SCENE_LABELS)).softmax(dim=1)
+    return frames, mood_p, scene_p, mood_true, scene_true
+
+
+# =================================================================
+#                            MAIN
+# =================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-predict mapping files and score them against their labels")
+    parser.add_argument("mappings", nargs="*", help="mapping JSON files (default: A–D mapping_hardcoded.json)")
+    parser.add_argument("--model", default=os.path.join(SCRIPT_DIR, "model.pth"))
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count() or 0,
+                        help="DataLoader workers for decoding")
+    parser.add_argument("--threads", type=int, help="PyTorch intra-op threads")
+    parser.add_argument("--out-dir", default=os.path.join(SCRIPT_DIR, "eval"))
+    parser.add_argument("--no-cache", action="store_true", help="always run the model (skip the prediction cache)")
+    parser.add_argument("--cache-path", default=CACHE_PATH)
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="max cached frames (least recently used are evicted)")
+    args = parser.parse_args()
+
+    mapping_paths = args.mappings or default_mapping_paths(DATASET_ROOT, FOLDERS)
+    if not mapping_paths:
+        print("❌ No mapping files to evaluate")
+        raise SystemExit(1)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("🧠 Loading model...")
+    model = load_drive_model(args.model)
+
+    cache = fingerprint = None
+    if not args.no_cache:
+        cache = PredictionCache(args.cache_path, max_entries=args.cache_entries)
+        fingerprint = model_fingerprint(args.model)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    pred_path = os.path.join(args.out_dir, "predictions.csv")
+    metrics_path = os.path.join(args.out_dir, "metrics.json")
+
+    num_moods, num_scenes = len(MOOD_LABELS), len(SCENE_LABELS)
+    mood_cm = torch.zeros(num_moods, num_moods, dtype=torch.long)
+    scene_cm = torch.zeros(num_scenes, num_scenes, dtype=torch.long)
+    stable = {"mood": [0, 0], "scene": [0, 0]}  # [correct, scored]
+    total = 0
+
+    start = time.perf_counter()
+
+    with open(pred_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["mapping", "frame", "mood_pred", "scene_pred", "mood_label", "scene_label"]
+            + [f"p_mood_{name}" for name in MOOD_LABELS]
+            + [f"p_scene_{name}" for name in SCENE_LABELS]
+        )
+
+        for mapping_path in mapping_paths:
+            print(f"📂 {mapping_path}")
+            frames, mood_p, scene_p, mood_t, scene_t = predict_mapping(
+                model, mapping_path, args.batch_size, args.num_workers, cache, fingerprint)
+            if not frames:
+                print("   ⚠ No frames in this mapping, skipping")
+                continue
+
+            mood_pred = mood_p.argmax(dim=1)
+            scene_pred = scene_p.argmax(dim=1)
+
+            mood_cm += confusion_matrix(mood_t, mood_pred, num_moods)
+            scene_cm += confusion_matrix(scene_t, scene_pred, num_scenes)
+
+            # Hysteresis runs per recording, in frame order
+            for key, pred, true in (("mood", mood_pred, mood_t), ("scene", scene_pred, scene_t)):
+                correct, scored = stable_accuracy(pred.tolist(), true.tolist())
+                stable[key][0] += correct
+                stable[key][1] += scored
+
+            rows = zip(frames, mood_pred.tolist(), scene_pred.tolist(), mood_t.tolist(),
+                       scene_t.tolist(), mood_p.tolist(), scene_p.tolist())
+            for frame, mood_i, scene_i, mood_l, scene_l, mood_probs, scene_probs in rows:
+                writer.writerow(
+                    [mapping_path, frame, MOOD_LABELS[mood_i], SCENE_LABELS[scene_i],
+                     MOOD_LABELS[mood_l], SCENE_LABELS[scene_l]]
+                    + [f"{p:.5f}" for p in mood_probs]
+                    + [f"{p:.5f}" for p in scene_probs]
+                )
+
+            total += len(frames)
+
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        cache.close()
+
+    if total == 0:
+        print(f"❌ No frames in {', '.join(mapping_paths)}; nothing to score")
+        raise SystemExit(1)
+
+    metrics = {
+        "frames": total,
+        "seconds": round(elapsed, 2),
+        "frames_per_s": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+        "mood": {
+            "accuracy": round(mood_cm.diag().sum().item() / max(total, 1), 4),
+            "stable_accuracy": round(stable["mood"][0] / max(stable["mood"][1], 1), 4),
+            "per_class": per_class_accuracy(mood_cm, MOOD_LABELS),
+            "confusion": mood_cm.tolist(),
+        },
+        "scene": {
+            "accuracy": round(scene_cm.diag().sum().item() / max(total, 1), 4),
+            "stable_accuracy": round(stable["scene"][0] / max(stable["scene"][1], 1), 4),
+            "per_class": per_class_accuracy(scene_cm, SCENE_LABELS),
+            "confusion": scene_cm.tolist(),
+        },
+    }
+    with open(metrics_path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=4)
+
+    print(f"\n⏱️  {total} frames in {elapsed:.1f}s ({metrics['frames_per_s']} frames/s)")
+    for key, labels, cm in (("mood", MOOD_LABELS, mood_cm), ("scene", SCENE_LABELS, scene_cm)):
+        m = metrics[key]
+        print(f"\n=== {key.upper()} | accuracy {m['accuracy']:.3f} | "
+              f"stable (after {CHANGE_THRESHOLD}-in-a-row) {m['stable_accuracy']:.3f} ===")
+        print(format_confusion(cm, labels))
+
+    print(f"\n📄 Predictions: {pred_path}")
+    print(f"📄 Metrics: {metrics_path}")
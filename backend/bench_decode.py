@@ -0,0 +1,119 @@
+import os
+import time
+import argparse
+
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from image_io import load_rgb, MODEL_INPUT_SIZE
+from train import load_drive_model
+from frame_index import iter_mapping
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "dataset"))
+FOLDERS = ["A", "B", "C", "D"]
+
+tf = transforms.Compose([
+    transforms.Resize(MODEL_INPUT_SIZE),
+    transforms.ToTensor()
+])
+
+
+def collect_frames(mapping_paths, limit):
+    """(path, mood_label, scene_label) samples; labels are -1 where the mapping has none."""
+    frames = []
+    for mapping_path in mapping_paths:
+        frames_root = os.path.dirname(mapping_path)
+        frames.extend((os.path.join(frames_root, entry["frame"]),
+                       entry.get("mood_label", -1), entry.get("scene_label", -1))
+                      for entry in iter_mapping(mapping_path)
+                      if not entry.get("video_only"))   # no frame files to decode
+    # spread the sample over all recordings instead of taking the first N
+    step = max(1, len(frames) // limit)
+    return frames[::step][:limit]
+
+
+def accuracy(pred, labels):
+    """Accuracy over the labeled frames, or None if there are none."""
+    labeled = labels >= 0
+    if not labeled.any():
+        return None
+    return (pred[labeled] == labels[labeled]).float().mean().item()
+
+
+def time_path(paths, load):
+    tensors = []
+    start = time.perf_counter()
+    for path in paths:
+        tensors.append(tf(load(path)))
+    return time.perf_counter() - start, tensors
+
+
+# =================================================================
+#                            MAIN
+# =================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-resolution vs reduced (draft) JPEG decode for the 224x224 transform")
+    parser.add_argument("mappings", nargs="*", help="mapping JSON files (default: A–D mapping_hardcoded.json)")
+    parser.add_argument("--limit", type=int, default=500, help="frames to decode per path")
+    parser.add_argument("--model", help="model.pth; if given, also compare both paths' predictions "
+                                        "with each other and with the labels")
+    args = parser.parse_args()
+
+    mapping_paths = args.mappings or [
+        p for p in (os.path.join(DATASET_ROOT, f, "mapping_hardcoded.json") for f in FOLDERS)
+        if os.path.exists(p)
+    ]
+    frames = collect_frames(mapping_paths, args.limit)
+    paths = [path for path, _, _ in frames]
+    if not paths:
+        print("❌ No frames found")
+        raise SystemExit(1)
+
+    with Image.open(paths[0]) as probe:
+        print(f"📂 {len(paths)} frames, source resolution {probe.size[0]}x{probe.size[1]}")
+
+    # Warm the page cache so both paths read from memory
+    for path in paths:
+        with open(path, "rb") as f:
+            f.read()
+
+    full_s, full = time_path(paths, lambda p: Image.open(p).convert("RGB"))
+    draft_s, draft = time_path(paths, load_rgb)
+
+    full = torch.stack(full)
+    draft = torch.stack(draft)
+    pixel_diff = (full - draft).abs().mean().item() * 255
+
+    print(f"\n⏱️  full decode + resize:  {1000 * full_s / len(paths):.2f} ms/frame")
+    print(f"⏱️  draft decode + resize: {1000 * draft_s / len(paths):.2f} ms/frame "
+          f"({full_s / draft_s:.1f}x faster)")
+    print(f"🔍 mean abs pixel difference at 224x224: {pixel_diff:.2f} / 255")
+
+    if args.model:
+        model = load_drive_model(args.model)
+
+        def predict(batch):
+            with torch.inference_mode():
+                outs = [model(chunk) for chunk in batch.split(64)]
+            return (torch.cat([m for m, _ in outs]).argmax(dim=1),
+                    torch.cat([s for _, s in outs]).argmax(dim=1))
+
+        full_mood, full_scene = predict(full)
+        draft_mood, draft_scene = predict(draft)
+
+        print(f"🧠 prediction agreement: mood {(full_mood == draft_mood).float().mean().item():.2%}, "
+              f"scene {(full_scene == draft_scene).float().mean().item():.2%}")
+
+        # Accuracy impact: both paths scored against the mapping labels
+        mood_true = torch.tensor([mood for _, mood, _ in frames])
+        scene_true = torch.tensor([scene for _, _, scene in frames])
+        for key, true, full_pred, draft_pred in (("mood", mood_true, full_mood, draft_mood),
+                                                 ("scene", scene_true, full_scene, draft_scene)):
+            full_acc, draft_acc = accuracy(full_pred, true), accuracy(draft_pred, true)
+            if full_acc is None:
+                print(f"🎯 {key} accuracy: no labels in these mappings")
+                continue
+            print(f"🎯 {key} accuracy on {int((true >= 0).sum())} labeled frames: full {full_acc:.2%}, "
+                  f"draft {draft_acc:.2%} ({100 * (draft_acc - full_acc):+.2f} points)")
@@ -0,0 +1,84 @@
+import os
+import queue
+import random
+import threading
+
+import torch
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional here; only its RNG state is saved
+    np = None
+
+
+def clone_to_cpu(obj):
+    """Deep copy of nested dicts / lists / tuples with every tensor cloned to CPU."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: clone_to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(clone_to_cpu(v) for v in obj)
+    return obj
+
+
+def capture_rng_state():
+    state = {
+        "torch": torch.get_rng_state(),
+        "python": random.getstate(),
+    }
+    if np is not None:
+        state["numpy"] = np.random.get_state()
+    return state
+
+
+def restore_rng_state(state):
+    torch.set_rng_state(state["torch"])
+    random.setstate(state["python"])
+    if np is not None and "numpy" in state:
+        np.random.set_state(state["numpy"])
+
+
+class AsyncCheckpointer:
+    """
+    Writes checkpoints on a background thread.
+
+    save() snapshots the state to CPU on the calling thread (a memcpy, so the
+    training loop only pays for the copy) and hands it to the writer thread,
+    which torch.save()s to a temp file and atomically renames it over `path`.
+    At most one write is queued; if the disk is slower than the checkpoint
+    interval, save() waits for the previous write instead of piling up copies.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            state = self._queue.get()
+            if state is None:
+                break
+            try:
+                tmp_path = self.path + ".tmp"
+                torch.save(state, tmp_path)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def save(self, state):
+        if self._error is not None:
+            raise RuntimeError(f"previous checkpoint write failed: {self._error!r}")
+        self._queue.put(clone_to_cpu(state))
+
+    def close(self):
+        """Flush the pending write (if any) and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"checkpoint write failed: {self._error!r}")
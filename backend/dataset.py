@@ -1,47 +1,41 @@
-import json
 import os
 from torch.utils.data import Dataset
-from PIL import Image
 import torch
 
+from image_io import load_rgb, MODEL_INPUT_SIZE
+from frame_index import FrameIndex
+
 
 class DriveDataset(Dataset):
-    def __init__(self, mapping_path, transform=None):
+    def __init__(self, mapping_path, transform=None, decode_size=MODEL_INPUT_SIZE):
+        """
+        decode_size: smallest size the transform needs; JPEGs are decoded at
+        reduced resolution down to it (None = full-resolution decode).
+        """
         self.mapping_path = mapping_path
+        self.decode_size = decode_size
 
-        with open(mapping_path, "r") as f:
-            self.data = json.load(f)
+        self.data = FrameIndex.load(mapping_path)
+        self.data.check_complete()
+        self.data.check_frame_files()
 
         self.frames_root = os.path.dirname(mapping_path)
         self.transform = transform
 
+        # Telemetry + labels for every frame, built once; __getitem__ returns
+        # views into these instead of allocating new tensors per sample.
+        self.meta = torch.from_numpy(self.data.telemetry).float()
+        self.mood = torch.from_numpy(self.data.mood_labels).long()
+        self.scene = torch.from_numpy(self.data.scene_labels).long()
+
     def __len__(self):
         return len(self.data)
 
     def __getitem__(self, idx):
-        entry = self.data[idx]
-
         # Image
-        frame_file = os.path.join(self.frames_root, entry["frame"])
-        img = Image.open(frame_file).convert("RGB")
+        frame_file = os.path.join(self.frames_root, self.data.frame(idx))
+        img = load_rgb(frame_file, self.decode_size)
         if self.transform:
             img = self.transform(img)
 
-        # Metadata vector
-        m = entry["metadata"]
-        meta_vector = torch.tensor([
-            m["altitude"],
-            m["displaySpeed"],
-            m["pitchAngle"],
-            m["rollAngle"],
-            m["powerMeter"],
-            m["regenCapabilityPct"],
-            m["propulsionCapabilityPct"],
-            m["latitude"],
-            m["longitude"],
-        ], dtype=torch.float32)
-
-        mood_label = torch.tensor(entry["mood_label"], dtype=torch.long)
-        scene_label = torch.tensor(entry["scene_label"], dtype=torch.long)
-
-        return img, meta_vector, mood_label, scene_label
+        return img, self.meta[idx], self.mood[idx], self.scene[idx]
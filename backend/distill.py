@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import argparse
+import statistics
+
+import torch
+import torch.nn.functional as F
+from torch.utils.data import Dataset, DataLoader, ConcatDataset, Subset
+
+from train import DriveModel, DriveDataset, BACKBONES, load_drive_model
+from frame_index import default_mapping_paths, mapping_signature
+from model_registry import file_fingerprint
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "dataset"))
+FOLDERS = ["A", "B", "C", "D"]
+
+CACHE_VERSION = 1
+
+
+class IndexedDataset(Dataset):
+    """(index, img, mood, scene), so cached teacher logits can be looked up per sample."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        return (idx, *self.dataset[idx])
+
+
+# -------------------------------
+# Teacher logits
+# -------------------------------
+def teacher_signature(teacher_path, mapping_paths):
+    return {"teacher": list(file_fingerprint(teacher_path)), "mappings": mapping_signature(mapping_paths)}
+
+
+def compute_teacher_logits(teacher, dataset, batch_size=64, num_workers=0):
+    """Teacher mood / scene logits for every sample, in dataset order."""
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    moods, scenes = [], []
+    start = time.perf_counter()
+    with torch.inference_mode():
+        for _, imgs, _, _ in loader:
+            mood_logits, scene_logits = teacher(imgs)
+            moods.append(mood_logits)
+            scenes.append(scene_logits)
+    print(f"🧑‍🏫 Teacher logits for {len(dataset)} frames in {time.perf_counter() - start:.1f}s")
+    return torch.cat(moods), torch.cat(scenes)
+
+
+def load_or_build_teacher_cache(teacher, teacher_path, mapping_paths, dataset, cache_path, **kwargs):
+    signature = teacher_signature(teacher_path, mapping_paths)
+    if os.path.exists(cache_path):
+        cache = torch.load(cache_path)
+        if cache.get("version") == CACHE_VERSION and cache["signature"] == signature:
+            print(f"📦 Using teacher logits cache {cache_path}")
+            return cache["mood"], cache["scene"]
+        print("♻️  Teacher logits cache is stale, rebuilding")
+
+    mood, scene = compute_teacher_logits(teacher, dataset, **kwargs)
+    torch.save({"version": CACHE_VERSION, "signature": signature, "mood": mood, "scene": scene}, cache_path)
+    return mood, scene
+
+
+# -------------------------------
+# Distillation
+# -------------------------------
+def distillation_loss(student_logits, teacher_logits, labels, temperature, alpha):
+    """alpha * T² · KL(teacher_T || student_T) + (1 - alpha) * CE(labels)."""
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.softmax(teacher_logits / temperature, dim=1),
+        reduction="batchmean"
+    ) * temperature ** 2
+    hard = F.cross_entropy(student_logits, labels)
+    return alpha * soft + (1 - alpha) * hard
+
+
+def evaluate(student, teacher, loader, cached=None):
+    """Student/teacher agreement and both models' accuracy against the labels."""
+    student.eval()
+    counts = {key: {"agree": 0, "student": 0, "teacher": 0} for key in ("mood", "scene")}
+    total = 0
+    with torch.inference_mode():
+        for idx, imgs, mood, scene in loader:
+            s_mood, s_scene = student(imgs)
+            if cached is not None:
+                t_mood, t_scene = cached[0][idx], cached[1][idx]
+            else:
+                t_mood, t_scene = teacher(imgs)
+
+            for key, s, t, y in (("mood", s_mood, t_mood, mood), ("scene", s_scene, t_scene, scene)):
+                s_pred, t_pred = s.argmax(dim=1), t.argmax(dim=1)
+                counts[key]["agree"] += (s_pred == t_pred).sum().item()
+                counts[key]["student"] += (s_pred == y).sum().item()
+                counts[key]["teacher"] += (t_pred == y).sum().item()
+            total += len(idx)
+
+    return {
+        key: {
+            "agreement": round(c["agree"] / max(total, 1), 4),
+            "student_accuracy": round(c["student"] / max(total, 1), 4),
+            "teacher_accuracy": round(c["teacher"] / max(total, 1), 4),
+        }
+        for key, c in counts.items()
+    }
+
+
+def measure_latency(model, runs=50, warmup=5):
+    """Median / p90 single-frame forward time in ms (batch 1, 224x224, CPU)."""
+    model.eval()
+    x = torch.rand(1, 3, 224, 224)
+    times = []
+    with torch.inference_mode():
+        for i in range(warmup + runs):
+            start = time.perf_counter()
+            model(x)
+            if i >= warmup:
+                times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"p50_ms": round(statistics.median(times), 2), "p90_ms": round(times[int(0.9 * (len(times) - 1))], 2)}
+
+
+def count_params(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+# =================================================================
+#                            MAIN
+# =================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill model.pth into a smaller student DriveModel")
+    parser.add_argument("mappings", nargs="*", help="mapping JSON files (default: A–D mapping_hardcoded.json)")
+    parser.add_argument("--teacher", default=os.path.join(SCRIPT_DIR, "model.pth"))
+    parser.add_argument("--student", choices=BACKBONES, default="mobilenet_v3_small", help="student backbone")
+    parser.add_argument("--out", default=os.path.join(SCRIPT_DIR, "model_student.pth"))
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--temperature", type=float, default=4.0, help="softmax temperature for soft targets")
+    parser.add_argument("--alpha", type=float, default=0.9, help="weight of the teacher loss vs the label loss")
+    parser.add_argument("--val-fraction", type=float, default=0.1, help="held out for agreement / accuracy")
+    parser.add_argument("--num-workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--cache-teacher", action="store_true",
+                        help="run the teacher once and reuse its logits (cached on disk) every epoch")
+    parser.add_argument("--cache-path", default=os.path.join(SCRIPT_DIR, "teacher_logits.pt"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="write teacher/student latency + agreement JSON here")
+    args = parser.parse_args()
+
+    mapping_paths = args.mappings or default_mapping_paths(DATASET_ROOT, FOLDERS)
+    if not mapping_paths:
+        print("❌ No mapping files to train on")
+        raise SystemExit(1)
+
+    torch.manual_seed(args.seed)
+
+    print("🧠 Loading teacher...")
+    teacher = load_drive_model(args.teacher)
+    for p in teacher.parameters():
+        p.requires_grad_(False)
+
+    dataset = IndexedDataset(ConcatDataset([DriveDataset(p, os.path.dirname(p)) for p in mapping_paths]))
+    cached = None
+    if args.cache_teacher:
+        cached = load_or_build_teacher_cache(teacher, args.teacher, mapping_paths, dataset, args.cache_path,
+                                             batch_size=args.batch_size * 2, num_workers=args.num_workers)
+
+    # Fixed, seeded train / validation split
+    order = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(args.seed)).tolist()
+    num_val = int(len(dataset) * args.val_fraction)
+    val_set, train_set = Subset(dataset, order[:num_val]), Subset(dataset, order[num_val:])
+    train_loader = DataLoader(train_set, batch_size=args.batch_size, shuffle=True, num_workers=args.num_workers,
+                              generator=torch.Generator().manual_seed(args.seed))
+    val_loader = DataLoader(val_set or train_set, batch_size=args.batch_size * 2, num_workers=args.num_workers)
+
+    student = DriveModel(teacher.mood_head.out_features, teacher.scene_head.out_features, backbone=args.student)
+    optimizer = torch.optim.Adam(student.parameters(), lr=args.lr)
+    print(f"🎓 Student {args.student}: {count_params(student) / 1e6:.1f}M params "
+          f"(teacher {teacher.backbone}: {count_params(teacher) / 1e6:.1f}M)")
+
+    for epoch in range(args.epochs):
+        student.train()
+        running_loss = 0.0
+        start = time.perf_counter()
+
+        for idx, imgs, mood, scene in train_loader:
+            if cached is not None:
+                t_mood, t_scene = cached[0][idx], cached[1][idx]
+            else:
+                with torch.no_grad():
+                    t_mood, t_scene = teacher(imgs)
+
+            s_mood, s_scene = student(imgs)
+            loss = (distillation_loss(s_mood, t_mood, mood, args.temperature, args.alpha)
+                    + distillation_loss(s_scene, t_scene, scene, args.temperature, args.alpha))
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item()
+
+        metrics = evaluate(student, teacher, val_loader, cached)
+        print(f"Epoch {epoch + 1}/{args.epochs} - loss {running_loss / max(len(train_loader), 1):.4f} - "
+              f"agreement mood {metrics['mood']['agreement']:.3f} / scene {metrics['scene']['agreement']:.3f} "
+              f"({time.perf_counter() - start:.1f}s)")
+
+    torch.save(student.state_dict(), args.out)
+    print(f"\n✅ Student saved to {args.out}")
+    print(f"   Serve it by copying it over model.pth, or hot-swap: POST /admin/reload-model "
+          f'{{"path": "{os.path.basename(args.out)}"}}'
+          f" (from localhost, or with an X-Admin-Token header; the file must sit next to model.pth)")
+
+    # --------------------
+    # REPORT
+    # --------------------
+    report = {
+        "teacher": {"backbone": teacher.backbone, "params": count_params(teacher), "latency": measure_latency(teacher)},
+        "student": {"backbone": args.student, "params": count_params(student), "latency": measure_latency(student)},
+        "validation": evaluate(student, teacher, val_loader, cached),
+    }
+    t_lat, s_lat = report["teacher"]["latency"], report["student"]["latency"]
+    print(f"\n⏱️  Latency (batch 1, CPU): teacher {t_lat['p50_ms']} ms, student {s_lat['p50_ms']} ms "
+          f"({t_lat['p50_ms'] / max(s_lat['p50_ms'], 1e-6):.1f}x faster)")
+    for key, m in report["validation"].items():
+        print(f"=== {key.upper()}: agreement {m['agreement']:.3f}, accuracy student {m['student_accuracy']:.3f} "
+              f"vs teacher {m['teacher_accuracy']:.3f} ===")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"📄 Report written to {args.report}")
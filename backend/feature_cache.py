@@ -0,0 +1,157 @@
+import os
+import time
+import argparse
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, ConcatDataset
+from torchvision import transforms
+
+from dataset import DriveDataset
+from models import DriveModel
+from frame_index import default_mapping_paths, mapping_signature
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "dataset"))
+FOLDERS = ["A", "B", "C", "D"]
+
+CACHE_VERSION = 1
+
+tf = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor()
+])
+
+
+# -------------------------------
+# Build the cache
+# -------------------------------
+def build_cache(mapping_paths, cache_path, batch_size=64, num_workers=0):
+    """
+    Runs the frozen EfficientNet-B0 backbone once over every frame and stores:
+    - features: [N, 1280] pooled backbone output (float16)
+    - meta:     [N, 9] telemetry vectors (float32)
+    - mood / scene labels: [N] (int64)
+    """
+    dataset = ConcatDataset([DriveDataset(p, transform=tf) for p in mapping_paths])
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+
+    backbone = DriveModel().image_encoder.feature_extractor
+    backbone.eval()
+
+    features, metas, moods, scenes = [], [], [], []
+    start = time.perf_counter()
+
+    with torch.no_grad():
+        for imgs, meta, mood, scene in loader:
+            features.append(backbone(imgs).flatten(1).half())
+            metas.append(meta)
+            moods.append(mood)
+            scenes.append(scene)
+
+    cache = {
+        "version": CACHE_VERSION,
+        "mappings": mapping_signature(mapping_paths),
+        "features": torch.cat(features),
+        "meta": torch.cat(metas),
+        "mood": torch.cat(moods),
+        "scene": torch.cat(scenes),
+    }
+    torch.save(cache, cache_path)
+
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(cache_path) / 2**20
+    print(f"✅ Cached {len(dataset)} frames in {elapsed:.1f}s -> {cache_path} ({size_mb:.1f} MB)")
+    return cache
+
+
+def load_or_build_cache(mapping_paths, cache_path, rebuild=False, **build_kwargs):
+    if not rebuild and os.path.exists(cache_path):
+        cache = torch.load(cache_path)
+        if cache.get("version") == CACHE_VERSION and cache["mappings"] == mapping_signature(mapping_paths):
+            print(f"📦 Using feature cache {cache_path} ({len(cache['mood'])} frames)")
+            return cache
+        print("♻️  Feature cache is stale, rebuilding")
+
+    return build_cache(mapping_paths, cache_path, **build_kwargs)
+
+
+# -------------------------------
+# Head-only training
+# -------------------------------
+def train_heads(model, cache, epochs=20, batch_size=256, lr=1e-3):
+    """
+    Trains image_encoder.fc, meta_encoder, mood_head and scene_head from the
+    cached features; the backbone is never run.
+    """
+    head_params = (
+        list(model.image_encoder.fc.parameters())
+        + list(model.meta_encoder.parameters())
+        + list(model.mood_head.parameters())
+        + list(model.scene_head.parameters())
+    )
+    optimizer = torch.optim.Adam(head_params, lr=lr)
+    criterion = nn.CrossEntropyLoss()
+
+    features = cache["features"].float()
+    meta, mood, scene = cache["meta"], cache["mood"], cache["scene"]
+    n = len(mood)
+
+    model.train()
+    for epoch in range(epochs):
+        running_loss = 0.0
+        epoch_start = time.perf_counter()
+
+        for idx in torch.randperm(n).split(batch_size):
+            optimizer.zero_grad()
+
+            mood_logits, scene_logits = model.forward_from_pooled(features[idx], meta[idx])
+            loss = criterion(mood_logits, mood[idx]) + criterion(scene_logits, scene[idx])
+
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item()
+
+        elapsed = time.perf_counter() - epoch_start
+        print(f"Epoch {epoch} | Loss: {running_loss:.4f} | {n / elapsed:.0f} samples/s")
+
+    model.eval()
+    return model
+
+
+# =================================================================
+#                            MAIN
+# =================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cache frozen EfficientNet-B0 features once, then train only the heads of models.DriveModel")
+    parser.add_argument("mappings", nargs="*", help="mapping JSON files (default: A–D mapping_hardcoded.json)")
+    parser.add_argument("--cache", default=os.path.join(SCRIPT_DIR, "feature_cache.pt"))
+    parser.add_argument("--rebuild", action="store_true", help="ignore an existing cache")
+    parser.add_argument("--cache-only", action="store_true", help="build the cache and stop")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--num-workers", type=int, default=0, help="DataLoader workers while caching")
+    parser.add_argument("--num-scene-classes", type=int, default=6,
+                        help="hardcode_labels.py uses 6 scene classes (incl. traffic)")
+    parser.add_argument("--out", default=os.path.join(SCRIPT_DIR, "model_heads.pth"))
+    args = parser.parse_args()
+
+    mapping_paths = args.mappings or default_mapping_paths(DATASET_ROOT, FOLDERS)
+    if not mapping_paths:
+        print("❌ No mapping files to cache")
+        raise SystemExit(1)
+
+    cache = load_or_build_cache(mapping_paths, args.cache, rebuild=args.rebuild,
+                                num_workers=args.num_workers)
+    if args.cache_only:
+        raise SystemExit(0)
+
+    model = DriveModel(num_scene_classes=args.num_scene_classes)
+    train_heads(model, cache, epochs=args.epochs, batch_size=args.batch_size, lr=args.lr)
+
+    # Full state_dict (backbone untouched), loadable by models.DriveModel
+    torch.save(model.state_dict(), args.out)
+    print(f"✅ Saved model to {args.out}")
@@ -0,0 +1,316 @@
+import os
+import re
+import json
+import math
+import textwrap
+from array import array
+
+import numpy as np
+
+META_FIELDS = [
+    "altitude",
+    "displaySpeed",
+    "pitchAngle",
+    "rollAngle",
+    "powerMeter",
+    "regenCapabilityPct",
+    "propulsionCapabilityPct",
+    "latitude",
+    "longitude",
+]
+
+NO_LABEL = -1
+
+_SKIP_RE = re.compile(r"[\s,]*")
+_NUMBERED_RE = re.compile(r"^(.*?)(\d{1,18})(\D*)$")
+
+
+# -------------------------------
+# Streaming mapping I/O
+# -------------------------------
+def iter_mapping(mapping_path, chunk_size=1 << 20):
+    """
+    Yield the entries of a mapping JSON array one at a time.
+
+    The file is read in `chunk_size` pieces and decoded entry by entry, so
+    a multi-hour mapping never has to sit in memory as one big list.
+    """
+    decoder = json.JSONDecoder()
+    with open(mapping_path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+        started = False
+
+        while True:
+            pos = _SKIP_RE.match(buf, pos).end()
+            if pos == len(buf):
+                if eof:
+                    raise ValueError(f"{mapping_path}: unexpected end of file")
+                chunk = f.read(chunk_size)
+                buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                continue
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{mapping_path}: expected a JSON array")
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == "]":
+                return
+
+            try:
+                entry, end = decoder.raw_decode(buf, pos)
+                if end == len(buf) and not eof:
+                    raise ValueError("value may continue in the next chunk")
+            except ValueError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                continue
+
+            yield entry
+            pos = end
+
+
+def write_mapping(path, entries):
+    """
+    Write entries as a JSON array, one entry at a time, in the same layout
+    as json.dump(entries, f, indent=4). Goes through a temp file, so a
+    crash never leaves a half-written mapping behind. Returns the count.
+    """
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write("[\n" if count == 0 else ",\n")
+            f.write(textwrap.indent(json.dumps(entry, indent=4), "    "))
+            count += 1
+        f.write("\n]" if count else "[]")
+    os.replace(tmp_path, path)
+    return count
+
+
+# -------------------------------
+# Mapping files
+# -------------------------------
+def default_mapping_paths(dataset_root, folders):
+    """mapping_hardcoded.json of each dataset folder that has one (warns about the others)."""
+    paths = []
+    for folder in folders:
+        mapping_path = os.path.join(dataset_root, folder, "mapping_hardcoded.json")
+        if os.path.exists(mapping_path):
+            paths.append(mapping_path)
+        else:
+            print(f"⚠ Missing mapping_hardcoded.json for {folder}, skipping")
+    return paths
+
+
+def mapping_signature(mapping_paths):
+    """(path, mtime, size) per mapping file; caches built from them are stale when it changes."""
+    return [(os.path.abspath(p), os.path.getmtime(p), os.path.getsize(p)) for p in mapping_paths]
+
+
+# -------------------------------
+# Compact frame index
+# -------------------------------
+def _split_frame_name(name):
+    """"frame_0042.jpg" -> ("frame_{:04d}.jpg", 42); names without a number map to themselves."""
+    match = _NUMBERED_RE.match(name)
+    if match is None:
+        return name.replace("{", "{{").replace("}", "}}"), -1
+
+    prefix, digits, suffix = match.groups()
+    width = len(digits) if digits.startswith("0") and len(digits) > 1 else 0
+    template = (prefix.replace("{", "{{").replace("}", "}}")
+                + (f"{{:0{width}d}}" if width else "{:d}")
+                + suffix.replace("{", "{{").replace("}", "}}"))
+    return template, int(digits)
+
+
+def _as_float(value):
+    return math.nan if value is None else float(value)
+
+
+def _as_label(value):
+    return NO_LABEL if value is None else int(value)
+
+
+class FrameRecord:
+    """One row of a FrameIndex, readable like the mapping entry it came from."""
+
+    __slots__ = ("_index", "_i")
+
+    def __init__(self, index, i):
+        self._index = index
+        self._i = i
+
+    def __getitem__(self, key):
+        return self._index.field(self._i, key)
+
+    def __contains__(self, key):
+        try:
+            self._index.field(self._i, key)
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self._index.field(self._i, key)
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"FrameRecord({self._i}, {self._index.frame(self._i)!r})"
+
+
+class FrameIndex:
+    """
+    Frame paths, telemetry and labels of one mapping, stored column-wise.
+
+    Instead of one dict (plus a nested metadata dict) per frame, every field
+    lives in a flat numpy array:
+    - paths:       interned table of frame-name templates ("frame_{:d}.jpg")
+    - path_ids / frame_numbers: template + number per frame
+    - telemetry:   float64 [N, len(META_FIELDS)], NaN where a value is missing
+    - mood_labels / scene_labels: int8, NO_LABEL where unlabeled
+    - timestamps:  float64, NaN where the mapping has none
+
+    That is ~100 bytes per frame instead of well over a kilobyte. Metadata
+    fields outside META_FIELDS are not kept; the labelers, which must
+    preserve every field, stream the raw entries with iter_mapping() instead.
+
+    index[i] returns a FrameRecord that supports entry["frame"],
+    entry["metadata"], entry["mood_label"], ... like the original dicts.
+
+    Loading never fails on gaps (unlabeled mapping.json files are valid
+    input); consumers that need complete rows call check_complete() right
+    after loading, so a gap fails there and not as a -1 label / NaN deep
+    inside a loss or a confusion matrix.
+
+    video_only is True for mappings whose entries carry "video_only": true
+    (generate_dataset.py --format video): their frame_N.jpg names only
+    number the frames of the folder's video, no such files exist.
+    Consumers that open frame files call check_frame_files() first.
+    """
+
+    def __init__(self, entries=(), source="mapping"):
+        self.source = source
+        self.video_only = False
+        self.paths = []
+        template_ids = {}
+
+        path_ids = array("i")
+        frame_numbers = array("q")
+        telemetry = array("d")
+        mood_labels = array("b")
+        scene_labels = array("b")
+        timestamps = array("d")
+
+        for entry in entries:
+            template, number = _split_frame_name(entry["frame"])
+            template_id = template_ids.get(template)
+            if template_id is None:
+                template_id = template_ids[template] = len(self.paths)
+                self.paths.append(template)
+            path_ids.append(template_id)
+            frame_numbers.append(number)
+
+            m = entry.get("metadata") or {}
+            telemetry.extend(_as_float(m.get(field)) for field in META_FIELDS)
+            mood_labels.append(_as_label(entry.get("mood_label")))
+            scene_labels.append(_as_label(entry.get("scene_label")))
+            timestamps.append(_as_float(entry.get("timestamp")))
+            if entry.get("video_only"):
+                self.video_only = True
+
+        self.path_ids = np.array(path_ids, dtype=np.int32)
+        self.frame_numbers = np.array(frame_numbers, dtype=np.int64)
+        self.telemetry = np.array(telemetry, dtype=np.float64).reshape(-1, len(META_FIELDS))
+        self.mood_labels = np.array(mood_labels, dtype=np.int8)
+        self.scene_labels = np.array(scene_labels, dtype=np.int8)
+        self.timestamps = np.array(timestamps, dtype=np.float64)
+
+    @classmethod
+    def load(cls, mapping_path):
+        """Build the index straight from the file, streaming its entries."""
+        return cls(iter_mapping(mapping_path), source=mapping_path)
+
+    def check_complete(self, labels=True, telemetry=True):
+        """Raise ValueError if any frame lacks a mood / scene label or a META_FIELDS value."""
+        checks = []
+        if labels:
+            checks += [("mood_label", self.mood_labels == NO_LABEL),
+                       ("scene_label", self.scene_labels == NO_LABEL)]
+        if telemetry:
+            missing = np.isnan(self.telemetry)
+            checks += [(f"metadata.{field}", missing[:, k]) for k, field in enumerate(META_FIELDS)]
+
+        for name, missing in checks:
+            rows = np.flatnonzero(missing)
+            if len(rows):
+                raise ValueError(f"{self.source}: {len(rows)} frame(s) without {name} "
+                                 f"(first: {self.frame(int(rows[0]))})")
+
+    def check_frame_files(self):
+        """Raise ValueError if this is a video-only mapping (no frame_N.jpg files to open)."""
+        if self.video_only:
+            raise ValueError(f"{self.source}: video-only dataset, its frame_N.jpg files don't exist; "
+                             f"decode the folder's video instead (inferenceServer.py --video, "
+                             f"train.py --source video)")
+
+    # --------------------
+    # Columns
+    # --------------------
+    def frame(self, i):
+        return self.paths[self.path_ids[i]].format(int(self.frame_numbers[i]))
+
+    def metadata(self, i):
+        return {field: value for field, value in zip(META_FIELDS, self.telemetry[i].tolist())
+                if not math.isnan(value)}
+
+    def field(self, i, key):
+        if key == "frame":
+            return self.frame(i)
+        if key == "metadata":
+            return self.metadata(i)
+        if key in ("mood_label", "scene_label"):
+            label = int((self.mood_labels if key == "mood_label" else self.scene_labels)[i])
+            if label == NO_LABEL:
+                raise KeyError(key)
+            return label
+        if key == "timestamp":
+            timestamp = float(self.timestamps[i])
+            if math.isnan(timestamp):
+                raise KeyError(key)
+            return timestamp
+        raise KeyError(key)
+
+    @property
+    def nbytes(self):
+        arrays = (self.path_ids, self.frame_numbers, self.telemetry,
+                  self.mood_labels, self.scene_labels, self.timestamps)
+        return sum(a.nbytes for a in arrays) + sum(len(p) for p in self.paths)
+
+    # --------------------
+    # Sequence of records
+    # --------------------
+    def __len__(self):
+        return len(self.path_ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [FrameRecord(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return FrameRecord(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield FrameRecord(self, i)
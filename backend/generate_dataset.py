@@ -0,0 +1,310 @@
+import os
+import time
+import shutil
+import random
+import argparse
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from frame_index import write_mapping
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "dataset"))
+FOLDERS = ["A", "B", "C", "D"]
+
+MOOD_LABELS = ["Relaxed", "Focused", "Stressed", "Tired", "Distracted"]
+SCENE_LABELS = ["City", "Highway", "Forest", "Garage", "Offroad", "Traffic"]
+
+FRAME_INTERVAL = 0.33   # seconds between frames, as in the real recordings
+
+# Per-scene look (sky, ground) and typical speed range, so frames,
+# telemetry and labels stay loosely consistent with each other.
+SCENE_STYLE = {
+    0: ((150, 160, 170), (90, 90, 95), (25, 60)),      # City
+    1: ((120, 170, 230), (70, 70, 75), (85, 130)),     # Highway
+    2: ((140, 190, 140), (40, 110, 40), (35, 70)),     # Forest
+    3: ((60, 60, 65), (110, 110, 110), (0, 8)),        # Garage
+    4: ((170, 190, 210), (120, 90, 50), (5, 25)),      # Offroad
+    5: ((150, 155, 165), (80, 80, 85), (0, 20)),       # Traffic
+}
+
+
+# -------------------------------
+# Labels + telemetry
+# -------------------------------
+def iter_entries(folder, num_frames, seed):
+    """
+    Mapping entries for one synthetic recording, fully determined by
+    (seed, folder): labels come in segments of 20–200 frames, telemetry is
+    a smooth random walk that follows the current scene.
+    """
+    rng = random.Random(f"{seed}:{folder}")
+    lat, lon = 44.80 + rng.random() * 0.1, 20.45 + rng.random() * 0.1
+    altitude = 100.0 + rng.random() * 100
+    speed = 0.0
+    mood = scene = 0
+    left = 0
+
+    for i in range(num_frames):
+        if left == 0:
+            mood = rng.randrange(len(MOOD_LABELS))
+            scene = rng.randrange(len(SCENE_LABELS))
+            left = rng.randint(20, 200)
+        left -= 1
+
+        low, high = SCENE_STYLE[scene][2]
+        speed += (rng.uniform(low, high) - speed) * 0.2
+        heading = rng.uniform(-1.0, 1.0)
+        lat += speed * 1e-7 * heading
+        lon += speed * 1e-7 * (1 - abs(heading))
+        altitude += rng.gauss(0, 0.3)
+        bumpy = 6.0 if scene == 4 else 1.5
+        power = speed * 0.4 + rng.gauss(0, 3)
+
+        yield {
+            "frame": f"frame_{i}.jpg",
+            "metadata": {
+                "altitude": round(altitude, 2),
+                "displaySpeed": round(speed, 1),
+                "pitchAngle": round(rng.gauss(0, bumpy), 2),
+                "rollAngle": round(rng.gauss(0, bumpy), 2),
+                "powerMeter": round(power, 1),
+                "regenCapabilityPct": rng.randint(0, 100),
+                "propulsionCapabilityPct": rng.randint(50, 100),
+                "latitude": round(lat, 7),
+                "longitude": round(lon, 7),
+            },
+            "mood_label": mood,
+            "scene_label": scene,
+        }
+
+
+def without_labels(entries):
+    for entry in entries:
+        yield {k: v for k, v in entry.items() if k not in ("mood_label", "scene_label")}
+
+
+def video_only(entries):
+    """Mark entries of a --format video dataset: frame_N.jpg only numbers video frame N (FrameIndex.video_only)."""
+    for entry in entries:
+        yield {**entry, "video_only": True}
+
+
+# -------------------------------
+# Frames
+# -------------------------------
+def render_frame(scene, variant, size, seed):
+    """A road-scene-ish RGB image whose colours depend on the scene label."""
+    width, height = size
+    rng = np.random.default_rng([seed, scene, variant])
+    sky, ground, _ = SCENE_STYLE[scene]
+
+    horizon = int(height * rng.uniform(0.35, 0.55))
+    arr = np.empty((height, width, 3), dtype=np.float32)
+    arr[:horizon] = sky
+    arr[horizon:] = ground
+    arr += rng.normal(0, 12, size=(height // 8 + 1, width // 8 + 1, 3)).repeat(8, 0).repeat(8, 1)[:height, :width]
+
+    img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+    # road
+    mid = width // 2 + int(rng.integers(-width // 8, width // 8))
+    draw.polygon([(mid - width // 20, horizon), (mid + width // 20, horizon),
+                  (mid + width // 2, height), (mid - width // 2, height)], fill=(60, 60, 62))
+    # a few boxes (buildings / trees / cars)
+    for _ in range(int(rng.integers(3, 10))):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, horizon + 1))
+        w, h = int(rng.integers(width // 40, width // 8)), int(rng.integers(height // 20, height // 4))
+        draw.rectangle([x, y, x + w, y + h], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+    return img
+
+
+class FramePool:
+    """
+    `per_scene` pre-rendered JPEGs per scene. Frames are hard links into the
+    pool (copies where links aren't supported), so 1M+ frame datasets cost
+    almost no extra disk space or render time.
+    """
+
+    def __init__(self, pool_dir, per_scene, size, seed, quality):
+        self.pool_dir = pool_dir
+        self.per_scene = per_scene
+        self.size = size
+        self.seed = seed
+        self.quality = quality
+        os.makedirs(pool_dir, exist_ok=True)
+
+    def path(self, scene, variant):
+        path = os.path.join(self.pool_dir, f"scene{scene}_{variant:04d}.jpg")
+        if not os.path.exists(path):
+            render_frame(scene, variant, self.size, self.seed).save(path, quality=self.quality)
+        return path
+
+    def link(self, scene, frame_index, dst):
+        src = self.path(scene, frame_index % self.per_scene)
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+
+def write_frames(folder_path, entries, size, seed, quality, pool_size):
+    pool = None
+    if pool_size:
+        # one pool per look, so a re-run at another size / seed never reuses stale images
+        pool_dir = os.path.join(folder_path, f"_pool_{size[0]}x{size[1]}_s{seed}_q{quality}")
+        pool = FramePool(pool_dir, max(1, pool_size // len(SCENE_LABELS)), size, seed, quality)
+
+    for i, entry in enumerate(entries):
+        dst = os.path.join(folder_path, entry["frame"])
+        if pool is not None:
+            pool.link(entry["scene_label"], i, dst)
+        else:
+            render_frame(entry["scene_label"], i, size, seed).save(dst, quality=quality)
+        yield entry
+
+
+def write_video(video_path, entries, size, seed, pool_size):
+    """
+    {folder}.mp4 at 1 / FRAME_INTERVAL fps, one video frame per mapping
+    entry: entry frame_N.jpg is video frame N (N * 0.33 s), which is what
+    TelemetryIndex matches on (match="index" or "timestamp").
+    """
+    import cv2
+
+    fps = 1.0 / FRAME_INTERVAL   # frame N at N * 0.33 s, like mapping timestamps
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    if not writer.isOpened():
+        raise IOError(f"Could not open video writer: {video_path}")
+
+    per_scene = max(1, pool_size // len(SCENE_LABELS)) if pool_size else 0
+    cache = {}
+    try:
+        for i, entry in enumerate(entries):
+            scene = entry["scene_label"]
+            if per_scene:
+                key = (scene, i % per_scene)
+                if key not in cache:
+                    cache[key] = cv2.cvtColor(np.asarray(render_frame(scene, key[1], size, seed)),
+                                              cv2.COLOR_RGB2BGR)
+                frame = cache[key]
+            else:
+                frame = cv2.cvtColor(np.asarray(render_frame(scene, i, size, seed)), cv2.COLOR_RGB2BGR)
+            writer.write(frame)
+            yield entry
+    finally:
+        writer.release()
+
+
+# -------------------------------
+# Replay file + model
+# -------------------------------
+def write_replay(path, entries):
+    """E_metadata.txt-style lines: `121 | frame_121.jpg -> Relaxed / City`."""
+    with open(path, "w", encoding="utf-8") as f:
+        for i, entry in enumerate(entries):
+            f.write(f"{i:03d} | {entry['frame']} -> {MOOD_LABELS[entry['mood_label']]} / "
+                    f"{SCENE_LABELS[entry['scene_label']]}\n")
+
+
+def existing_outputs(folder_path, folder, fmt):
+    """Files this run would overwrite in one dataset folder (real recordings included)."""
+    names = ["mapping_hardcoded.json", "mapping.json"]
+    if fmt in ("frames", "both"):
+        names.append("frame_0.jpg")
+    if fmt in ("video", "both"):
+        names.append(f"{folder}.mp4")
+    return [name for name in names if os.path.exists(os.path.join(folder_path, name))]
+
+
+def write_model(path, seed):
+    """Randomly initialised DriveModel checkpoint (same format train.py saves)."""
+    import torch
+    from train import DriveModel
+
+    torch.manual_seed(seed)
+    torch.save(DriveModel().state_dict(), path)
+
+
+# =================================================================
+#                            MAIN
+# =================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic Drive Sense dataset")
+    parser.add_argument("--frames", type=int, default=1000, help="frames per folder")
+    parser.add_argument("--folders", nargs="*", default=FOLDERS)
+    parser.add_argument("--out", default=DATASET_ROOT, help="dataset root (default: ../dataset)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--format", choices=["frames", "video", "both", "none"], default="frames",
+                        help="write frame_N.jpg files, a video per folder, both, or only the mappings. "
+                             "video: no frame files, the mapping entries are marked video_only and "
+                             "frame_N.jpg means video frame N (serve with --video, train with --source video)")
+    parser.add_argument("--pool-size", type=int, default=120,
+                        help="distinct images, shared by hard links / reused video frames "
+                             "(0 = render every frame)")
+    parser.add_argument("--quality", type=int, default=85, help="JPEG quality")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", default=os.path.join(SCRIPT_DIR, "E_metadata.txt"),
+                        help="E_metadata.txt-style replay file (from the first folder)")
+    parser.add_argument("--model", default=os.path.join(SCRIPT_DIR, "model.pth"),
+                        help="where to write a randomly initialised model checkpoint")
+    parser.add_argument("--no-model", action="store_true", help="don't write a model checkpoint")
+    parser.add_argument("--force", action="store_true",
+                        help="overwrite existing mappings / frames / videos, model and replay file")
+    args = parser.parse_args()
+
+    size = (args.width, args.height)
+    start = time.perf_counter()
+
+    # Never clobber a real (or earlier) dataset by accident
+    conflicts = {folder: existing_outputs(os.path.join(args.out, folder), folder, args.format)
+                 for folder in args.folders}
+    conflicts = {folder: names for folder, names in conflicts.items() if names}
+    if conflicts and not args.force:
+        for folder, names in conflicts.items():
+            print(f"❌ {os.path.join(args.out, folder)} already has {', '.join(names)}")
+        print("   Use --out for a separate dataset root, or --force to overwrite")
+        raise SystemExit(1)
+
+    for folder in args.folders:
+        folder_path = os.path.join(args.out, folder)
+        os.makedirs(folder_path, exist_ok=True)
+        folder_start = time.perf_counter()
+
+        entries = iter_entries(folder, args.frames, args.seed)
+        if args.format in ("frames", "both"):
+            entries = write_frames(folder_path, entries, size, args.seed, args.quality, args.pool_size)
+        if args.format in ("video", "both"):
+            entries = write_video(os.path.join(folder_path, f"{folder}.mp4"), entries, size, args.seed,
+                                  args.pool_size)
+
+        raw_entries = without_labels(iter_entries(folder, args.frames, args.seed))
+        if args.format == "video":
+            entries, raw_entries = video_only(entries), video_only(raw_entries)
+
+        # Frames / video are written while the labeled mapping streams out
+        count = write_mapping(os.path.join(folder_path, "mapping_hardcoded.json"), entries)
+        # Same entries again (deterministic), without labels, like a raw recording
+        write_mapping(os.path.join(folder_path, "mapping.json"), raw_entries)
+
+        elapsed = time.perf_counter() - folder_start
+        print(f"✅ {folder}: {count} frames in {elapsed:.1f}s → {folder_path}")
+
+    if os.path.exists(args.replay) and not args.force:
+        print(f"⚠ {args.replay} exists, not overwriting the replay file (use --force)")
+    elif args.folders:
+        write_replay(args.replay, iter_entries(args.folders[0], args.frames, args.seed))
+        print(f"✅ Wrote replay file: {args.replay}")
+
+    if not args.no_model:
+        if os.path.exists(args.model) and not args.force:
+            print(f"⚠ {args.model} exists, not overwriting the model (use --force)")
+        else:
+            write_model(args.model, args.seed)
+            print(f"✅ Wrote randomly initialised model: {args.model}")
+
+    print(f"\n🎉 Done in {time.perf_counter() - start:.1f}s")
@@ -1,6 +1,7 @@
-import json
 import os
 
+from frame_index import iter_mapping, write_mapping
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATASET_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "dataset"))
 
@@ -72,9 +73,6 @@ def apply_labels(folder):
         print(f"⚠ Skipping {folder}: mapping.json not found")
         return
 
-    with open(mapping_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
     # Build a dict: frame index → (scene_label, mood_label)
     label_map = {}
 
@@ -86,21 +84,22 @@ def apply_labels(folder):
             label_map[idx] = (scene_label, mood_label)
 
     # Apply labels
-    for entry in data:
-        frame_name = entry["frame"]       # "frame_123.jpg"
-        frame_index = int(frame_name.split("_")[1].split(".")[0])
-
-        if frame_index in label_map:
-            scene_label, mood_label = label_map[frame_index]
-            entry["scene_label"] = scene_label
-            entry["mood_label"] = mood_label
-        else:
-            print(f"⚠ Frame {frame_index} in {folder} has no assigned label!")
-
-    # Save new file
+    def labeled_entries():
+        for entry in iter_mapping(mapping_path):
+            frame_name = entry["frame"]       # "frame_123.jpg"
+            frame_index = int(frame_name.split("_")[1].split(".")[0])
+
+            if frame_index in label_map:
+                scene_label, mood_label = label_map[frame_index]
+                entry["scene_label"] = scene_label
+                entry["mood_label"] = mood_label
+            else:
+                print(f"⚠ Frame {frame_index} in {folder} has no assigned label!")
+            yield entry
+
+    # Save new file, streaming entry by entry
     out_path = os.path.join(folder_path, "mapping_hardcoded.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    write_mapping(out_path, labeled_entries())
 
     print(f"✅ Saved labeled file: {out_path}")
 
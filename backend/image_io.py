@@ -0,0 +1,19 @@
+from PIL import Image
+
+from model_input import MODEL_INPUT_SIZE
+
+
+def load_rgb(path, min_size=MODEL_INPUT_SIZE):
+    """
+    Open an image as RGB, decoding JPEGs at reduced resolution.
+
+    For JPEGs, draft() asks libjpeg for a DCT-domain downscaled decode
+    (1/2, 1/4 or 1/8) — the smallest one that is still at least `min_size`
+    in both dimensions — so the final Resize only has to scale a few
+    hundred pixels instead of the full HD frame. Other formats (and
+    min_size=None) decode at full resolution as before.
+    """
+    img = Image.open(path)
+    if min_size is not None:
+        img.draft("RGB", min_size)
+    return img.convert("RGB")
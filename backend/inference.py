@@ -1,10 +1,12 @@
+import io
 import os
-import json
 import torch
 import time
-from PIL import Image
-from torchvision import transforms
-from train import DriveModel
+from train import load_drive_model
+from image_io import load_rgb
+from preprocess import thread_buffers
+from frame_index import FrameIndex
+from prediction_cache import PredictionCache, content_key, model_fingerprint
 
 # --------------------
 # LABELS
@@ -15,23 +17,38 @@ SCENE_LABELS = ["City", "Highway", "Forest", "Garage", "Offroad", "Traffic"]
 # --------------------
 # IMAGE TRANSFORM
 # --------------------
-tf = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor()
-])
-
-def predict_entry(entry, frame_dir, model):
-    """Predict mood + scene for one frame."""
+# Resize((224, 224)) + ToTensor() equivalent, done in place by preprocess.FrameBuffers
+
+def predict_entry(entry, frame_dir, model, cache=None, fingerprint=None):
+    """
+    Predict mood + scene for one frame.
+    With a PredictionCache, logits for frame bytes this model has already
+    seen are read from disk instead of recomputed.
+    """
     img_path = os.path.join(frame_dir, entry["frame"])
-    img = Image.open(img_path).convert("RGB")
-    img = tf(img).unsqueeze(0)
-
-    model.eval()
-    with torch.no_grad():
-        mood_logits, scene_logits = model(img)
-
-    mood_idx = mood_logits.argmax(dim=1).item()
-    scene_idx = scene_logits.argmax(dim=1).item()
+    with open(img_path, "rb") as f:
+        data = f.read()
+
+    logits = None
+    if cache is not None:
+        key = content_key(data)
+        logits = cache.get(fingerprint, key)
+
+    if logits is None:
+        buffers = thread_buffers()
+        buffers.put_image(0, load_rgb(io.BytesIO(data)))
+        img = buffers.images(1)
+
+        model.eval()
+        with torch.no_grad():
+            mood_logits, scene_logits = model(img)
+        logits = mood_logits[0].tolist(), scene_logits[0].tolist()
+        if cache is not None:
+            cache.put(fingerprint, key, *logits)
+
+    mood_logits, scene_logits = logits
+    mood_idx = max(range(len(mood_logits)), key=mood_logits.__getitem__)
+    scene_idx = max(range(len(scene_logits)), key=scene_logits.__getitem__)
 
     return MOOD_LABELS[mood_idx], SCENE_LABELS[scene_idx]
 
@@ -63,16 +80,19 @@ if __name__ == "__main__":
     # LOAD DATASET
     # --------------------
     print(f"\n📂 Loading dataset {FOLDER} ...")
-    with open(mapping_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = FrameIndex.load(mapping_path)
+    print(f"   {len(data)} frames indexed ({data.nbytes / 1e6:.1f} MB)")
 
     # --------------------
     # LOAD MODEL ONCE ❤️
     # --------------------
     print("🧠 Loading model...")
-    model = DriveModel()
-    model.load_state_dict(torch.load(os.path.join(SCRIPT_DIR, "model.pth")))
-    model.eval()
+    model_path = os.path.join(SCRIPT_DIR, "model.pth")
+    model = load_drive_model(model_path)
+
+    # Logits cached per (frame content, model.pth content): replays are free
+    cache = PredictionCache()
+    fingerprint = model_fingerprint(model_path)
 
     # --------------------
     # OUTPUT FILE
@@ -106,7 +126,7 @@ if __name__ == "__main__":
             entry = data[i]
 
             # Get prediction
-            mood, scene = predict_entry(entry, frames_root, model)
+            mood, scene = predict_entry(entry, frames_root, model, cache, fingerprint)
 
             # ----------------------------------------------------------------
             #                       MOOD TRACKING
@@ -151,4 +171,6 @@ if __name__ == "__main__":
             # Simulate real-time frame rate
             time.sleep(0.33)
 
+    cache.close()
+    print(f"📦 Prediction cache: {cache.stats()}")
     print(f"\n🎉 Finished real-time prediction for {FOLDER}! Output saved.\n")
\ No newline at end of file
@@ -1,16 +1,35 @@
+import io
 import os
-import json
+import re
+import hmac
+import math
 import time
+import functools
+import logging
+import atexit
+import argparse
+import itertools
 import threading
+from collections import deque
+from concurrent.futures import Future
 
-from flask import Flask, request
+from flask import Flask, request, jsonify
 from flask_socketio import SocketIO
 from PIL import Image
 import torch
-from torchvision import transforms
 import cv2  # for slideshow
 
-from train import DriveModel
+from model_registry import ModelRegistry
+from stabilizer import StreakStabilizer, make_stabilizer
+from image_io import load_rgb
+from preprocess import thread_buffers
+from frame_index import FrameIndex
+from profiling import profiler
+from prediction_cache import PredictionCache, content_key, CACHE_PATH, DEFAULT_MAX_ENTRIES
+from inference_workers import InferenceWorkerPool, RESULT_TIMEOUT
+from autotune import (TUNING_PATH, DEFAULT_TARGET_MS, autotune, save_tuning, load_tuning, describe,
+                      allowed_cores, plan_cores, split_cores, pin_current_thread, apply_torch_threads)
+from video_source import VideoFrameSource, TelemetryIndex, iter_matched_frames, find_video
 
 # ============================================================
 #                    FLASK + SOCKET.IO SETUP
@@ -55,326 +74,757 @@ def handle_connect_error(data):
     print(f'⚠️  Connection error: {data}')
 
 
+# ============================================================
+#                    ADMIN: ACCESS
+# ============================================================
+# With a token (--admin-token / DRIVE_SENSE_ADMIN_TOKEN) the admin API needs
+# it from anywhere; without one it only answers on localhost.
+ADMIN_TOKEN = os.environ.get("DRIVE_SENSE_ADMIN_TOKEN")
+LOCAL_ADDRS = {"127.0.0.1", "::1"}
+
+
+def admin_error(token):
+    """None if this request may use the admin API, else an error dict."""
+    if ADMIN_TOKEN:
+        if token and hmac.compare_digest(str(token), ADMIN_TOKEN):
+            return None
+        return {"ok": False, "error": "admin token required"}
+    if request.environ.get("REMOTE_ADDR") in LOCAL_ADDRS:
+        return None
+    return {"ok": False, "error": "admin API is localhost-only (start with --admin-token for remote use)"}
+
+
+def http_admin(view):
+    """Admin HTTP route: token in the X-Admin-Token header."""
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        error = admin_error(request.headers.get("X-Admin-Token"))
+        if error is not None:
+            return jsonify(error), 403
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def socket_admin(handler):
+    """Admin Socket.IO event: token in the payload ({"token": ...}), handler gets the payload."""
+    @functools.wraps(handler)
+    def wrapped(data=None):
+        data = data or {}
+        error = admin_error(data.get("token"))
+        return error if error is not None else handler(data)
+    return wrapped
+
+
+# ============================================================
+#                    ADMIN: MODEL HOT-SWAP
+# ============================================================
+model_registry = None  # ModelRegistry, set in __main__ for A–D
+
+
+def reload_model(path=None):
+    """path: a .pth file in the model's directory (default: the current model file)."""
+    if model_registry is None:
+        return {"ok": False, "error": "no model loaded (fake mode)"}
+    try:
+        model_registry.request_reload(path)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": True, "reloading": path or model_registry.model_path, "version": model_registry.version}
+
+
+def rollback_model():
+    if model_registry is None:
+        return {"ok": False, "error": "no model loaded (fake mode)"}
+    ok = model_registry.rollback()
+    return {"ok": ok, "version": model_registry.version}
+
+
+@socketio.on('reload_model')
+@socket_admin
+def handle_reload_model(data):
+    """Load + validate a new model in the background, then swap it in. Ack = status."""
+    return reload_model(data.get("path"))
+
+
+@socketio.on('rollback_model')
+@socket_admin
+def handle_rollback_model(data):
+    return rollback_model()
+
+
+@app.route('/admin/reload-model', methods=['POST'])
+@http_admin
+def http_reload_model():
+    return jsonify(reload_model((request.get_json(silent=True) or {}).get("path")))
+
+
+@app.route('/admin/rollback-model', methods=['POST'])
+@http_admin
+def http_rollback_model():
+    return jsonify(rollback_model())
+
+
+@app.route('/admin/model', methods=['GET'])
+@http_admin
+def http_model_status():
+    if model_registry is None:
+        return jsonify({"ok": False, "error": "no model loaded (fake mode)"})
+    return jsonify({"ok": True, "path": model_registry.model_path, "version": model_registry.version,
+                    "last_error": model_registry.last_error})
+
+
+# ============================================================
+#                    ADMIN: ON-DEMAND PROFILING
+# ============================================================
+def start_profile(data):
+    """Profile the next `frames` frames and/or `seconds` seconds (clamped, see profiling.py)."""
+    frames = data.get("frames")
+    seconds = data.get("seconds")
+    try:
+        armed = profiler.request(frames=None if frames is None else int(frames),
+                                 seconds=None if seconds is None else float(seconds))
+    except (TypeError, ValueError):
+        return {"ok": False, "error": "frames / seconds must be numbers"}
+    return {"ok": armed, **profiler.status()}
+
+
+@socketio.on('start_profile')
+@socket_admin
+def handle_start_profile(data):
+    return start_profile(data)
+
+
+@app.route('/admin/profile', methods=['POST'])
+@http_admin
+def http_start_profile():
+    return jsonify(start_profile(request.get_json(silent=True) or {}))
+
+
+@app.route('/admin/profile', methods=['GET'])
+@http_admin
+def http_profile_status():
+    return jsonify(profiler.status())
+
+
 # ============================================================
 #                    MODEL / INFERENCE SETUP
 # ============================================================
 MOOD_LABELS = ["Relaxed", "Focused", "Stressed", "Tired", "Distracted"]
 SCENE_LABELS = ["City", "Highway", "Forest", "Garage", "Offroad", "Traffic"]
 
-tf = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor()
-])
+CHANGE_THRESHOLD = 10   # require 10 consecutive frames for new state
+FRAME_INTERVAL = 0.33   # seconds between frames at 1x (real-time)
+REPORT_INTERVAL = 5.0   # seconds between throughput reports in replay mode
+
+# Fake-mode line: "121 | frame_121.jpg -> Relaxed / City"
+FAKE_LINE_RE = re.compile(r"^\s*(\d+)\s*\|\s*(.+?)\s*->\s*(.+?)\s*/\s*(.+?)\s*$")
+
+stream_seqs = {}  # stream_id -> last emitted seq (lets loadtest.py count drops at a stream's end)
+
+
+@socketio.on('stream_status')
+def handle_stream_status(data=None):
+    """Ack with the last seq emitted per stream so far ({stream: seq})."""
+    return {str(stream_id): seq for stream_id, seq in stream_seqs.items()}
+
+
+def emit_stream_end(stream_id, seq):
+    """Tell clients a stream is done and which seq was its last."""
+    stream_seqs[stream_id] = seq
+    socketio.emit('stream_end', {"stream": stream_id, "seq": seq}, namespace='/')
+
+
+def stream_log_path(folder_name, suffix, stream_id=0):
+    """Per-stream output log next to this script; stream 0 keeps the old name."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    stream_part = f"_s{stream_id}" if stream_id else ""
+    return os.path.join(script_dir, f"{folder_name}{stream_part}_{suffix}.txt")
+
+
+def log_state_change(kind, change, out):
+    """Print + log a stable state change returned by a stabilizer's update()."""
+    if change is None:
+        return
+    previous, new = change
+    if previous is not None:
+        change_line = f"[{kind} CHANGE] {previous} → {new}"
+        print(change_line)
+        out.write(change_line + "\n")
+
+
+def softmax(logits):
+    top = max(logits)
+    exps = [math.exp(v - top) for v in logits]
+    total = sum(exps)
+    return [e / total for e in exps]
 
 
-def predict_entry(entry, frame_dir, model):
+def label_probs(mood_logits, scene_logits):
+    """(mood, scene, (mood_probs, scene_probs)) from the two heads' logits."""
+    mood_probs, scene_probs = softmax(mood_logits), softmax(scene_logits)
+    mood_idx = max(range(len(mood_probs)), key=mood_probs.__getitem__)
+    scene_idx = max(range(len(scene_probs)), key=scene_probs.__getitem__)
+    return MOOD_LABELS[mood_idx], SCENE_LABELS[scene_idx], (mood_probs, scene_probs)
+
+
+def cached_logits(cache, fingerprint, data, compute):
+    """
+    compute() -> (mood_logits, scene_logits), served from the prediction
+    cache instead when this model has already seen exactly these frame
+    bytes. fingerprint None (no cache / model mid-swap) always computes.
     """
-    Predict mood + scene for one frame.
+    if cache is None or fingerprint is None:
+        return compute()
+    with profiler.span("cache"):
+        key = content_key(data)
+        logits = cache.get(fingerprint, key)
+    if logits is None:
+        logits = compute()
+        cache.put(fingerprint, key, *logits)
+    return logits
+
+
+def predict_entry(entry, frame_dir, model, cache=None, fingerprint=None):
+    """
+    Predict mood + scene (+ softmax probabilities) for one frame.
     entry["frame"] should be a relative path inside frame_dir.
     """
     img_path = os.path.join(frame_dir, entry["frame"])
-    img = Image.open(img_path).convert("RGB")
-    img = tf(img).unsqueeze(0)
+    if cache is None or fingerprint is None:
+        with profiler.span("decode"):
+            img = load_rgb(img_path)
+        return predict_image(img, model)
+
+    # Read once: the bytes are both the cache key and the decoder input
+    with open(img_path, "rb") as f:
+        data = f.read()
+
+    def compute():
+        with profiler.span("decode"):
+            img = load_rgb(io.BytesIO(data))
+        return image_logits(img, model)
+
+    return label_probs(*cached_logits(cache, fingerprint, data, compute))
+
+
+def image_logits(img, model, bgr=False):
+    """
+    (mood_logits, scene_logits) lists for one RGB PIL image (bgr=True: a
+    decoded BGR video frame). Resize + ToTensor() equivalent (see
+    FrameBuffers), written into this thread's preallocated input buffer
+    instead of new tensors per frame.
+    """
+    buffers = thread_buffers()
+    with profiler.span("transform"):
+        if bgr:
+            buffers.put_bgr(0, img)
+        else:
+            buffers.put_image(0, img)
+        img = buffers.images(1)
+
+    with profiler.span("forward"):
+        model.eval()
+        with torch.no_grad():
+            mood_logits, scene_logits = model(img)
 
-    model.eval()
-    with torch.no_grad():
-        mood_logits, scene_logits = model(img)
+    return mood_logits[0].tolist(), scene_logits[0].tolist()
 
-    mood_idx = mood_logits.argmax(dim=1).item()
-    scene_idx = scene_logits.argmax(dim=1).item()
 
-    return MOOD_LABELS[mood_idx], SCENE_LABELS[scene_idx]
+def predict_image(img, model):
+    """
+    Predict mood + scene for one RGB PIL image.
+    Returns (mood, scene, (mood_probs, scene_probs)).
+    """
+    return label_probs(*image_logits(img, model))
+
+
+def iter_predictions(data, limit, frames_root, registry, stream_id=0, pool=None, prefetch=1,
+                     frame_source=None, cache=None):
+    """
+    Yields (i, entry, t_frame, mood, scene, probs, frame_bgr) in frame order,
+    probs = (mood_probs, scene_probs) softmax lists.
+    frame_bgr is the decoded frame when it is already in memory (video), else None.
+
+    In-process: runs predict_entry() on the registry's current model, fetched
+    per frame so a hot-swapped model takes over between frames.
+    With a worker pool: keeps up to `prefetch` frames of this stream in flight
+    on its worker so decode + forward overlap with hysteresis / emit here.
+    With frame_source: frames are decoded from a video instead of frame files.
+    With cache: a PredictionCache checked (by frame content + model) before
+    running the model, so repeat replays skip decode + forward entirely.
+    """
+    if frame_source is not None:
+        matched = frame_source()
+        for i, (_, _, frame_bgr, entry) in zip(range(limit), matched):
+            t_frame = time.time()  # frame read timestamp, for end-to-end latency
+            model, fingerprint = registry.snapshot()
+
+            def compute():
+                # already decoded: resize + BGR -> RGB happen in the input buffer
+                return image_logits(frame_bgr, model, bgr=True)
+
+            # raw BGR pixels are the cache key for video frames
+            mood, scene, probs = label_probs(*cached_logits(cache, fingerprint, frame_bgr, compute))
+            yield i, entry, t_frame, mood, scene, probs, frame_bgr
+        return
 
+    if pool is None:
+        for i in range(limit):
+            entry = data[i]
+            t_frame = time.time()  # frame read timestamp, for end-to-end latency
+            model, fingerprint = registry.snapshot()
+            mood, scene, probs = predict_entry(entry, frames_root, model, cache, fingerprint)
+            yield i, entry, t_frame, mood, scene, probs, None
+        return
 
-def inference_loop(data, frames_root, model, folder_name):
+    prefetch = max(1, prefetch)
+    pending = deque()
+    for i in range(limit + prefetch):
+        if i < limit:
+            entry = data[i]
+            img_path = os.path.join(frames_root, entry["frame"])
+            t_frame = time.time()
+
+            fingerprint = registry.snapshot()[1] if cache is not None else None
+            key = logits = None
+            if fingerprint is not None:
+                with profiler.span("cache"):
+                    with open(img_path, "rb") as f:
+                        key = content_key(f.read())
+                    logits = cache.get(fingerprint, key)
+
+            if logits is not None:
+                future = Future()   # cache hit: already resolved, never sent to a worker
+                future.set_result(logits)
+                key = None
+            else:
+                future = pool.submit(stream_id, img_path)
+            pending.append((i, entry, t_frame, future, fingerprint, key))
+
+        if pending and (len(pending) >= prefetch or i >= limit):
+            j, entry, t_frame, future, fingerprint, key = pending.popleft()
+            with profiler.span("pool_wait"):
+                # raises if the worker died or hangs, instead of blocking this stream forever
+                logits = future.result(timeout=RESULT_TIMEOUT)
+            if key is not None:
+                cache.put(fingerprint, key, *logits)
+            mood, scene, probs = label_probs(*logits)
+            yield j, entry, t_frame, mood, scene, probs, None
+
+
+def inference_loop(data, frames_root, registry, folder_name, stream_id=0, display=True,
+                   speed=1.0, pool=None, prefetch=4, frame_source=None,
+                   stabilizer="streak", stabilizer_options=None, cache=None, cpu_cores=None,
+                   emit_every_frame=False, torch_threads=None, quiet=False):
     """
     Real inference loop (A–D):
     - iterates over frames
     - does inference
-    - applies 10-in-a-row hysteresis for mood & scene
-    - shows a slideshow of frames with mood/scene overlay (OpenCV)
+    - applies hysteresis for mood & scene (10-in-a-row, or confidence-weighted)
+    - shows a slideshow of frames with mood/scene overlay (OpenCV) if display
     - sends Socket.IO 'driver_state' event ONLY when stable mood/scene change
     - flashes 'SENT TO APP' on the slideshow for ~2s after each emit
+
+    stream_id tags every emitted payload so clients can tell streams apart.
+    speed: frame rate factor (1.0 = real-time, 0 = as fast as possible)
+    registry: ModelRegistry holding the live model (hot-swappable)
+    pool:  InferenceWorkerPool to run inference on instead of the in-process model
+    frame_source: callable returning (frame_index, timestamp, frame_bgr, entry)
+                  tuples decoded from a video (see video_source.py)
+    stabilizer: "streak" (N-in-a-row) or "evidence" (confidence-weighted on
+                the softmax probabilities, see stabilizer.py), with
+                stabilizer_options passed to EvidenceStabilizer
+    cache: PredictionCache shared by all streams (None = always run the model)
+    cpu_cores: cores to pin this thread (and its PyTorch threads) to
+    torch_threads: PyTorch intra-op threads for this thread's forward passes
+    emit_every_frame: emit the stable state for every frame, not only on
+                      changes (load testing: one latency sample per frame)
+    quiet: don't print every prediction / emit (the log file still gets them)
     """
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    out_file = os.path.join(script_dir, f"{folder_name}_predictions.txt")
+    pin_current_thread(cpu_cores)
+    if torch_threads:
+        # OpenMP thread counts are per calling thread: set it here, not just in main
+        torch.set_num_threads(torch_threads)
+
+    out_file = stream_log_path(folder_name, "predictions", stream_id)
     print(f"📄 Inference output log: {out_file}\n")
 
     # --------------------
     # GLOBAL STABLE STATE + STREAK LOGIC
     # --------------------
-    global_mood = None     # stable mood after hysteresis
-    global_scene = None    # stable scene after hysteresis
-
-    mood_streak_value = None
-    mood_streak_count = 0
-
-    scene_streak_value = None
-    scene_streak_count = 0
-
-    CHANGE_THRESHOLD = 10  # require 10 consecutive frames for new state
+    options = stabilizer_options or {}
+    mood_tracker = make_stabilizer(stabilizer, MOOD_LABELS, CHANGE_THRESHOLD, **options)    # stable mood
+    scene_tracker = make_stabilizer(stabilizer, SCENE_LABELS, CHANGE_THRESHOLD, **options)  # stable scene
 
     # Keep track of last sent stable state to avoid duplicate emits
     last_sent_mood = None
     last_sent_scene = None
     last_emit_time = None  # timestamp when we last sent to app
+    seq = 0                # per-stream emit counter (lets clients detect drops)
+    stream_seqs[stream_id] = seq
 
     limit = min(1000, len(data))
 
-    with open(out_file, "w", encoding="utf-8") as out:
-        out.write(f"=== Real-time predictions for dataset {folder_name} ===\n\n")
+    # Pace against an absolute schedule; only read ahead when not pacing
+    interval = FRAME_INTERVAL / speed if speed > 0 else 0.0
+    if interval:
+        prefetch = 1
+    start_time = time.perf_counter()
 
-        for i in range(limit):
-            entry = data[i]
+    try:
+        with open(out_file, "w", encoding="utf-8") as out:
+            out.write(f"=== Real-time predictions for dataset {folder_name} ===\n\n")
 
             # --------------------
             # 1) Instant prediction
             # --------------------
-            mood, scene = predict_entry(entry, frames_root, model)
-
-            # ============================================================
-            #                       MOOD TRACKING
-            # ============================================================
-            if mood_streak_value != mood:
-                mood_streak_value = mood
-                mood_streak_count = 1
-            else:
-                mood_streak_count += 1
-
-            if mood_streak_count == CHANGE_THRESHOLD:
-                if global_mood != mood_streak_value:
-                    if global_mood is not None:
-                        change_line = f"[MOOD CHANGE] {global_mood} → {mood_streak_value}"
-                        print(change_line)
-                        out.write(change_line + "\n")
-                    global_mood = mood_streak_value
-
-            # ============================================================
-            #                       SCENE TRACKING
-            # ============================================================
-            if scene_streak_value != scene:
-                scene_streak_value = scene
-                scene_streak_count = 1
-            else:
-                scene_streak_count += 1
-
-            if scene_streak_count == CHANGE_THRESHOLD:
-                if global_scene != scene_streak_value:
-                    if global_scene is not None:
-                        change_line = f"[SCENE CHANGE] {global_scene} → {scene_streak_value}"
-                        print(change_line)
-                        out.write(change_line + "\n")
-                    global_scene = scene_streak_value
-
-            # ============================================================
-            # 2) Log instant prediction (debug)
-            # ============================================================
-            line = f"{i:03d} | {entry['frame']} -> {mood} / {scene}"
-            print(line)
-            out.write(line + "\n")
-            out.flush()
-
-            # ============================================================
-            # 3) SHOW SLIDESHOW FRAME (OpenCV)
-            # ============================================================
-            img_path = os.path.join(frames_root, entry["frame"])
-            frame_bgr = cv2.imread(img_path)
-
-            if frame_bgr is not None:
-                # Overlay mood/scene text
-                overlay_text = f"{mood} / {scene}"
-                cv2.putText(
-                    frame_bgr,
-                    overlay_text,
-                    (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1.0,
-                    (0, 255, 0),
-                    2,
-                    cv2.LINE_AA
-                )
-
-                # If we sent a message in the last 2 seconds, flash a label
-                if last_emit_time is not None and (time.time() - last_emit_time) < 2.0:
-                    cv2.putText(
-                        frame_bgr,
-                        "SENT TO APP",
-                        (10, 70),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        1.0,
-                        (0, 0, 255),   # red
-                        3,
-                        cv2.LINE_AA
-                    )
-
-                cv2.imshow("Drive Sense - Frames", frame_bgr)
-                # waitKey is needed for imshow to update; 1 ms is enough
-                cv2.waitKey(1)
-            else:
-                print(f"⚠️ Could not read image at path: {img_path}")
-
-            # ============================================================
-            # 4) SEND TO ANDROID ONLY WHEN STABLE STATE CHANGES
-            # ============================================================
-            if global_mood is not None and global_scene is not None:
-                if global_mood != last_sent_mood or global_scene != last_sent_scene:
-                    payload = {
-                        "mood": global_mood,
-                        "scene": global_scene,
-                        "frame_index": i,
-                        "frame": entry["frame"]
-                    }
-                    print(f"📤 Emitting 'driver_state' to clients: {payload}")
-                    socketio.emit('driver_state', payload, namespace='/')
-
-                    last_sent_mood = global_mood
-                    last_sent_scene = global_scene
-                    last_emit_time = time.time()  # mark send time
-
-            # Simulate real-time frame rate
-            time.sleep(0.33)
-
-    cv2.destroyAllWindows()
-    print(f"\n🎉 Finished real-time prediction for {folder_name}! Output saved.\n")
-
-
-def fake_inference_loop_from_txt(txt_path, folder_name):
+            predictions = iter_predictions(data, limit, frames_root, registry, stream_id=stream_id,
+                                           pool=pool, prefetch=prefetch, frame_source=frame_source,
+                                           cache=cache)
+
+            for i, entry, t_frame, mood, scene, (mood_probs, scene_probs), frame_bgr in predictions:
+                profiler.tick()  # frame boundary for on-demand profiling
+
+                # ============================================================
+                #                 MOOD / SCENE TRACKING
+                # ============================================================
+                with profiler.span("hysteresis"):
+                    mood_change = mood_tracker.update(mood, mood_probs)
+                    scene_change = scene_tracker.update(scene, scene_probs)
+                global_mood = mood_tracker.stable
+                global_scene = scene_tracker.stable
+
+                # ============================================================
+                # 2) Log instant prediction (debug)
+                # ============================================================
+                with profiler.span("log"):
+                    log_state_change("MOOD", mood_change, out)
+                    log_state_change("SCENE", scene_change, out)
+                    line = f"{i:03d} | {entry['frame']} -> {mood} / {scene}"
+                    out.write(line + "\n")
+                    if not quiet:
+                        print(line)
+                        out.flush()
+
+                # ============================================================
+                # 3) SHOW SLIDESHOW FRAME (OpenCV)
+                # ============================================================
+                if display:
+                    with profiler.span("render"):
+                        img_path = os.path.join(frames_root, entry["frame"])
+                        if frame_bgr is None:
+                            frame_bgr = cv2.imread(img_path)
+
+                        if frame_bgr is not None:
+                            # Overlay mood/scene text
+                            overlay_text = f"{mood} / {scene}"
+                            cv2.putText(
+                                frame_bgr,
+                                overlay_text,
+                                (10, 30),
+                                cv2.FONT_HERSHEY_SIMPLEX,
+                                1.0,
+                                (0, 255, 0),
+                                2,
+                                cv2.LINE_AA
+                            )
+
+                            # If we sent a message in the last 2 seconds, flash a label
+                            if last_emit_time is not None and (time.time() - last_emit_time) < 2.0:
+                                cv2.putText(
+                                    frame_bgr,
+                                    "SENT TO APP",
+                                    (10, 70),
+                                    cv2.FONT_HERSHEY_SIMPLEX,
+                                    1.0,
+                                    (0, 0, 255),   # red
+                                    3,
+                                    cv2.LINE_AA
+                                )
+
+                            window = "Drive Sense - Frames" + (f" [{stream_id}]" if stream_id else "")
+                            cv2.imshow(window, frame_bgr)
+                            # waitKey is needed for imshow to update; 1 ms is enough
+                            cv2.waitKey(1)
+                        else:
+                            print(f"⚠️ Could not read image at path: {img_path}")
+
+                # ============================================================
+                # 4) SEND TO ANDROID ONLY WHEN STABLE STATE CHANGES
+                # ============================================================
+                if global_mood is not None and global_scene is not None:
+                    if emit_every_frame or global_mood != last_sent_mood or global_scene != last_sent_scene:
+                        seq += 1
+                        stream_seqs[stream_id] = seq
+                        payload = {
+                            "mood": global_mood,
+                            "scene": global_scene,
+                            "frame_index": i,
+                            "frame": entry["frame"],
+                            "stream": stream_id,
+                            "seq": seq,
+                            "t_frame": t_frame,
+                            # this frame's probability of the stable labels
+                            "mood_confidence": round(mood_probs[MOOD_LABELS.index(global_mood)], 3),
+                            "scene_confidence": round(scene_probs[SCENE_LABELS.index(global_scene)], 3)
+                        }
+                        with profiler.span("emit"):
+                            if not quiet:
+                                print(f"📤 Emitting 'driver_state' to clients: {payload}")
+                            socketio.emit('driver_state', payload, namespace='/')
+
+                        last_sent_mood = global_mood
+                        last_sent_scene = global_scene
+                        last_emit_time = time.time()  # mark send time
+
+                # Simulate real-time frame rate (scaled by speed)
+                if interval:
+                    delay = start_time + (i + 1) * interval - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+    finally:
+        profiler.release()  # a session this stream started must not outlive it
+        emit_stream_end(stream_id, seq)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"⏱️  [{folder_name}:{stream_id}] {limit} frames in {elapsed:.2f}s ({limit / elapsed:.1f} frames/s)")
+    if cache is not None:
+        cache.commit()
+        print(f"📦 Prediction cache: {cache.stats()}")
+
+    if display:
+        cv2.destroyAllWindows()
+    print(f"\n🎉 Finished real-time prediction for {folder_name} (stream {stream_id})! Output saved.\n")
+
+
+def iter_fake_lines(txt_path):
+    """
+    Lazily yields (frame_index, frame_name, mood, scene) from an
+    E_metadata.txt-style file, one line at a time.
+    """
+    with open(txt_path, "r", encoding="utf-8") as f_in:
+        for raw in f_in:
+            raw = raw.strip()
+            if not raw:
+                continue
+
+            match = FAKE_LINE_RE.match(raw)
+            if match is None:
+                print(f"⚠️ Could not parse line: {raw}")
+                continue
+
+            idx_part, frame_name, mood, scene = match.groups()
+            yield int(idx_part), frame_name, mood, scene
+
+
+def fake_inference_loop_from_txt(txt_path, folder_name, speed=1.0, loop=False, quiet=False, stream_id=0):
     """
     Fake mode (E):
-    - reads lines from E_metadata.txt
+    - streams lines from E_metadata.txt
     - each line has format like: `121 | frame_121.jpg -> Relaxed / City`
     - forwards line-by-line as if it was a real run
     - applies SAME 10-in-a-row hysteresis on mood/scene
     - sends Socket.IO 'driver_state' events in the SAME format
+
+    speed: replay speed factor (1.0 = real-time, 10.0 = 10x, 0 = as fast as possible)
+    loop:  start over from the top of the file when it ends
+    quiet: don't print every replayed line (the log file still gets them)
+    stream_id: tags every emitted payload so clients can tell streams apart
     """
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    out_file = os.path.join(script_dir, f"{folder_name}_fake_predictions.txt")
+    out_file = stream_log_path(folder_name, "fake_predictions", stream_id)
     print(f"📄 Fake mode output log: {out_file}\n")
 
     if not os.path.exists(txt_path):
         print(f"❌ Fake metadata file not found: {txt_path}")
         return
 
-    with open(txt_path, "r", encoding="utf-8") as f_in:
-        lines = [ln.strip() for ln in f_in.readlines() if ln.strip()]
+    # Pace against an absolute schedule so sleep overshoot doesn't accumulate
+    interval = FRAME_INTERVAL / speed if speed > 0 else 0.0
 
     # --------------------
     # GLOBAL STABLE STATE + STREAK LOGIC (same as real)
     # --------------------
-    global_mood = None
-    global_scene = None
-
-    mood_streak_value = None
-    mood_streak_count = 0
-
-    scene_streak_value = None
-    scene_streak_count = 0
-
-    CHANGE_THRESHOLD = 10
+    mood_tracker = StreakStabilizer(CHANGE_THRESHOLD)
+    scene_tracker = StreakStabilizer(CHANGE_THRESHOLD)
 
     last_sent_mood = None
     last_sent_scene = None
     last_emit_time = None  # not used visually here, but kept for parity
+    seq = 0                # per-stream emit counter (lets clients detect drops)
+    stream_seqs[stream_id] = seq
 
-    with open(out_file, "w", encoding="utf-8") as out:
-        out.write(f"=== FAKE run from {txt_path} ===\n\n")
-
-        for raw in lines:
-            # Expect format: "121 | frame_121.jpg -> Relaxed / City"
-            try:
-                left, right = raw.split("->")
-                left = left.strip()
-                right = right.strip()
-
-                # left: "121 | frame_121.jpg"
-                idx_part, frame_part = left.split("|")
-                frame_index = int(idx_part.strip())
-                frame_name = frame_part.strip()
-
-                # right: "Relaxed / City"
-                mood_str, scene_str = right.split("/")
-                mood = mood_str.strip()
-                scene = scene_str.strip()
-            except Exception as e:
-                print(f"⚠️ Could not parse line: {raw}  (error: {e})")
-                continue
+    # Throughput counters
+    events = 0
+    emits = 0
+    start_time = time.perf_counter()
+    next_report = start_time + REPORT_INTERVAL
 
-            # --------------------
-            # Hysteresis logic (same as real)
-            # --------------------
-            # MOOD
-            if mood_streak_value != mood:
-                mood_streak_value = mood
-                mood_streak_count = 1
-            else:
-                mood_streak_count += 1
-
-            if mood_streak_count == CHANGE_THRESHOLD:
-                if global_mood != mood_streak_value:
-                    if global_mood is not None:
-                        change_line = f"[MOOD CHANGE] {global_mood} → {mood_streak_value}"
-                        print(change_line)
-                        out.write(change_line + "\n")
-                    global_mood = mood_streak_value
-
-            # SCENE
-            if scene_streak_value != scene:
-                scene_streak_value = scene
-                scene_streak_count = 1
-            else:
-                scene_streak_count += 1
-
-            if scene_streak_count == CHANGE_THRESHOLD:
-                if global_scene != scene_streak_value:
-                    if global_scene is not None:
-                        change_line = f"[SCENE CHANGE] {global_scene} → {scene_streak_value}"
-                        print(change_line)
-                        out.write(change_line + "\n")
-                    global_scene = scene_streak_value
-
-            # Log the line as we replay it
-            line = f"{frame_index:03d} | {frame_name} -> {mood} / {scene}"
-            print(line)
-            out.write(line + "\n")
-            out.flush()
-
-            # Emit to client when stable state changes (same condition)
-            if global_mood is not None and global_scene is not None:
-                if global_mood != last_sent_mood or global_scene != last_sent_scene:
-                    payload = {
-                        "mood": global_mood,
-                        "scene": global_scene,
-                        "frame_index": frame_index,
-                        "frame": frame_name
-                    }
-                    print(f"📤 [FAKE] Emitting 'driver_state' to clients: {payload}")
-                    socketio.emit('driver_state', payload, namespace='/')
-
-                    last_sent_mood = global_mood
-                    last_sent_scene = global_scene
-                    last_emit_time = time.time()
-
-            # Simulate real-time streaming
-            time.sleep(0.33)
-
-    print(f"\n🎉 Finished FAKE replay from {txt_path}! Output saved.\n")
+    with open(out_file, "w", encoding="utf-8") as out:
+        out.write(f"=== FAKE run from {txt_path} (speed={speed or 'max'}, loop={loop}) ===\n\n")
+
+        while True:
+            events_before_pass = events
+
+            for frame_index, frame_name, mood, scene in iter_fake_lines(txt_path):
+                t_frame = time.time()  # "frame read" timestamp, for end-to-end latency
+
+                # --------------------
+                # Hysteresis logic (same as real)
+                # --------------------
+                log_state_change("MOOD", mood_tracker.update(mood), out)
+                log_state_change("SCENE", scene_tracker.update(scene), out)
+                global_mood = mood_tracker.stable
+                global_scene = scene_tracker.stable
+
+                # Log the line as we replay it
+                line = f"{frame_index:03d} | {frame_name} -> {mood} / {scene}"
+                if not quiet:
+                    print(line)
+                out.write(line + "\n")
+
+                # Emit to client when stable state changes (same condition)
+                if global_mood is not None and global_scene is not None:
+                    if global_mood != last_sent_mood or global_scene != last_sent_scene:
+                        seq += 1
+                        stream_seqs[stream_id] = seq
+                        payload = {
+                            "mood": global_mood,
+                            "scene": global_scene,
+                            "frame_index": frame_index,
+                            "frame": frame_name,
+                            "stream": stream_id,
+                            "seq": seq,
+                            "t_frame": t_frame
+                        }
+                        if not quiet:
+                            print(f"📤 [FAKE] Emitting 'driver_state' to clients: {payload}")
+                        socketio.emit('driver_state', payload, namespace='/')
+                        emits += 1
+
+                        last_sent_mood = global_mood
+                        last_sent_scene = global_scene
+                        last_emit_time = time.time()
+
+                events += 1
+                now = time.perf_counter()
+
+                if now >= next_report:
+                    out.flush()
+                    rate = events / (now - start_time)
+                    print(f"⏱️  [FAKE:{stream_id}] {events} events replayed ({rate:.1f} events/s, {emits} emits)")
+                    next_report = now + REPORT_INTERVAL
+
+                # Simulate real-time streaming (scaled by speed)
+                if interval:
+                    delay = start_time + events * interval - now
+                    if delay > 0:
+                        time.sleep(delay)
+
+            if not loop or events == events_before_pass:
+                break
+            out.write("=== LOOP ===\n")
+
+    emit_stream_end(stream_id, seq)
+    elapsed = time.perf_counter() - start_time
+    rate = events / elapsed if elapsed > 0 else 0.0
+    print(f"\n🎉 Finished FAKE replay from {txt_path} (stream {stream_id})! Output saved.")
+    print(f"   {events} events in {elapsed:.2f}s ({rate:.1f} events/s, {emits} emits)\n")
 
 
 # ============================================================
 #                          MAIN
 # ============================================================
+def parse_speed(value):
+    """'1', '10', '0.5' or 'max' (as fast as possible -> 0)."""
+    if value.lower() == "max":
+        return 0.0
+    speed = float(value)
+    if speed < 0:
+        raise argparse.ArgumentTypeError("speed must be >= 0")
+    return speed
+
+
 if __name__ == '__main__':
     script_dir = os.path.dirname(os.path.abspath(__file__))
     dataset_root = os.path.abspath(os.path.join(script_dir, "..", "dataset"))
 
-    folder = input("Choose dataset to run (A, B, C, D, or E): ").strip().upper()
+    parser = argparse.ArgumentParser(description="Drive Sense inference server")
+    parser.add_argument("--folder", help="dataset to run (A, B, C, D, or E); asked interactively if omitted")
+    parser.add_argument("--dataset-root", default=dataset_root,
+                        help="A–D: directory holding the dataset folders (default: ../dataset)")
+    parser.add_argument("--speed", type=parse_speed, default=1.0,
+                        help="speed factor: 1 = real-time, 10 = 10x, max = as fast as possible")
+    parser.add_argument("--loop", action="store_true", help="E replay: start over when the file ends")
+    parser.add_argument("--quiet", action="store_true",
+                        help="don't print every prediction / replayed line / emit and silence "
+                             "Socket.IO request logs")
+    parser.add_argument("--txt", help="E replay file (default: E_metadata.txt next to this script)")
+    parser.add_argument("--streams", type=int, default=1,
+                        help="number of parallel input streams over the chosen dataset")
+    parser.add_argument("--no-display", action="store_true", help="A–D: don't open the OpenCV slideshow")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--admin-token", default=ADMIN_TOKEN,
+                        help="token required by the /admin API and admin events "
+                             "(default: $DRIVE_SENSE_ADMIN_TOKEN; without one, admin is localhost-only)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="A–D: inference worker processes (0 = run inference in this process)")
+    parser.add_argument("--intra-op-threads", type=int,
+                        help="PyTorch threads per worker, or per stream without --workers "
+                             "(default: tuned, else cores / workers)")
+    parser.add_argument("--max-batch", type=int, help="max frames a worker batches together (default: tuned, else 8)")
+    parser.add_argument("--autotune", action="store_true",
+                        help="A–D: benchmark thread counts / batch sizes now and save the result to --tuning")
+    parser.add_argument("--tuning", default=TUNING_PATH,
+                        help="A–D: saved tuning, applied on start when it matches this machine and model")
+    parser.add_argument("--no-tuning", action="store_true",
+                        help="A–D: ignore saved tuning (default PyTorch threads, no CPU pinning)")
+    parser.add_argument("--latency-target-ms", type=float,
+                        help=f"A–D: p99 latency budget for --autotune (default {DEFAULT_TARGET_MS:g}); "
+                             "a saved tuning for another target is ignored")
+    parser.add_argument("--prefetch", type=int, default=4,
+                        help="frames in flight per stream when not pacing (--speed max)")
+    parser.add_argument("--emit-every-frame", action="store_true",
+                        help="A–D: emit driver_state for every frame, not only on stable changes (load tests)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="A–D: always run the model (skip the on-disk prediction cache)")
+    parser.add_argument("--cache-path", default=CACHE_PATH, help="A–D: prediction cache file")
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="A–D: max cached frames (least recently used are evicted)")
+    parser.add_argument("--stabilizer", choices=["streak", "evidence"], default="streak",
+                        help="A–D: N-in-a-row hysteresis, or confidence-weighted evidence that commits "
+                             "faster on confident predictions (tune with replay_stabilizer.py)")
+    parser.add_argument("--evidence-threshold", type=float, default=6.0,
+                        help="--stabilizer evidence: log-odds evidence needed to commit")
+    parser.add_argument("--evidence-decay", type=float, default=0.8,
+                        help="--stabilizer evidence: per-frame evidence decay")
+    parser.add_argument("--evidence-min-frames", type=int, default=3,
+                        help="--stabilizer evidence: minimum frames in a row before committing")
+    parser.add_argument("--video", nargs="?", const="auto",
+                        help="A–D: decode frames from a video file instead of frame_N.jpg "
+                             "(no value = the video file in the dataset folder)")
+    parser.add_argument("--video-stride", type=int,
+                        help="decode every N-th video frame (default: ~one frame per telemetry entry)")
+    parser.add_argument("--watch-model", action="store_true",
+                        help="A–D: reload model.pth automatically when the file changes")
+    parser.add_argument("--video-match", choices=["timestamp", "index"], default="timestamp",
+                        help="match video frames to telemetry by time or by frame_N index")
+    args = parser.parse_args()
+    ADMIN_TOKEN = args.admin_token
+
+    if args.quiet:
+        logging.getLogger("socketio.server").setLevel(logging.ERROR)
+        logging.getLogger("engineio.server").setLevel(logging.ERROR)
+
+    folder = args.folder or input("Choose dataset to run (A, B, C, D, or E): ")
+    folder = folder.strip().upper()
 
     if folder in ["A", "B", "C", "D"]:
         # --------------------
         # REAL DATA PATHS
         # --------------------
-        mapping_path = os.path.join(dataset_root, folder, "mapping_hardcoded.json")
+        mapping_path = os.path.join(args.dataset_root, folder, "mapping_hardcoded.json")
         frames_root = os.path.dirname(mapping_path)
 
         if not os.path.exists(mapping_path):
@@ -382,8 +832,11 @@ if __name__ == '__main__':
             raise SystemExit(1)
 
         print(f"\n📂 Loading dataset {folder} ...")
-        with open(mapping_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = FrameIndex.load(mapping_path)
+        print(f"   {len(data)} frames indexed ({data.nbytes / 1e6:.1f} MB)")
+        if data.video_only and not args.video:
+            print("🎞️  Video-only dataset (no frame_N.jpg files): decoding its video (--video)")
+            args.video = "auto"
 
         print("🧠 Loading model...")
         model_path = os.path.join(script_dir, "model.pth")
@@ -391,32 +844,134 @@ if __name__ == '__main__':
             print(f"❌ model.pth not found at: {model_path}")
             raise SystemExit(1)
 
-        model = DriveModel()
-        model.load_state_dict(torch.load(model_path, map_location="cpu"))
-        model.eval()
-        print("✅ Model loaded!\n")
-
-        # Start real inference thread
-        inf_thread = threading.Thread(
-            target=inference_loop,
-            args=(data, frames_root, model, folder),
-            daemon=True
-        )
-        inf_thread.start()
+        # --------------------
+        # THREADS + CPU AFFINITY
+        # --------------------
+        tuning = None
+        if args.autotune:
+            target_ms = args.latency_target_ms or DEFAULT_TARGET_MS
+            print(f"⏱️  Autotuning threads / batch size (target p99 ≤ {target_ms:g} ms)...")
+            tuning = autotune(model_path, target_ms=target_ms)
+            save_tuning(tuning, args.tuning)
+            print(f"💾 Tuning saved to {args.tuning}")
+        elif not args.no_tuning:
+            tuning, reason = load_tuning(args.tuning, model_path, target_ms=args.latency_target_ms)
+            if tuning is None:
+                print(f"ℹ️  Default PyTorch threading: {reason} (start with --autotune to tune)")
+
+        # One core slice per worker process, or per stream when inference runs in-process
+        parts = args.workers if args.workers > 0 else args.streams
+        intra_op_threads = args.intra_op_threads
+        max_batch = args.max_batch or 8
+        cpu_sets = None
+        if tuning is not None:
+            print(f"⚙️  Tuning: {describe(tuning)}")
+            intra_op_threads = intra_op_threads or tuning["intra_op_threads"]
+            max_batch = args.max_batch or tuning["max_batch"]
+
+            inference_cores, io_cores = plan_cores(allowed_cores(), intra_op_threads * parts,
+                                                   tuning["reserve_io"])
+            cpu_sets = split_cores(inference_cores, parts)
+            # never more threads than a slice has cores
+            intra_op_threads = max(1, min(intra_op_threads, min(len(cores) for cores in cpu_sets)))
+            if parts > len(inference_cores):
+                print(f"⚠ {parts} workers / streams share {len(inference_cores)} inference cores")
+            # Flask-SocketIO handler threads are started from this thread and inherit its cores
+            if pin_current_thread(io_cores):
+                print(f"📌 Inference on cores {cpu_sets} ({intra_op_threads} threads each), "
+                      f"server / I/O on cores {io_cores}")
+        if intra_op_threads and args.workers == 0:
+            # model load / warm-up below runs on this thread; each stream sets its own count again
+            apply_torch_threads(torch, intra_op_threads)
+
+        frame_source = None
+        if args.video:
+            video_path = find_video(frames_root) if args.video == "auto" else args.video
+            if video_path is None or not os.path.exists(video_path):
+                print(f"❌ No video file found for folder {folder}")
+                raise SystemExit(1)
+            if args.workers > 0:
+                print("❌ --video runs inference in-process; drop --workers")
+                raise SystemExit(1)
+
+            probe = VideoFrameSource(video_path, stride=args.video_stride)
+            telemetry = TelemetryIndex(data, match=args.video_match, frame_period=probe.frame_period)
+            print(f"🎞️  Decoding frames from {video_path} ({probe.fps:g} fps, stride={probe.stride}, "
+                  f"match={args.video_match})")
+
+            def frame_source():
+                source = VideoFrameSource(video_path, stride=probe.stride)
+                return iter_matched_frames(source, telemetry)
+
+        pool = None
+        if args.workers > 0:
+            pool = InferenceWorkerPool(model_path, args.workers,
+                                       intra_op_threads=intra_op_threads,
+                                       max_batch=max_batch, cpu_sets=cpu_sets)
+            print(f"✅ {pool.num_workers} inference workers ready "
+                  f"({pool.intra_op_threads} threads each)!\n")
+
+        # A few real frames to validate hot-swapped models on
+        if frame_source is not None:
+            # video datasets have no frame_N.jpg files: decode the first matched frames instead
+            validation_images = [Image.fromarray(cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB))
+                                 for _, _, frame_bgr, _ in itertools.islice(frame_source(), 4)]
+        else:
+            validation_images = [path for path in (os.path.join(frames_root, entry["frame"])
+                                                   for entry in data[:4]) if os.path.exists(path)]
+        if not validation_images:
+            print("⚠ No frames to validate reloaded models on, using the warm-up batch only")
+        model_registry = ModelRegistry(model_path, validation_images=validation_images, pool=pool)
+        if pool is None:
+            print("✅ Model loaded!\n")
+        if args.watch_model:
+            model_registry.watch()
+            print(f"👀 Watching {model_path} for new models")
+
+        stabilizer_options = {}
+        if args.stabilizer == "evidence":
+            stabilizer_options = {"threshold": args.evidence_threshold, "decay": args.evidence_decay,
+                                  "min_frames": args.evidence_min_frames}
+
+        cache = None
+        if not args.no_cache:
+            cache = PredictionCache(args.cache_path, max_entries=args.cache_entries)
+            atexit.register(cache.close)   # streams are daemon threads; flush whatever they left
+            print(f"📦 Prediction cache: {args.cache_path} (up to {args.cache_entries} frames)")
+
+        # Start real inference thread(s), one per stream
+        for stream_id in range(args.streams):
+            inf_thread = threading.Thread(
+                target=inference_loop,
+                name=f"inference-{stream_id}",
+                args=(data, frames_root, model_registry, folder),
+                kwargs={"stream_id": stream_id, "display": not args.no_display,
+                        "speed": args.speed, "pool": pool, "prefetch": args.prefetch,
+                        "frame_source": frame_source, "stabilizer": args.stabilizer,
+                        "stabilizer_options": stabilizer_options, "cache": cache,
+                        # worker processes are pinned themselves; the stream thread only waits on them
+                        "cpu_cores": cpu_sets[stream_id] if cpu_sets and pool is None else None,
+                        "torch_threads": intra_op_threads if pool is None else None,
+                        "emit_every_frame": args.emit_every_frame, "quiet": args.quiet},
+                daemon=True
+            )
+            inf_thread.start()
 
     elif folder == "E":
         # --------------------
         # FAKE MODE FROM TXT
         # --------------------
-        txt_path = os.path.join(script_dir, "E_metadata.txt")
-        print(f"\n📂 Starting FAKE replay from: {txt_path}\n")
-
-        inf_thread = threading.Thread(
-            target=fake_inference_loop_from_txt,
-            args=(txt_path, folder),
-            daemon=True
-        )
-        inf_thread.start()
+        txt_path = args.txt or os.path.join(script_dir, "E_metadata.txt")
+        print(f"\n📂 Starting FAKE replay from: {txt_path} (speed={args.speed or 'max'}, loop={args.loop})\n")
+
+        for stream_id in range(args.streams):
+            inf_thread = threading.Thread(
+                target=fake_inference_loop_from_txt,
+                args=(txt_path, folder),
+                kwargs={"speed": args.speed, "loop": args.loop, "quiet": args.quiet, "stream_id": stream_id},
+                daemon=True
+            )
+            inf_thread.start()
     else:
         print("❌ Invalid choice! Use A, B, C, D, or E.")
         raise SystemExit(1)
@@ -425,13 +980,13 @@ if __name__ == '__main__':
     # START SERVER
     # --------------------
     print(f"\n🌐 Server running on:")
-    print(f"   - http://127.0.0.1:5000")
-    print(f"   - http://0.0.0.0:5000")
+    print(f"   - http://127.0.0.1:{args.port}")
+    print(f"   - http://{args.host}:{args.port}")
     print("=" * 60 + "\n")
 
     socketio.run(
         app,
-        host='0.0.0.0',
-        port=5000,
+        host=args.host,
+        port=args.port,
         allow_unsafe_werkzeug=True
     )
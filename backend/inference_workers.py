@@ -0,0 +1,340 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+
+from prediction_cache import model_fingerprint
+
+# -------------------------------
+# Worker process side
+# -------------------------------
+STOP = None  # sentinel on a request queue
+
+START_TIMEOUT = 300.0     # seconds for every worker to load its model
+CONTROL_TIMEOUT = 300.0   # seconds for a reload / rollback reply
+RESULT_TIMEOUT = 60.0     # seconds a caller should wait on one frame's Future
+LIVENESS_INTERVAL = 1.0   # seconds between worker is_alive() checks
+
+
+def _load_model(model_path, buffers, torch, load_drive_model, key=None):
+    if key is not None and model_fingerprint(model_path) != key:
+        raise RuntimeError(f"{model_path} changed on disk since the server validated it")
+    model = load_drive_model(model_path)
+    with torch.no_grad():
+        model(buffers.images(1))  # warm-up before it takes traffic
+    return model
+
+
+def _worker_main(worker_id, model_path, model_key, intra_op_threads, max_batch, requests, results,
+                 cpu_set=None):
+    """
+    One inference worker process:
+    - holds its own DriveModel replica
+    - runs with `intra_op_threads` PyTorch threads (no interop pool)
+    - is pinned to `cpu_set` (if given) before it loads the model
+    - drains up to `max_batch` queued frames and runs them as one batch
+    Only frame paths go in and (request_id, mood_logits, scene_logits, error) come
+    out, so nothing heavier than a few floats crosses the process boundary.
+
+    Requests:
+    - ("frame", request_id, img_path)
+    - ("use", control_id, model_path, key, keep): serve the model with content
+      fingerprint `key` (loaded from model_path + warmed up unless already
+      held), then drop every held model except `key` and those in `keep`
+    Models are held by fingerprint, not path: the watcher reloads the same
+    model.pth path with new weights. The server decides what each worker
+    holds, so worker state always follows the ModelRegistry.
+    Control messages share the frame queue, so a swap always happens
+    between batches. Their replies carry the control_id back, so the server
+    can drop late replies to a control message it already gave up on.
+    """
+    if cpu_set and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_set)
+
+    # Under spawn the server script has already been re-imported as
+    # __mp_main__ by now (torch, cv2, Flask included), so these imports are
+    # cheap; they're kept local so this module can be imported without torch.
+    import torch
+    from train import load_drive_model
+    from image_io import load_rgb
+    from preprocess import FrameBuffers
+
+    try:
+        torch.set_num_threads(intra_op_threads)
+        torch.set_num_interop_threads(1)
+
+        buffers = FrameBuffers(max_batch)
+        buffers.pixels.zero_()
+        model = _load_model(model_path, buffers, torch, load_drive_model)
+        models = {model_key: model}
+    except Exception as e:
+        results.put(("error", worker_id, repr(e)))
+        return
+
+    results.put(("ready", worker_id, None))
+
+    control = None
+    while True:
+        request = control or requests.get()
+        control = None
+        if request is STOP:
+            break
+
+        if request[0] == "use":
+            _, control_id, path, key, keep = request
+            try:
+                if key not in models:
+                    models[key] = _load_model(path, buffers, torch, load_drive_model, key)
+                model = models[key]
+                models = {k: m for k, m in models.items() if k == key or k in keep}
+                results.put(("used", worker_id, (control_id, None)))
+            except Exception as e:
+                results.put(("used", worker_id, (control_id, repr(e))))
+            continue
+
+        # Batch whatever other frames are already queued for this worker
+        batch = [request]
+        while len(batch) < max_batch:
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is STOP or request[0] != "frame":
+                control = request  # handled right after this batch
+                break
+            batch.append(request)
+
+        out = []
+        ids = []
+        for _, request_id, img_path in batch:
+            try:
+                buffers.put_image(len(ids), load_rgb(img_path))
+                ids.append(request_id)
+            except Exception as e:
+                out.append((request_id, None, None, repr(e)))
+
+        if ids:
+            with torch.no_grad():
+                mood_logits, scene_logits = model(buffers.images(len(ids)))
+            out.extend(zip(ids, mood_logits.tolist(), scene_logits.tolist(), itertools.repeat(None)))
+
+        results.put(("results", worker_id, out))
+
+
+# -------------------------------
+# Server process side
+# -------------------------------
+class InferenceWorkerPool:
+    """
+    K worker processes, each with a DriveModel replica.
+
+    Streams are sharded to workers by ID (stream_id % K), so one stream's
+    frames always land on the same worker and stay in order, while
+    different streams run on different cores without sharing the GIL
+    with the Flask-SocketIO threads.
+
+    Workers are watched: if one dies (OOM kill, crash), its outstanding and
+    future frames fail with RuntimeError instead of hanging their callers.
+
+    cpu_sets (one core list per worker, see autotune.split_cores) pins each
+    worker to its own cores.
+    """
+
+    def __init__(self, model_path, num_workers, intra_op_threads=None, max_batch=8, cpu_sets=None):
+        if intra_op_threads is None:
+            intra_op_threads = max(1, (os.cpu_count() or 1) // num_workers)
+
+        self.num_workers = num_workers
+        self.intra_op_threads = intra_op_threads
+        self.model_key = model_fingerprint(model_path)   # what every worker serves at start
+
+        # spawn: forking a process that already initialised torch / OpenMP is unsafe
+        ctx = mp.get_context("spawn")
+        self._requests = [ctx.Queue() for _ in range(num_workers)]
+        self._results = ctx.Queue()
+
+        self._futures = {}   # request_id -> (worker_id, Future)
+        self._dead = {}      # worker_id -> exit code
+        self._closing = False
+        self._futures_lock = threading.Lock()
+        self._ids = itertools.count()
+
+        self._control_replies = queue.Queue()
+        self._control_ids = itertools.count()
+        self._control_lock = threading.Lock()
+
+        self._procs = []
+        for worker_id in range(num_workers):
+            proc = ctx.Process(
+                target=_worker_main,
+                args=(worker_id, model_path, self.model_key, intra_op_threads, max_batch,
+                      self._requests[worker_id], self._results,
+                      cpu_sets[worker_id] if cpu_sets else None),
+                daemon=True
+            )
+            proc.start()
+            self._procs.append(proc)
+
+        # Wait until every replica has loaded its model
+        ready = 0
+        deadline = time.monotonic() + START_TIMEOUT
+        while ready < num_workers:
+            try:
+                kind, worker_id, payload = self._results.get(timeout=LIVENESS_INTERVAL)
+            except queue.Empty:
+                dead = [(i, proc.exitcode) for i, proc in enumerate(self._procs) if not proc.is_alive()]
+                if dead or time.monotonic() > deadline:
+                    self.close()
+                    reason = f"exited: {dead}" if dead else f"not ready after {START_TIMEOUT:.0f}s"
+                    raise RuntimeError(f"inference workers failed to start ({reason})")
+                continue
+            if kind == "error":
+                self.close()
+                raise RuntimeError(f"inference worker {worker_id} failed to start: {payload}")
+            ready += 1
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def worker_for(self, stream_id):
+        return stream_id % self.num_workers
+
+    def submit(self, stream_id, img_path):
+        """
+        Queue one frame; returns a Future resolving to (mood_logits, scene_logits).
+        Wait on it with a timeout (RESULT_TIMEOUT); it fails if the worker dies.
+        """
+        future = Future()
+        worker_id = self.worker_for(stream_id)
+        request_id = next(self._ids)
+        with self._futures_lock:
+            if worker_id in self._dead:
+                future.set_exception(self._died_error(worker_id))
+                return future
+            self._futures[request_id] = (worker_id, future)
+
+        self._requests[worker_id].put(("frame", request_id, img_path))
+        return future
+
+    def _died_error(self, worker_id):
+        return RuntimeError(f"inference worker {worker_id} died (exit code {self._dead[worker_id]})")
+
+    def _check_workers(self):
+        """Fail every outstanding frame of a worker that has died."""
+        if self._closing:
+            return
+        for worker_id, proc in enumerate(self._procs):
+            if worker_id in self._dead or proc.is_alive():
+                continue
+            with self._futures_lock:
+                self._dead[worker_id] = proc.exitcode
+                lost = [(request_id, future) for request_id, (owner, future) in self._futures.items()
+                        if owner == worker_id]
+                for request_id, _ in lost:
+                    del self._futures[request_id]
+            print(f"❌ Inference worker {worker_id} died (exit code {proc.exitcode}), "
+                  f"failing {len(lost)} pending frames")
+            for _, future in lost:
+                future.set_exception(self._died_error(worker_id))
+
+    def _broadcast(self, command, worker_ids):
+        """
+        Send a control command ("use", ...) to some workers and wait for their
+        replies: {worker_id: error or None}. Each broadcast gets its own
+        control_id; replies to an earlier one that timed out are dropped.
+        """
+        worker_ids = list(worker_ids)
+        dead = [worker_id for worker_id in worker_ids if worker_id in self._dead]
+        if dead:
+            raise RuntimeError(f"inference workers {dead} are dead")
+
+        control_id = next(self._control_ids)
+        for worker_id in worker_ids:
+            self._requests[worker_id].put((command[0], control_id, *command[1:]))
+
+        replies = {}
+        deadline = time.monotonic() + CONTROL_TIMEOUT
+        while len(replies) < len(worker_ids):
+            try:
+                _, worker_id, (reply_id, error) = self._control_replies.get(
+                    timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                missing = sorted(set(worker_ids) - set(replies))
+                raise RuntimeError(f"no reply from inference workers {missing} to {command[0]!r} "
+                                   f"within {CONTROL_TIMEOUT:.0f}s") from None
+            if reply_id == control_id:
+                replies[worker_id] = error
+        return replies
+
+    def reload(self, model_path, key, current, previous=None):
+        """
+        Swap every worker to `model_path` (content fingerprint `key`) between
+        batches. `current` / `previous` are the registry's (model_path, key)
+        pairs. Every worker holds the new model and the current one after a
+        success, and exactly what it held before after a failure (the
+        workers that already swapped go back to `current`), in which case
+        RuntimeError is raised. Either way all workers serve the same model.
+        """
+        kept = (current[1], previous[1] if previous else None)
+        with self._control_lock:
+            replies = self._broadcast(("use", model_path, key, kept), range(self.num_workers))
+            failed = [(worker_id, error) for worker_id, error in replies.items() if error is not None]
+            if failed:
+                swapped = [worker_id for worker_id, error in replies.items() if error is None]
+                self._broadcast(("use", *current, kept[1:]), swapped)
+                raise RuntimeError(f"workers failed to load {model_path}: {failed}")
+            # the registry's old previous is gone now: keep (new, current) only
+            self._broadcast(("use", model_path, key, kept[:1]), range(self.num_workers))
+
+    def rollback(self, previous):
+        """Swap every worker back to the registry's `previous` (model_path, key); it is still held."""
+        with self._control_lock:
+            replies = self._broadcast(("use", *previous, ()), range(self.num_workers))
+            failed = [(worker_id, error) for worker_id, error in replies.items() if error is not None]
+            if failed:
+                raise RuntimeError(f"workers failed to roll back: {failed}")
+
+    def _collect(self):
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check >= LIVENESS_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._results.get(timeout=LIVENESS_INTERVAL)
+            except queue.Empty:
+                continue
+            if message is STOP:
+                break
+
+            kind, _, out = message
+            if kind != "results":
+                self._control_replies.put(message)
+                continue
+
+            for request_id, mood_logits, scene_logits, error in out:
+                with self._futures_lock:
+                    pending = self._futures.pop(request_id, None)
+                if pending is None:
+                    continue  # already failed: its worker was declared dead
+                future = pending[1]
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result((mood_logits, scene_logits))
+
+    def close(self):
+        self._closing = True
+        for requests in self._requests:
+            requests.put(STOP)
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._results.put(STOP)
+        collector = getattr(self, "_collector", None)   # not started if startup failed
+        if collector is not None:
+            collector.join(timeout=5)
@@ -1,10 +1,11 @@
-import json
 import os
 import math
 
-from PIL import Image
 import numpy as np
 
+from image_io import load_rgb
+from frame_index import iter_mapping, write_mapping
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATASET_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "dataset"))
 VIDEO_FOLDERS = ["A", "B", "C", "D"]
@@ -18,7 +19,8 @@ def analyze_image_for_scene(image_path):
     Used to distinguish forest / city / offroad-style scenes.
     """
     try:
-        img = Image.open(image_path).convert("RGB")
+        # JPEG decoded at reduced resolution, no smaller than the analysis size
+        img = load_rgb(image_path, (160, 90))
     except Exception:
         return 0.0, 0.0, 0.0  # if frame missing or unreadable
 
@@ -129,25 +131,24 @@ def compute_scene_label(m, green_ratio, gray_ratio):
 # ---------- PROCESSING MAPPING FILES ----------
 
 def process_mapping_file(mapping_path):
-    with open(mapping_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
     frames_root = os.path.dirname(mapping_path)
 
-    for entry in data:
-        m = entry.get("metadata", {})
+    def labeled_entries():
+        # One entry in memory at a time; every original field is kept
+        for entry in iter_mapping(mapping_path):
+            m = entry.get("metadata", {})
 
-        frame_name = entry["frame"]
-        frame_path = os.path.join(frames_root, frame_name)
+            frame_name = entry["frame"]
+            frame_path = os.path.join(frames_root, frame_name)
 
-        green_ratio, gray_ratio, brightness = analyze_image_for_scene(frame_path)
+            green_ratio, gray_ratio, brightness = analyze_image_for_scene(frame_path)
 
-        entry["mood_label"] = compute_mood_label(m)
-        entry["scene_label"] = compute_scene_label(m, green_ratio, gray_ratio)
+            entry["mood_label"] = compute_mood_label(m)
+            entry["scene_label"] = compute_scene_label(m, green_ratio, gray_ratio)
+            yield entry
 
     labeled_path = mapping_path.replace("mapping.json", "mapping_labeled.json")
-    with open(labeled_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    write_mapping(labeled_path, labeled_entries())
 
     print(f"✅ Labeled file written to: {labeled_path}")
 
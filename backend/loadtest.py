@@ -0,0 +1,387 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import socketio  # python-socketio client (pip install "python-socketio[client]")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_SCRIPT = os.path.join(SCRIPT_DIR, "inferenceServer.py")
+MODEL_PATH = os.path.join(SCRIPT_DIR, "model.pth")
+DATASET_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "..", "dataset"))
+
+MOOD_LABELS = ["Relaxed", "Focused", "Stressed", "Tired", "Distracted"]
+SCENE_LABELS = ["City", "Highway", "Forest", "Garage", "Offroad", "Traffic"]
+
+DRAIN_SECONDS = 2.0   # wait after measuring for events already emitted to arrive
+
+
+# -------------------------------
+# Synthetic replay file
+# -------------------------------
+def write_synthetic_replay(path, num_lines=2000, seed=0):
+    """
+    E_metadata.txt-style file whose mood/scene change every 10–40 lines,
+    so the 10-in-a-row hysteresis produces a steady flow of emits.
+    """
+    rng = random.Random(seed)
+    mood, scene = MOOD_LABELS[0], SCENE_LABELS[0]
+    left = 0
+
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(num_lines):
+            if left == 0:
+                mood = rng.choice(MOOD_LABELS)
+                scene = rng.choice(SCENE_LABELS)
+                left = rng.randint(10, 40)
+            left -= 1
+            f.write(f"{i:03d} | frame_{i}.jpg -> {mood} / {scene}\n")
+
+
+def write_synthetic_dataset(root, folder, num_frames, seed=0):
+    """A generate_dataset.py folder (frames + mapping_hardcoded.json) for real-inference runs."""
+    from generate_dataset import iter_entries, write_frames
+    from frame_index import write_mapping
+
+    folder_path = os.path.join(root, folder)
+    os.makedirs(folder_path, exist_ok=True)
+    entries = write_frames(folder_path, iter_entries(folder, num_frames, seed), (640, 360), seed,
+                           quality=85, pool_size=120)
+    write_mapping(os.path.join(folder_path, "mapping_hardcoded.json"), entries)
+
+
+def server_command(args, tmp_dir):
+    """
+    E: fake replay (Socket.IO fan-out only). A–D: real frame decode +
+    inference, every frame emitted, prediction cache off, so each latency
+    sample covers frame read -> model -> phone.
+    """
+    command = [sys.executable, SERVER_SCRIPT, "--folder", args.folder, "--speed", args.speed,
+               "--quiet", "--streams", str(args.streams), "--host", "127.0.0.1", "--port", str(args.port)]
+
+    if args.folder == "E":
+        txt_path = args.txt
+        if txt_path is None:
+            txt_path = os.path.join(tmp_dir, "E_metadata.txt")
+            write_synthetic_replay(txt_path)
+        return command + ["--txt", txt_path, "--loop"]
+
+    dataset_root = DATASET_ROOT
+    if args.synthetic:
+        dataset_root = os.path.join(tmp_dir, "dataset")
+        print(f"🧪 Writing a {args.frames}-frame synthetic dataset {args.folder} ...")
+        write_synthetic_dataset(dataset_root, args.folder, args.frames)
+    return command + ["--dataset-root", dataset_root, "--no-display", "--no-cache", "--emit-every-frame",
+                      "--workers", str(args.workers)]
+
+
+# -------------------------------
+# Server process + resource sampling
+# -------------------------------
+def wait_for_port(host, port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def read_proc_stat(pid):
+    """Fields of /proc/<pid>/stat after the command name (Linux only)."""
+    with open(f"/proc/{pid}/stat", "r") as f:
+        # comm may contain spaces, so split after the closing paren
+        return f.read().rsplit(")", 1)[1].split()
+
+
+def process_tree(pid):
+    """pid plus all of its descendants (inference workers, their helpers)."""
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            ppid = int(read_proc_stat(name)[1])
+        except (OSError, IndexError, ValueError):
+            continue  # exited while we were looking
+        children.setdefault(ppid, []).append(int(name))
+
+    tree, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        tree.append(current)
+        todo.extend(children.get(current, ()))
+    return tree
+
+
+def read_proc_usage(pid):
+    """(cpu_seconds, rss_bytes) of a process, read from /proc (Linux only)."""
+    fields = read_proc_stat(pid)
+    utime, stime = int(fields[11]), int(fields[12])
+    cpu_seconds = (utime + stime) / os.sysconf("SC_CLK_TCK")
+
+    rss_bytes = 0
+    with open(f"/proc/{pid}/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_bytes = int(line.split()[1]) * 1024
+                break
+
+    return cpu_seconds, rss_bytes
+
+
+class ResourceSampler(threading.Thread):
+    """
+    CPU % and RSS of the server summed over its process tree, so inference
+    worker processes (--workers) are counted along with the server itself.
+    """
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.cpu_pct = []
+        self.rss = []
+        self.processes = 0
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        """{pid: (cpu_seconds, rss_bytes)} for the whole tree."""
+        usage = {}
+        for pid in process_tree(self.pid):
+            try:
+                usage[pid] = read_proc_usage(pid)
+            except OSError:
+                pass  # exited between listing and reading
+        return usage
+
+    def run(self):
+        last = self.sample()
+        if self.pid not in last:
+            return
+        last_t = time.perf_counter()
+
+        while not self._stop_event.wait(self.interval):
+            usage = self.sample()
+            if self.pid not in usage:
+                break
+            now = time.perf_counter()
+            # per-process deltas; a process that appeared since the last sample counts from 0
+            cpu = sum(used - last.get(pid, (0.0, 0))[0] for pid, (used, _) in usage.items())
+            self.cpu_pct.append(100.0 * cpu / (now - last_t))
+            self.rss.append(sum(rss for _, rss in usage.values()))
+            self.processes = max(self.processes, len(usage))
+            last, last_t = usage, now
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# -------------------------------
+# Simulated clients
+# -------------------------------
+class SimulatedClient:
+    """One phone: connects, listens for 'driver_state', records latency + seq per stream."""
+
+    def __init__(self, client_id, url, transports):
+        self.client_id = client_id
+        self.url = url
+        self.transports = transports
+
+        self.sio = socketio.Client(reconnection=False)
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.received = {}     # stream -> set of seqs seen
+
+        self.sio.on("driver_state", self.on_driver_state)
+
+    def on_driver_state(self, data):
+        recv_time = time.time()
+        stream = data.get("stream", 0)
+        seq = data.get("seq")
+
+        with self.lock:
+            if "t_frame" in data:
+                self.latencies.append(recv_time - data["t_frame"])
+            if seq is not None:
+                self.received.setdefault(stream, set()).add(seq)
+
+    def connect(self):
+        self.sio.connect(self.url, transports=self.transports, wait_timeout=10)
+
+    def stream_seqs(self):
+        """{stream: last seq the server has emitted} (the server's 'stream_status' ack)."""
+        status = self.sio.call("stream_status", {}, timeout=10)
+        return {int(stream): seq for stream, seq in status.items()}
+
+    def disconnect(self):
+        if self.sio.connected:
+            self.sio.disconnect()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(clients, sampler, duration, start_seqs, end_seqs):
+    """
+    start_seqs / end_seqs: the server's last seq per stream when measuring
+    started / stopped. Every client should have received every seq in
+    between, including those at the very end of a stream.
+    """
+    latencies = sorted(lat for c in clients for lat in c.latencies)
+    messages = len(latencies)
+
+    dropped = 0
+    for c in clients:
+        for stream, last in end_seqs.items():
+            first = start_seqs.get(stream, 0)
+            seen = c.received.get(stream, set())
+            dropped += sum(1 for seq in range(first + 1, last + 1) if seq not in seen)
+
+    ms = 1000.0
+    return {
+        "clients": len(clients),
+        "streams": len(end_seqs),
+        "duration_s": round(duration, 2),
+        "messages": messages,
+        "messages_per_s": round(messages / duration, 1) if duration > 0 else 0.0,
+        "dropped": dropped,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * ms, 2),
+            "p90": round(percentile(latencies, 90) * ms, 2),
+            "p99": round(percentile(latencies, 99) * ms, 2),
+            "max": round((latencies[-1] if latencies else 0.0) * ms, 2),
+        },
+        "server_cpu_pct": {
+            "avg": round(sum(sampler.cpu_pct) / len(sampler.cpu_pct), 1) if sampler.cpu_pct else 0.0,
+            "max": round(max(sampler.cpu_pct), 1) if sampler.cpu_pct else 0.0,
+        },
+        "server_rss_mb": {
+            "max": round(max(sampler.rss) / 2**20, 1) if sampler.rss else 0.0,
+        },
+        "server_processes": sampler.processes,
+    }
+
+
+# =================================================================
+#                            MAIN
+# =================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drive Sense end-to-end load test: starts the server with M streams, connects N "
+                    "simulated Socket.IO clients and measures frame-read -> client latency, drops, CPU and RSS")
+    parser.add_argument("--clients", type=int, default=10, help="number of simulated phones (N)")
+    parser.add_argument("--streams", type=int, default=4, help="number of server input streams (M)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to measure")
+    parser.add_argument("--folder", choices=["E", "A", "B", "C", "D"], default="E",
+                        help="E: fake replay (no model); A–D: real decode + inference on that dataset")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="A–D: run on a generated dataset in a temp dir instead of ../dataset")
+    parser.add_argument("--frames", type=int, default=1000, help="--synthetic: frames to generate")
+    parser.add_argument("--workers", type=int, default=0, help="A–D: server inference worker processes")
+    parser.add_argument("--speed", default="10", help="replay speed passed to the server (number or 'max')")
+    parser.add_argument("--txt", help="E: replay file (default: a generated synthetic one)")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--transport", choices=["polling", "websocket", "both"], default="both",
+                        help="client transport; the Android app uses polling with websocket upgrade")
+    parser.add_argument("--server-log", help="keep the server log here (default: temp dir, removed afterwards)")
+    parser.add_argument("--report", help="write the JSON summary to this file")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if p99 latency exceeds this")
+    parser.add_argument("--max-dropped", type=int, help="fail if more events than this were dropped")
+    args = parser.parse_args()
+
+    if args.folder != "E" and not os.path.exists(MODEL_PATH):
+        print(f"❌ --folder {args.folder} runs the real model, but {MODEL_PATH} is missing "
+              f"(generate_dataset.py can write a random one)")
+        raise SystemExit(1)
+
+    with tempfile.TemporaryDirectory(prefix="drivesense_loadtest_") as tmp_dir:
+        command = server_command(args, tmp_dir)
+
+        # --------------------
+        # START SERVER
+        # --------------------
+        server_log = args.server_log or os.path.join(tmp_dir, "server.log")
+        print(f"🚀 Starting server on port {args.port} (folder {args.folder}, {args.streams} streams, "
+              f"speed={args.speed})")
+        print(f"📄 Server log: {server_log}")
+
+        with open(server_log, "w", encoding="utf-8") as log:
+            server = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, cwd=SCRIPT_DIR)
+
+        clients = []
+        try:
+            if not wait_for_port("127.0.0.1", args.port, timeout=120):
+                print("❌ Server did not come up; last lines of its log:")
+                with open(server_log, encoding="utf-8") as log:
+                    print("".join(log.readlines()[-20:]))
+                raise SystemExit(1)
+
+            sampler = ResourceSampler(server.pid)
+            sampler.start()
+
+            # --------------------
+            # CONNECT CLIENTS
+            # --------------------
+            transports = ["polling", "websocket"] if args.transport == "both" else [args.transport]
+            url = f"http://127.0.0.1:{args.port}"
+
+            for client_id in range(args.clients):
+                client = SimulatedClient(client_id, url, transports)
+                client.connect()
+                clients.append(client)
+            print(f"✅ {len(clients)} clients connected, measuring for {args.duration:.0f}s ...")
+
+            start_seqs = clients[0].stream_seqs()
+            start = time.perf_counter()
+            time.sleep(args.duration)
+            duration = time.perf_counter() - start
+            end_seqs = clients[0].stream_seqs()
+            time.sleep(DRAIN_SECONDS)  # let events emitted up to end_seqs arrive
+
+            for client in clients:
+                client.disconnect()
+            sampler.stop()
+        finally:
+            for client in clients:
+                client.disconnect()
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    # --------------------
+    # REPORT
+    # --------------------
+    summary = summarize(clients, sampler, duration, start_seqs, end_seqs)
+    print(json.dumps(summary, indent=4))
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+        print(f"📄 Report written to {args.report}")
+
+    failed = False
+    if args.max_p99_ms is not None and summary["latency_ms"]["p99"] > args.max_p99_ms:
+        print(f"❌ p99 latency {summary['latency_ms']['p99']} ms > {args.max_p99_ms} ms")
+        failed = True
+    if args.max_dropped is not None and summary["dropped"] > args.max_dropped:
+        print(f"❌ {summary['dropped']} dropped events > {args.max_dropped}")
+        failed = True
+
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,3 @@
+# What DriveModel is fed. Kept free of imports so light modules (the
+# SQLite prediction cache) can depend on it without pulling in PIL / torch.
+MODEL_INPUT_SIZE = (224, 224)   # (height, width)
@@ -0,0 +1,241 @@
+import os
+import time
+import threading
+
+import torch
+
+from train import load_drive_model
+from image_io import load_rgb
+from preprocess import FrameBuffers
+from prediction_cache import model_fingerprint
+
+MOOD_CLASSES = 5
+SCENE_CLASSES = 6
+
+
+def file_fingerprint(path):
+    """(mtime_ns, size) — changes whenever the file is rewritten."""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class ModelRegistry:
+    """
+    Owns the live DriveModel and swaps in new weights without a restart.
+
+    A reload loads the new file on a background thread, warms it up,
+    validates it on a few real frames (output shapes, finite logits) and
+    only then replaces the live reference under a lock. Inference code calls
+    current() once per frame / batch, so a swap always lands between batches
+    and in-flight work finishes on the model it started with. A model that
+    fails to load or validate is dropped and the old one keeps serving;
+    rollback() restores the previous model after a swap.
+
+    Only .pth files in the directory of the initial model can be loaded
+    (resolve_model_path), so a reload request can't point at arbitrary files.
+
+    With a worker pool, the validated file is also pushed to every worker
+    (InferenceWorkerPool.reload) and rolled back there if any worker fails.
+    """
+
+    def __init__(self, model_path, validation_images=(), pool=None, warmup_iters=3):
+        """
+        validation_images: up to 4 frames to validate new models on, as
+                           image paths or RGB PIL images (decoded video
+                           frames). Paths that don't exist are skipped; with
+                           none left, only the dummy warm-up batch runs.
+        """
+        self.model_path = os.path.realpath(model_path)
+        self.model_dir = os.path.dirname(self.model_path)
+        self.validation_images = list(validation_images)[:4]
+        self.pool = pool
+        self.warmup_iters = warmup_iters
+
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()   # one reload at a time
+        self._model = None
+        self._previous = None
+        self._has_previous = False   # pool mode keeps no model here, so track this separately
+        self._previous_fingerprint = None
+        self._previous_path = None
+        self._swapping = False       # pool workers mid-swap: unsure which model answers
+        self.version = 0
+        self.last_error = None
+
+        self._fingerprint = None
+        self._watcher = None
+        self._stop = threading.Event()
+
+        # First load is synchronous: the server can't run without a model
+        if pool is None:
+            self._model = self._load_candidate(model_path)
+        self._fingerprint = file_fingerprint(model_path)
+        # content hash, for PredictionCache (and what pool workers hold their models by)
+        self.model_fingerprint = pool.model_key if pool is not None else model_fingerprint(model_path)
+        self.version = 1
+
+    # --------------------
+    # Live model
+    # --------------------
+    def current(self):
+        with self._lock:
+            return self._model
+
+    def snapshot(self):
+        """
+        (model, model_fingerprint) read together, so cached logits are always
+        filed under the model that produced them. The fingerprint is None
+        while pool workers are swapping (don't use the cache then).
+        """
+        with self._lock:
+            return self._model, (None if self._swapping else self.model_fingerprint)
+
+    def rollback(self):
+        """Swap the previous model back in (no-op if there is none)."""
+        with self._reload_lock:
+            with self._lock:
+                if not self._has_previous:
+                    return False
+                current = self.model_path, self.model_fingerprint
+                self._model, self._previous = self._previous, None
+                self.model_fingerprint = self._previous_fingerprint
+                self.model_path = self._previous_path
+                self._has_previous = False
+                self._swapping = self.pool is not None
+                self.version += 1
+            # Whatever is on disk now counts as seen: the watcher only reacts
+            # to the next write, not to the file that was just rolled back.
+            try:
+                self._fingerprint = file_fingerprint(self.model_path)
+            except OSError:
+                self._fingerprint = None
+            if self.pool is not None:
+                try:
+                    self.pool.rollback((self.model_path, self.model_fingerprint))
+                except Exception as e:
+                    # workers may now disagree: keep the cache off until a reload succeeds
+                    self.last_error = repr(e)
+                    print(f"❌ Worker rollback from {current[0]} failed: {e!r}")
+                    return False
+                self._swapping = False
+            print(f"↩️  Rolled back to the previous model (version {self.version})")
+            return True
+
+    # --------------------
+    # Reloading
+    # --------------------
+    def resolve_model_path(self, path):
+        """Absolute path of a .pth file in model_dir (relative names allowed); ValueError otherwise."""
+        resolved = os.path.realpath(os.path.join(self.model_dir, path))
+        if os.path.dirname(resolved) != self.model_dir or not resolved.endswith(".pth"):
+            raise ValueError(f"model files must be .pth files in {self.model_dir}")
+        return resolved
+
+    def _load_candidate(self, path):
+        model = load_drive_model(path)
+
+        batch = FrameBuffers(1)
+        dummy = torch.zeros(1, 3, batch.height, batch.width)
+
+        with torch.no_grad():
+            # Warm-up: first forward passes pay for allocator / kernel setup
+            for _ in range(self.warmup_iters):
+                model(dummy)
+
+            # Validation on real frames
+            for img in self.validation_images:
+                if isinstance(img, str):
+                    if not os.path.exists(img):
+                        continue   # e.g. removed since startup
+                    img = load_rgb(img)
+                batch.put_image(0, img)
+                mood_logits, scene_logits = model(batch.images(1))
+                if mood_logits.shape != (1, MOOD_CLASSES) or scene_logits.shape != (1, SCENE_CLASSES):
+                    raise ValueError(f"unexpected output shapes {tuple(mood_logits.shape)}, "
+                                     f"{tuple(scene_logits.shape)}")
+                if not (torch.isfinite(mood_logits).all() and torch.isfinite(scene_logits).all()):
+                    raise ValueError("non-finite logits on a validation frame")
+
+        return model
+
+    def _reload(self, path):
+        with self._reload_lock:
+            start = time.perf_counter()
+            try:
+                fingerprint = file_fingerprint(path)
+            except OSError as e:
+                self.last_error = repr(e)
+                print(f"❌ Model file {path} not readable, keeping version {self.version}: {e!r}")
+                return False
+
+            # Remember this file version either way, so the watcher doesn't
+            # retry a bad file every tick.
+            self._fingerprint = fingerprint
+
+            try:
+                candidate = self._load_candidate(path)
+                candidate_fingerprint = model_fingerprint(path)
+                if self.pool is not None:
+                    self._swapping = True
+                    previous = (self._previous_path, self._previous_fingerprint) if self._has_previous else None
+                    # raises (after putting workers back on the current model) on failure
+                    self.pool.reload(path, candidate_fingerprint, (self.model_path, self.model_fingerprint),
+                                     previous)
+            except Exception as e:
+                self._swapping = False  # workers were rolled back to the current model
+                self.last_error = repr(e)
+                print(f"❌ Model reload from {path} failed, keeping version {self.version}: {e!r}")
+                return False
+
+            with self._lock:
+                self._previous = self._model
+                self._previous_fingerprint = self.model_fingerprint
+                self._previous_path = self.model_path
+                self.model_fingerprint = candidate_fingerprint
+                self._swapping = False
+                self._has_previous = True
+                self._model = candidate if self.pool is None else None
+                self.model_path = path
+                self.version += 1
+                self.last_error = None
+
+            print(f"✅ Model swapped to {path} (version {self.version}, "
+                  f"{time.perf_counter() - start:.1f}s to load + validate)")
+            return True
+
+    def request_reload(self, path=None):
+        """
+        Load `path` (default: the current model file) on a background thread.
+        Raises ValueError for paths outside model_dir.
+        """
+        path = self.resolve_model_path(path or self.model_path)
+        thread = threading.Thread(target=self._reload, args=(path,), daemon=True)
+        thread.start()
+        return thread
+
+    # --------------------
+    # File watching
+    # --------------------
+    def watch(self, interval=2.0):
+        """Poll the model file; reload once a new version has stopped changing."""
+        def run():
+            pending = None
+            while not self._stop.wait(interval):
+                try:
+                    fingerprint = file_fingerprint(self.model_path)
+                except OSError:
+                    continue  # mid-replace; try again next tick
+                if fingerprint == self._fingerprint:
+                    pending = None
+                elif fingerprint == pending:
+                    # unchanged for a whole interval -> the write has finished
+                    self._reload(self.model_path)
+                    pending = None
+                else:
+                    pending = fingerprint
+
+        self._watcher = threading.Thread(target=run, daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
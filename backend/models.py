@@ -55,7 +55,12 @@ class DriveModel(nn.Module):
         )
 
     def forward(self, img, meta):
-        img_f = self.image_encoder(img)
+        pooled = self.image_encoder.feature_extractor(img).flatten(1)
+        return self.forward_from_pooled(pooled, meta)
+
+    def forward_from_pooled(self, pooled, meta):
+        """Everything after the backbone, from precomputed 1280-d pooled features."""
+        img_f = self.image_encoder.fc(pooled)
         meta_f = self.meta_encoder(meta)
         fused = torch.cat([img_f, meta_f], dim=1)
 
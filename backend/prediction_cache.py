@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+from model_input import MODEL_INPUT_SIZE
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(SCRIPT_DIR, "prediction_cache.sqlite")
+
+DEFAULT_MAX_ENTRIES = 1_000_000   # ~100 bytes per frame on disk
+COMMIT_EVERY = 256                # writes (or LRU touches) per transaction
+EVICT_CHECK_EVERY = 1024          # puts between size checks
+
+# Part of every model fingerprint: a change in preprocessing changes the
+# logits just like new weights do.
+PREPROCESS_TAG = f"load_rgb(draft)+cv2_resize{MODEL_INPUT_SIZE}(area)+to_tensor".encode()
+
+
+def content_key(data):
+    """16-byte hash of a frame's encoded bytes (JPEG file) or raw pixels (video frame)."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def model_fingerprint(model_path):
+    """Hash of the model file's contents (plus preprocessing), not its mtime."""
+    h = hashlib.blake2b(PREPROCESS_TAG, digest_size=16)
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def _pack(values):
+    return array("f", values).tobytes()
+
+
+def _unpack(blob):
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class PredictionCache:
+    """
+    On-disk cache of per-frame (mood_logits, scene_logits).
+
+    Rows are keyed by (model fingerprint, frame content hash), so a new
+    model.pth never sees another model's logits: its fingerprint simply
+    has no rows yet, and the old rows age out. The cache is bounded to
+    `max_entries` rows with LRU eviction (least recently read or written
+    first). One SQLite connection, shared by all threads under a lock.
+
+    Hits don't write: their LRU timestamps are collected in memory and
+    written in one batch every COMMIT_EVERY hits and on commit(). Call
+    commit() at the end of a run and close() on shutdown, or the last
+    (< COMMIT_EVERY) writes are lost.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS logits ("
+            " model BLOB NOT NULL, key BLOB NOT NULL,"
+            " mood BLOB NOT NULL, scene BLOB NOT NULL,"
+            " used INTEGER NOT NULL,"
+            " PRIMARY KEY (model, key)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS logits_used ON logits (used)")
+        self._conn.commit()
+
+        # LRU clock: a counter, continued across runs
+        self._clock = self._conn.execute("SELECT COALESCE(MAX(used), 0) FROM logits").fetchone()[0]
+        self._writes = 0
+        self._puts = 0
+        self._touched = {}   # (model, key) -> LRU clock of hits not yet written
+        self._closed = False
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % COMMIT_EVERY == 0:
+            self._conn.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE logits SET used = MAX(used, ?) WHERE model = ? AND key = ?",
+                [(used, model, key) for (model, key), used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def get(self, model, key):
+        """(mood_logits, scene_logits) lists, or None on a miss."""
+        with self._lock:
+            if self._closed:
+                return None
+            row = self._conn.execute(
+                "SELECT mood, scene FROM logits WHERE model = ? AND key = ?", (model, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._touched[(model, key)] = self._tick()
+            if len(self._touched) >= COMMIT_EVERY:
+                self._flush_touched()
+                self._conn.commit()
+            self.hits += 1
+        return _unpack(row[0]), _unpack(row[1])
+
+    def put(self, model, key, mood_logits, scene_logits):
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO logits (model, key, mood, scene, used) VALUES (?, ?, ?, ?, ?)",
+                (model, key, _pack(mood_logits), _pack(scene_logits), self._tick())
+            )
+            self._wrote()
+            self._puts += 1
+            if self._puts % EVICT_CHECK_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used rows down to 90% of max_entries."""
+        self._flush_touched()
+        count = self._conn.execute("SELECT COUNT(*) FROM logits").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM logits WHERE used <= (SELECT used FROM logits ORDER BY used LIMIT 1 OFFSET ?)",
+            (excess - 1,)
+        )
+        self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None}
+
+    def commit(self):
+        """Write out pending inserts and LRU touches (end of a run / stream)."""
+        with self._lock:
+            if not self._closed:
+                self._flush_touched()
+                self._conn.commit()
+
+    def close(self):
+        """Commit, evict and close; safe to call more than once (e.g. from atexit)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._evict()
+            self._conn.commit()
+            self._conn.close()
+            self._closed = True
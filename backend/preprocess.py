@@ -0,0 +1,69 @@
+import threading
+
+import cv2
+import numpy as np
+import torch
+
+from model_input import MODEL_INPUT_SIZE
+
+
+class FrameBuffers:
+    """
+    Reusable, preallocated input buffers for up to `batch_size` frames.
+
+    put_image() / put_bgr() resize straight into the uint8 HWC staging
+    buffer (cv2.resize with dst=, no intermediate resized image), and
+    images() converts the filled slots to float CHW in [0, 1] inside the
+    preallocated float buffer, without allocating new tensors per frame.
+    Shrinking uses area averaging: close to, though not bit-identical
+    with, the antialiased Resize((224, 224)) + ToTensor() used in
+    training. The returned tensor is a view into the buffer, so it is only
+    valid until the next put_*() on the same slots.
+    """
+
+    def __init__(self, batch_size=1, size=MODEL_INPUT_SIZE):
+        self.batch_size = batch_size
+        self.height, self.width = size
+
+        self.pixels = torch.empty((batch_size, self.height, self.width, 3), dtype=torch.uint8)
+        self.float_images = torch.empty((batch_size, 3, self.height, self.width), dtype=torch.float32)
+
+        # numpy view sharing memory with the staging tensor
+        self._pixels_np = self.pixels.numpy()
+
+    def _resize_into(self, slot, pixels):
+        dst = self._pixels_np[slot]
+        if pixels.shape[:2] == (self.height, self.width):
+            np.copyto(dst, pixels)
+            return dst
+        shrinking = pixels.shape[0] >= self.height and pixels.shape[1] >= self.width
+        cv2.resize(pixels, (self.width, self.height), dst=dst,
+                   interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+        return dst
+
+    def put_image(self, slot, img):
+        """Resize an RGB PIL image (or HWC uint8 RGB array) into `slot` of the staging buffer."""
+        self._resize_into(slot, np.asarray(img))
+
+    def put_bgr(self, slot, frame_bgr):
+        """Resize a BGR frame (OpenCV / video decode) into `slot`, converting to RGB in place."""
+        dst = self._resize_into(slot, frame_bgr)
+        cv2.cvtColor(dst, cv2.COLOR_BGR2RGB, dst=dst)
+
+    def images(self, n=None):
+        """Float [n, 3, H, W] batch in [0, 1], converted in place."""
+        n = self.batch_size if n is None else n
+        out = self.float_images[:n]
+        out.copy_(self.pixels[:n].permute(0, 3, 1, 2))
+        return out.div_(255.0)
+
+
+_local = threading.local()
+
+
+def thread_buffers(batch_size=1):
+    """Per-thread FrameBuffers, so concurrent streams never share a buffer."""
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None or buffers.batch_size < batch_size:
+        buffers = _local.buffers = FrameBuffers(batch_size)
+    return buffers
@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+from collections import Counter
+
+import torch
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.join(SCRIPT_DIR, "profiles")
+
+DEFAULT_FRAMES = 100
+MAX_FRAMES = 10_000
+MAX_SECONDS = 300.0      # hard cap on any session, also the watchdog for frame-count sessions
+SAMPLE_INTERVAL = 0.005  # seconds between Python stack samples
+
+
+class _NoSpan:
+    """Shared do-nothing context manager returned while profiling is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "events", "name", "record", "start")
+
+    def __init__(self, profiler, events, name):
+        self.profiler = profiler
+        self.events = events   # the session's event list when the span began
+        self.name = name
+
+    def __enter__(self):
+        # record_function makes the stage show up in the torch.profiler trace too
+        self.record = torch.profiler.record_function(self.name)
+        self.record.__enter__()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        self.record.__exit__(*exc)
+        self.profiler._record(self.events, (self.name, threading.get_ident(), self.start, end - self.start))
+        return False
+
+
+class PythonSampler(threading.Thread):
+    """Samples every thread's Python stack at a fixed interval (collapsed-stack counts)."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class StageProfiler:
+    """
+    On-demand profiler for the live inference loop.
+
+    request() only arms it; the next frame boundary (tick() from an
+    inference thread) starts a session on that thread, which counts the N
+    frames. Any thread's tick() ends it once S seconds have passed, a timer
+    ends it at the deadline (MAX_SECONDS at most) even if no frames arrive,
+    and release() ends it when the owning loop exits. A session captures:
+    - stage spans (decode, transform, forward, hysteresis, log, render, emit)
+      from every thread, as a Chrome trace (chrome://tracing, Perfetto)
+    - a torch.profiler CPU trace with the same stages as user annotations
+    - Python stack samples of all threads, as collapsed stacks
+      (speedscope, flamegraph.pl)
+
+    While off, span() returns a shared no-op context manager and tick()
+    returns after one attribute check, so the loop pays no real cost.
+    """
+
+    def __init__(self, out_dir=PROFILE_DIR):
+        self.out_dir = out_dir
+        self.active = False
+        self.last_result = None
+
+        self._lock = threading.Lock()
+        self._request = None
+        self._events = None                     # event list of the running session
+        self._events_lock = threading.Lock()    # spans end on any thread, also after stop()
+        self._sessions = itertools.count(1)
+        self._session = None
+        self._timer = None
+
+    # --------------------
+    # Hot path
+    # --------------------
+    def span(self, name):
+        if not self.active:
+            return _NO_SPAN
+        return _Span(self, self._events, name)
+
+    def _record(self, events, event):
+        """Add a finished span, unless its session has ended (the writer owns that list now)."""
+        with self._events_lock:
+            if events is not None and events is self._events:
+                events.append(event)
+
+    def tick(self):
+        """Frame boundary: starts an armed session or ends a finished one."""
+        if self._request is None and not self.active:
+            return
+        with self._lock:
+            if not self.active:
+                if self._request is not None:
+                    self._start(*self._request)
+                    self._request = None
+                return
+
+            if threading.get_ident() == self._owner:
+                self._frames_seen += 1
+            if ((self._frames is not None and self._frames_seen >= self._frames)
+                    or time.perf_counter() >= self._deadline):
+                self._stop()
+
+    def release(self):
+        """The calling inference loop is exiting: end the session it owns, if any."""
+        with self._lock:
+            if self.active and threading.get_ident() == self._owner:
+                self._stop()
+
+    def _timeout(self, session):
+        with self._lock:
+            if self.active and self._session == session:
+                self._stop()
+
+    # --------------------
+    # Control
+    # --------------------
+    def request(self, frames=None, seconds=None):
+        """
+        Arm a session for the next `frames` frames and/or `seconds` seconds,
+        clamped to MAX_FRAMES / MAX_SECONDS.
+        """
+        if frames is None and seconds is None:
+            frames = DEFAULT_FRAMES
+        if frames is not None:
+            frames = min(max(int(frames), 1), MAX_FRAMES)
+        if seconds is not None:
+            seconds = min(max(float(seconds), 0.1), MAX_SECONDS)
+        with self._lock:
+            if self.active or self._request is not None:
+                return False
+            self._request = (frames, seconds)
+        print(f"🔬 Profiling armed (frames={frames}, seconds={seconds})")
+        return True
+
+    def status(self):
+        return {
+            "active": self.active,
+            "armed": self._request is not None,
+            "last_result": self.last_result,
+        }
+
+    def _start(self, frames, seconds):
+        self._frames = frames
+        seconds = MAX_SECONDS if seconds is None else seconds
+        self._deadline = time.perf_counter() + seconds
+        self._frames_seen = 0
+        self._owner = threading.get_ident()
+        with self._events_lock:
+            self._events = []
+        self._t0 = time.perf_counter_ns()
+
+        self._torch = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU],
+                                             record_shapes=True)
+        self._torch.start()
+        self._sampler = PythonSampler()
+        self._sampler.start()
+        self._session = next(self._sessions)
+        self._timer = threading.Timer(seconds, self._timeout, args=(self._session,))
+        self._timer.daemon = True
+        self._timer.start()
+        self.active = True
+        print(f"🔬 Profiling started on {threading.current_thread().name}")
+
+    def _stop(self):
+        self.active = False
+        with self._events_lock:
+            events, self._events = self._events, None
+        self._timer.cancel()
+        self._torch.stop()
+        self._sampler.stop()
+
+        # Writing traces can take a while; keep it off the inference thread
+        writer = threading.Thread(
+            target=self._write,
+            args=(events, self._t0, self._torch, self._sampler.counts, self._session),
+            daemon=True
+        )
+        writer.start()
+
+    def _write(self, events, t0, torch_profile, stacks, session):
+        os.makedirs(self.out_dir, exist_ok=True)
+        # pid + session number: sessions within the same second never overwrite each other
+        base = os.path.join(self.out_dir, f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{session}")
+
+        names = {t.ident: t.name for t in threading.enumerate()}
+        pid = os.getpid()
+        trace = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": names.get(tid, str(tid))}}
+            for tid in {tid for _, tid, _, _ in events}
+        ]
+        trace.extend(
+            {"name": name, "cat": "stage", "ph": "X", "pid": pid, "tid": tid,
+             "ts": (start - t0) / 1000, "dur": dur / 1000}
+            for name, tid, start, dur in events
+        )
+        spans_path = base + "_stages.json"
+        with open(spans_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+        torch_path = base + "_torch.json"
+        torch_profile.export_chrome_trace(torch_path)
+
+        stacks_path = base + "_python.collapsed"
+        with open(stacks_path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        self.last_result = {"stages": spans_path, "torch": torch_path, "python": stacks_path,
+                            "spans": len(events)}
+        print(f"🔬 Profile written: {spans_path}, {torch_path}, {stacks_path}")
+
+
+profiler = StageProfiler()
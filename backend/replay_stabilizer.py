@@ -0,0 +1,174 @@
+import csv
+import json
+import argparse
+import itertools
+from collections import OrderedDict
+
+from stabilizer import StreakStabilizer, EvidenceStabilizer
+
+MOOD_LABELS = ["Relaxed", "Focused", "Stressed", "Tired", "Distracted"]
+SCENE_LABELS = ["City", "Highway", "Forest", "Garage", "Offroad", "Traffic"]
+LABELS = {"mood": MOOD_LABELS, "scene": SCENE_LABELS}
+
+CHANGE_THRESHOLD = 10   # server default
+FRAME_INTERVAL = 0.33   # seconds between frames at 1x
+
+
+# -------------------------------
+# Prediction log
+# -------------------------------
+def load_predictions(csv_path):
+    """
+    Reads a batch_predict.py predictions.csv. Returns
+    {mapping: {"mood": [(pred, label, probs), ...], "scene": [...]}} in frame order.
+    """
+    recordings = OrderedDict()
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            rec = recordings.setdefault(row["mapping"], {"mood": [], "scene": []})
+            for key, labels in LABELS.items():
+                probs = [float(row[f"p_{key}_{name}"]) for name in labels]
+                rec[key].append((row[f"{key}_pred"], row[f"{key}_label"], probs))
+    return recordings
+
+
+# -------------------------------
+# Replay + scoring
+# -------------------------------
+def replay(frames, make_tracker):
+    """Stable value after each frame."""
+    tracker = make_tracker()
+    stable = []
+    for pred, _, probs in frames:
+        tracker.update(pred, probs)
+        stable.append(tracker.stable)
+    return stable
+
+
+def score(frames, stable):
+    """
+    Detection delay (frames) for every change of the true label, plus flips.
+    A change counts as missed if the stable state never reaches the new
+    label before the next change.
+    """
+    truth = [label for _, label, _ in frames]
+    changes = [t for t in range(1, len(truth)) if truth[t] != truth[t - 1]]
+    bounds = changes[1:] + [len(truth)]
+
+    delays, missed = [], 0
+    for start, end in zip(changes, bounds):
+        hit = next((f for f in range(start, end) if stable[f] == truth[start]), None)
+        if hit is None:
+            missed += 1
+        else:
+            delays.append(hit - start)
+
+    flips = false_flips = 0
+    for t in range(1, len(stable)):
+        if stable[t] != stable[t - 1] and stable[t - 1] is not None:
+            flips += 1
+            false_flips += int(stable[t] != truth[t])
+
+    scored = [(s, y) for s, y in zip(stable, truth) if s is not None]
+    return {
+        "delays": delays,
+        "changes": len(changes),
+        "missed": missed,
+        "flips": flips,
+        "false_flips": false_flips,
+        "correct": sum(int(s == y) for s, y in scored),
+        "scored": len(scored),
+        "frames": len(truth),
+    }
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def summarize(name, key, results):
+    delays = [d for r in results for d in r["delays"]]
+    frames = sum(r["frames"] for r in results)
+    scored = sum(r["scored"] for r in results)
+    p50, p90 = percentile(delays, 50), percentile(delays, 90)
+    return {
+        "stabilizer": name,
+        "key": key,
+        "changes": sum(r["changes"] for r in results),
+        "missed": sum(r["missed"] for r in results),
+        "delay_p50_s": None if p50 is None else round(p50 * FRAME_INTERVAL, 2),
+        "delay_p90_s": None if p90 is None else round(p90 * FRAME_INTERVAL, 2),
+        "delay_mean_s": round(sum(delays) / len(delays) * FRAME_INTERVAL, 2) if delays else None,
+        "flips_per_100": round(100 * sum(r["flips"] for r in results) / max(frames, 1), 2),
+        "false_flips_per_100": round(100 * sum(r["false_flips"] for r in results) / max(frames, 1), 2),
+        "stable_accuracy": round(sum(r["correct"] for r in results) / max(scored, 1), 4),
+    }
+
+
+def candidate_stabilizers(args):
+    """(name, key -> factory) for the baseline streaks and the evidence grid."""
+    for n in args.streak:
+        yield f"streak n={n}", lambda key, n=n: (lambda: StreakStabilizer(n))
+
+    for threshold, decay, min_frames in itertools.product(args.thresholds, args.decays, args.min_frames):
+        name = f"evidence h={threshold:g} decay={decay:g} min={min_frames}"
+        yield name, lambda key, h=threshold, d=decay, m=min_frames: (
+            lambda: EvidenceStabilizer(LABELS[key], threshold=h, decay=d, min_frames=m,
+                                       max_frames=args.max_frames))
+
+
+def format_table(rows):
+    cols = ["stabilizer", "changes", "missed", "delay_p50_s", "delay_p90_s", "delay_mean_s",
+            "flips_per_100", "false_flips_per_100", "stable_accuracy"]
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(cols, widths))]
+    for r in rows:
+        lines.append("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+    return "\n".join(lines)
+
+
+# =================================================================
+#                            MAIN
+# =================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay a batch_predict.py predictions.csv through stabilizers: detection delay vs flip rate")
+    parser.add_argument("predictions", help="predictions.csv from batch_predict.py (with p_* columns)")
+    parser.add_argument("--key", choices=["mood", "scene", "both"], default="both")
+    parser.add_argument("--streak", type=int, nargs="*", default=[CHANGE_THRESHOLD],
+                        help="N-in-a-row baselines to compare against")
+    parser.add_argument("--thresholds", type=float, nargs="*", default=[4.0, 6.0, 8.0],
+                        help="evidence thresholds to try")
+    parser.add_argument("--decays", type=float, nargs="*", default=[0.7, 0.8, 0.9],
+                        help="evidence decays to try")
+    parser.add_argument("--min-frames", type=int, nargs="*", default=[2, 3],
+                        help="evidence minimum frames in a row to try")
+    parser.add_argument("--max-frames", type=int, default=CHANGE_THRESHOLD,
+                        help="evidence fallback: N identical predictions always commit")
+    parser.add_argument("--json", help="also write every result row to this JSON file")
+    args = parser.parse_args()
+
+    recordings = load_predictions(args.predictions)
+    total = sum(len(rec["mood"]) for rec in recordings.values())
+    print(f"📂 {len(recordings)} recordings, {total} frames from {args.predictions}")
+
+    keys = ["mood", "scene"] if args.key == "both" else [args.key]
+    all_rows = []
+    for key in keys:
+        rows = []
+        for name, factory in candidate_stabilizers(args):
+            make_tracker = factory(key)
+            results = [score(rec[key], replay(rec[key], make_tracker)) for rec in recordings.values()]
+            rows.append(summarize(name, key, results))
+
+        print(f"\n=== {key.upper()} ===")
+        print(format_table(rows))
+        all_rows.extend(rows)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(all_rows, f, indent=4)
+        print(f"\n✅ Results written to {args.json}")
@@ -0,0 +1,104 @@
+import math
+
+
+class StreakStabilizer:
+    """
+    N-in-a-row hysteresis for one label stream (mood or scene).
+
+    A new stable value is only committed after `threshold` consecutive
+    identical predictions. This is the same logic the inference loops
+    used inline, pulled out so every loop applies it identically.
+    """
+
+    def __init__(self, threshold=10):
+        self.threshold = threshold
+        self.stable = None          # stable value after hysteresis
+
+        self.streak_value = None
+        self.streak_count = 0
+
+    def update(self, value, probs=None):
+        """
+        Feed one instant prediction (probs are ignored here).
+        Returns (previous, new) when the stable value changes, else None.
+        """
+        if self.streak_value != value:
+            self.streak_value = value
+            self.streak_count = 1
+        else:
+            self.streak_count += 1
+
+        if self.streak_count == self.threshold and self.stable != self.streak_value:
+            previous = self.stable
+            self.stable = self.streak_value
+            return previous, self.stable
+
+        return None
+
+
+class EvidenceStabilizer:
+    """
+    Confidence-weighted hysteresis on softmax probabilities.
+
+    Every frame adds the log-odds margin of each class over its strongest
+    rival, log p_k - max_{j != k} log p_j, to a leaky per-class CUSUM:
+
+        S_k = max(0, decay * S_k + margin_k)
+
+    A class becomes stable once it has led for `min_frames` frames in a row
+    and S_k >= `threshold`, so confident, consistent predictions commit in
+    a few frames while weak or flickering ones leak away. As a fallback,
+    `max_frames` identical predictions in a row always commit — never
+    slower than StreakStabilizer(max_frames) on the same predictions.
+    """
+
+    def __init__(self, labels, threshold=6.0, decay=0.8, min_frames=3, max_frames=10, floor=1e-4):
+        self.labels = list(labels)
+        self.threshold = threshold
+        self.decay = decay
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.log_floor = math.log(floor)   # caps one frame's margin at -log(floor)
+        self.stable = None
+
+        self.evidence = [0.0] * len(self.labels)
+        self.streak_value = None
+        self.streak_count = 0
+
+    def update(self, value, probs=None):
+        """
+        Feed one instant prediction (label) and its class probabilities.
+        Returns (previous, new) when the stable value changes, else None.
+        """
+        if self.streak_value != value:
+            self.streak_value = value
+            self.streak_count = 1
+        else:
+            self.streak_count += 1
+
+        if probs is not None:
+            log_p = [max(math.log(p), self.log_floor) if p > 0 else self.log_floor for p in probs]
+            order = sorted(range(len(log_p)), key=log_p.__getitem__, reverse=True)
+            best, second = log_p[order[0]], log_p[order[1]]
+            for k, lp in enumerate(log_p):
+                margin = lp - (second if k == order[0] else best)
+                self.evidence[k] = max(0.0, self.decay * self.evidence[k] + margin)
+
+        k = self.labels.index(value)
+        confident = self.streak_count >= self.min_frames and self.evidence[k] >= self.threshold
+        if (confident or self.streak_count >= self.max_frames) and self.stable != value:
+            previous = self.stable
+            self.stable = value
+            self.evidence = [0.0] * len(self.labels)
+            return previous, self.stable
+
+        return None
+
+
+def make_stabilizer(kind, labels, threshold=10, **kwargs):
+    """'streak' (N-in-a-row) or 'evidence' (confidence-weighted), same update() API."""
+    if kind == "streak":
+        return StreakStabilizer(threshold)
+    if kind == "evidence":
+        return EvidenceStabilizer(labels, max_frames=threshold, **kwargs)
+    raise ValueError(f"unknown stabilizer: {kind}")
@@ -0,0 +1,52 @@
+import pytest
+
+from autotune import plan_cores, split_cores, candidate_threads, choose_config
+
+
+def row(threads, batch, p99, fps):
+    return {"threads": threads, "batch": batch, "p50_ms": p99, "p99_ms": p99, "frames_per_s": fps}
+
+
+def test_plan_cores_keeps_io_cores_free():
+    cores = list(range(8))
+    assert plan_cores(cores, 4, reserve_io=1) == ([4, 5, 6, 7], [0, 1, 2, 3])
+    # never eats into the reserve, even when asked for more threads
+    assert plan_cores(cores, 16, reserve_io=2) == ([2, 3, 4, 5, 6, 7], [0, 1])
+
+
+def test_plan_cores_on_a_machine_too_small_to_split():
+    assert plan_cores([0], 4, reserve_io=1) == ([0], [0])
+    assert plan_cores([3, 5], 4, reserve_io=1) == ([5], [3])
+
+
+@pytest.mark.parametrize("count,parts", [(8, 1), (8, 2), (7, 3), (6, 4), (12, 5)])
+def test_split_cores_is_disjoint_and_balanced(count, parts):
+    cores = list(range(10, 10 + count))
+    slices = split_cores(cores, parts)
+    assert len(slices) == parts
+    assert sum(slices, []) == cores
+    assert max(map(len, slices)) - min(map(len, slices)) <= 1
+
+
+def test_split_cores_more_parts_than_cores():
+    assert split_cores([4, 5], 5) == [[4], [5], [4], [5], [4]]
+
+
+def test_candidate_threads():
+    assert candidate_threads(1) == [1]
+    assert candidate_threads(4) == [1, 2, 4]
+    assert candidate_threads(6) == [1, 2, 4, 6]
+
+
+def test_choose_config_best_throughput_within_target():
+    results = [row(1, 1, 40, 25), row(2, 4, 90, 60), row(4, 4, 60, 60), row(4, 8, 150, 80)]
+    best, meets = choose_config(results, target_ms=100)
+    assert meets
+    assert (best["threads"], best["batch"]) == (2, 4)   # tie on throughput: fewer threads
+
+
+def test_choose_config_falls_back_to_fastest_batch_1():
+    results = [row(1, 1, 140, 7), row(2, 1, 120, 8), row(2, 4, 300, 13)]
+    best, meets = choose_config(results, target_ms=100)
+    assert not meets
+    assert (best["threads"], best["batch"]) == (2, 1)
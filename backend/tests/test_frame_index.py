@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from frame_index import FrameIndex, iter_mapping, write_mapping
+
+ENTRIES = [
+    {"frame": "frame_0.jpg", "mood": "calm", "scene": "city", "altitude": 12.5},
+    {"frame": "frame_1.jpg", "mood": "tense", "scene": "highway", "note": "a \"quoted\" ], [ value"},
+    {"frame": "frame_2.jpg", "mood": None, "scene": "city", "nested": {"a": [1, 2, {"b": 3}]}},
+    {"frame": "frame_3.jpg", "mood": "happy", "scene": "rural", "latitude": -1e-7},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_round_trip_at_chunk_boundaries(tmp_path, chunk_size):
+    path = str(tmp_path / "mapping.json")
+    assert write_mapping(path, iter(ENTRIES)) == len(ENTRIES)
+    assert list(iter_mapping(path, chunk_size=chunk_size)) == ENTRIES
+
+
+def test_write_mapping_matches_json_dump(tmp_path):
+    path = tmp_path / "mapping.json"
+    write_mapping(str(path), ENTRIES)
+    assert path.read_text(encoding="utf-8") == json.dumps(ENTRIES, indent=4)
+    assert not (tmp_path / "mapping.json.tmp").exists()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5])
+def test_empty_and_compact_arrays(tmp_path, chunk_size):
+    path = tmp_path / "mapping.json"
+    write_mapping(str(path), [])
+    assert path.read_text(encoding="utf-8") == "[]"
+    assert list(iter_mapping(str(path), chunk_size=chunk_size)) == []
+
+    path.write_text(json.dumps(ENTRIES, separators=(",", ":")), encoding="utf-8")
+    assert list(iter_mapping(str(path), chunk_size=chunk_size)) == ENTRIES
+
+
+def test_truncated_mapping_raises(tmp_path):
+    path = tmp_path / "mapping.json"
+    path.write_text(json.dumps(ENTRIES, indent=4)[:-40], encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_mapping(str(path), chunk_size=16))
+
+
+def test_not_an_array_raises(tmp_path):
+    path = tmp_path / "mapping.json"
+    path.write_text(json.dumps(ENTRIES[0]), encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_mapping(str(path)))
+
+
+def test_video_only_mapping_has_no_frame_files(tmp_path):
+    path = tmp_path / "mapping.json"
+    write_mapping(str(path), ({**entry, "video_only": True} for entry in ENTRIES))
+    index = FrameIndex.load(str(path))
+    assert index.video_only
+    with pytest.raises(ValueError, match="video-only"):
+        index.check_frame_files()
+
+    write_mapping(str(path), ENTRIES)
+    index = FrameIndex.load(str(path))
+    assert not index.video_only
+    index.check_frame_files()
@@ -0,0 +1,78 @@
+import prediction_cache
+from prediction_cache import PredictionCache, content_key
+
+MODEL = b"m" * 16
+
+
+def key(i):
+    return content_key(str(i).encode())
+
+
+def logits(i):
+    return [float(i), 0.5], [float(-i)]
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = PredictionCache(str(tmp_path / "cache.sqlite"))
+    assert cache.get(MODEL, key(1)) is None
+    cache.put(MODEL, key(1), *logits(1))
+    assert cache.get(MODEL, key(1)) == logits(1)
+    assert cache.get(b"x" * 16, key(1)) is None   # another model never sees these logits
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 0.3333}
+    cache.close()
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PredictionCache(path)
+    for i in range(5):
+        cache.put(MODEL, key(i), *logits(i))
+    cache.close()
+    cache.close()   # atexit may close it again
+
+    cache = PredictionCache(path)
+    assert [cache.get(MODEL, key(i)) for i in range(5)] == [logits(i) for i in range(5)]
+    cache.close()
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "COMMIT_EVERY", 2)
+    path = str(tmp_path / "cache.sqlite")
+    cache = PredictionCache(path, max_entries=10)
+    for i in range(12):
+        cache.put(MODEL, key(i), *logits(i))
+    # reading 0..2 makes them recent; their touches are batched, written on close
+    for i in range(3):
+        assert cache.get(MODEL, key(i)) == logits(i)
+    cache.close()
+
+    cache = PredictionCache(path, max_entries=10)
+    kept = [i for i in range(12) if cache.get(MODEL, key(i)) is not None]
+    cache.close()
+    # down to 90% of max_entries, the least recently used (3..5) gone
+    assert kept == [0, 1, 2, 6, 7, 8, 9, 10, 11]
+
+
+def test_lru_clock_continues_across_runs(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PredictionCache(path, max_entries=2)
+    cache.put(MODEL, key(0), *logits(0))
+    cache.put(MODEL, key(1), *logits(1))
+    cache.close()
+
+    cache = PredictionCache(path, max_entries=2)
+    cache.put(MODEL, key(2), *logits(2))
+    cache.close()
+
+    cache = PredictionCache(path, max_entries=2)
+    assert cache.get(MODEL, key(2)) == logits(2)
+    assert cache.get(MODEL, key(0)) is None
+    cache.close()
+
+
+def test_closed_cache_is_a_no_op(tmp_path):
+    cache = PredictionCache(str(tmp_path / "cache.sqlite"))
+    cache.close()
+    cache.put(MODEL, key(0), *logits(0))
+    assert cache.get(MODEL, key(0)) is None
+    cache.commit()
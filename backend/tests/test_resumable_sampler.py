@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from train import ResumableSampler
+
+
+def test_same_seed_and_epoch_same_order():
+    a, b = ResumableSampler(50, seed=3), ResumableSampler(50, seed=3)
+    a.set_position(2)
+    b.set_position(2)
+    assert list(a) == list(b)
+    assert sorted(a) == list(range(50))
+
+    b.set_position(3)
+    assert list(a) != list(b)
+
+
+@pytest.mark.parametrize("start", [0, 1, 17, 49, 50])
+def test_resume_mid_epoch_continues_the_same_order(start):
+    full = ResumableSampler(50, seed=7)
+    full.set_position(1)
+    resumed = ResumableSampler(50, seed=7)
+    resumed.set_position(1, start)
+    assert list(resumed) == list(full)[start:]
+    assert len(resumed) == 50 - start
+
+
+def test_replicas_shard_evenly_and_resume_per_rank():
+    shards = []
+    for rank in range(3):
+        sampler = ResumableSampler(10, seed=1, num_replicas=3, rank=rank)
+        sampler.set_position(0)
+        shards.append(list(sampler))
+        assert len(shards[-1]) == len(sampler) == 4
+
+        sampler.set_position(0, 2)
+        assert list(sampler) == shards[-1][2:]
+    assert set(sum(shards, [])) == set(range(10))
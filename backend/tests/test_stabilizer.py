@@ -0,0 +1,58 @@
+import pytest
+
+from stabilizer import StreakStabilizer, EvidenceStabilizer, make_stabilizer
+
+LABELS = ["calm", "tense", "happy"]
+
+
+def feed(stabilizer, values, probs=None):
+    return [stabilizer.update(v, probs) for v in values]
+
+
+def test_streak_commits_after_threshold_in_a_row():
+    s = StreakStabilizer(threshold=3)
+    assert feed(s, ["calm", "calm"]) == [None, None]
+    assert s.update("calm") == (None, "calm")
+    assert s.stable == "calm"
+
+    # a broken streak starts over
+    assert feed(s, ["tense", "tense", "calm", "tense", "tense"]) == [None] * 5
+    assert s.update("tense") == ("calm", "tense")
+
+
+def test_streak_does_not_recommit_the_stable_value():
+    s = StreakStabilizer(threshold=2)
+    feed(s, ["calm", "calm"])
+    assert feed(s, ["tense", "calm", "calm", "calm"]) == [None] * 4
+    assert s.stable == "calm"
+
+
+def test_evidence_commits_confident_predictions_early():
+    s = EvidenceStabilizer(LABELS, threshold=6.0, min_frames=3, max_frames=10)
+    probs = [0.01, 0.98, 0.01]
+    assert feed(s, ["tense", "tense"], probs) == [None, None]
+    assert s.update("tense", probs) == (None, "tense")
+
+
+def test_evidence_waits_for_max_frames_on_weak_predictions():
+    s = EvidenceStabilizer(LABELS, threshold=6.0, min_frames=3, max_frames=5)
+    probs = [0.3, 0.4, 0.3]
+    assert feed(s, ["tense"] * 4, probs) == [None] * 4
+    assert s.update("tense", probs) == (None, "tense")
+
+
+def test_evidence_never_slower_than_streak():
+    streak = StreakStabilizer(threshold=10)
+    evidence = EvidenceStabilizer(LABELS, max_frames=10)
+    values = ["calm"] * 4 + ["happy"] * 12
+    streak_changes = [i for i, r in enumerate(feed(streak, values)) if r]
+    evidence_changes = [i for i, r in enumerate(feed(evidence, values)) if r]
+    assert evidence_changes == streak_changes
+
+
+def test_make_stabilizer():
+    assert isinstance(make_stabilizer("streak", LABELS, threshold=4), StreakStabilizer)
+    evidence = make_stabilizer("evidence", LABELS, threshold=4, decay=0.5)
+    assert (evidence.max_frames, evidence.decay) == (4, 0.5)
+    with pytest.raises(ValueError):
+        make_stabilizer("median", LABELS)
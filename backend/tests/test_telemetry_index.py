@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("torch")
+
+from frame_index import FrameIndex
+from video_source import TelemetryIndex
+
+
+def index_of(timestamps=None, frames=None):
+    """FrameIndex with frame_N.jpg entries, optionally timestamped."""
+    frames = frames if frames is not None else range(len(timestamps))
+    entries = []
+    for k, n in enumerate(frames):
+        entry = {"frame": f"frame_{n}.jpg", "mood_label": 0, "scene_label": 0}
+        if timestamps is not None:
+            entry["timestamp"] = timestamps[k]
+        entries.append(entry)
+    return FrameIndex(entries)
+
+
+def test_index_match_is_exact():
+    telemetry = TelemetryIndex(index_of(frames=[0, 10, 20]), match="index")
+    assert [telemetry.lookup_row(n, 0.0) for n in (0, 10, 20)] == [0, 1, 2]
+    assert telemetry.lookup_row(5, 0.0) is None
+    assert telemetry.lookup(20, 0.0)["frame"] == "frame_20.jpg"
+
+
+def test_timestamp_match_picks_nearest_entry_in_the_frame_slot():
+    # period 1.0: slot k covers [k - 0.5, k + 0.5)
+    telemetry = TelemetryIndex(index_of([0.0, 0.9, 1.2, 3.0]), frame_period=1.0)
+    assert telemetry.lookup_row(0, 0.0) == 0
+    assert telemetry.lookup_row(1, 1.0) == 1     # 0.9 and 1.2 share slot 1; 0.9 is nearer
+    assert telemetry.lookup_row(2, 2.0) is None  # nothing in slot 2
+    assert telemetry.lookup_row(3, 3.0) == 3
+
+
+def test_half_period_timestamps_land_in_the_same_slot():
+    # 0.25 / 0.5 = 0.5 exactly: entries and frames must round it the same way
+    telemetry = TelemetryIndex(index_of([0.25, 0.75, 1.25]), frame_period=0.5)
+    assert [telemetry.lookup_row(i, t) for i, t in enumerate([0.25, 0.75, 1.25])] == [0, 1, 2]
+    assert telemetry.lookup_row(0, 0.0) is None
+    assert telemetry.lookup_row(1, 0.5) == 0
+
+
+@pytest.mark.parametrize("fps,stride", [(30.0, 10), (30.0, 1), (25.0, 8), (29.97, 3)])
+def test_every_entry_matches_at_most_one_frame(fps, stride):
+    # mapping entries every 0.33 s, no timestamps: times come from frame_N * 0.33
+    telemetry = TelemetryIndex(index_of(frames=range(300)), frame_period=stride / fps)
+    rows = [telemetry.lookup_row(i, i / fps) for i in range(0, int(300 * 0.33 * fps), stride)]
+    matched = [row for row in rows if row is not None]
+    assert len(matched) == len(set(matched))
+    if stride / fps >= 0.33:
+        assert len(matched) >= 0.95 * len(rows)   # sparse decode: nearly every frame has telemetry
+
+
+def test_unknown_match_mode():
+    with pytest.raises(ValueError):
+        TelemetryIndex(index_of([0.0]), match="nearest")
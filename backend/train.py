@@ -1,10 +1,21 @@
 import os
-import json
+import math
+import time
+import argparse
+import itertools
+import contextlib
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import Dataset, DataLoader, Sampler
 from torchvision import models, transforms
-from PIL import Image
+
+from image_io import load_rgb
+from frame_index import FrameIndex
+from checkpointing import AsyncCheckpointer, capture_rng_state, restore_rng_state
+from video_source import VideoDriveDataset, find_video
 
 # -------------------------------
 # Paths
@@ -17,15 +28,35 @@ FOLDERS = ["A", "B", "C", "D"]
 # -------------------------------
 # Model Definition
 # -------------------------------
+BACKBONES = ("resnet18", "mobilenet_v3_small", "shufflenet_v2_x0_5")
+
+
+def build_backbone(name):
+    """torchvision backbone with its classifier removed -> (module, pooled feature size)."""
+    if name == "resnet18":
+        base = models.resnet18(weights=None)
+        base.fc = nn.Identity()
+        return base, 512
+    if name == "mobilenet_v3_small":
+        base = models.mobilenet_v3_small(weights=None)
+        base.classifier = nn.Identity()
+        return base, 576
+    if name == "shufflenet_v2_x0_5":
+        base = models.shufflenet_v2_x0_5(weights=None)
+        base.fc = nn.Identity()
+        return base, 1024
+    raise ValueError(f"unknown backbone: {name} (choose from {', '.join(BACKBONES)})")
+
+
 class DriveModel(nn.Module):
-    def __init__(self, num_moods=5, num_scenes=6):
+    def __init__(self, num_moods=5, num_scenes=6, backbone="resnet18"):
         super().__init__()
 
-        self.base = models.resnet18(weights=None)
-        self.base.fc = nn.Identity()  # remove final classifier
+        self.backbone = backbone
+        self.base, feature_dim = build_backbone(backbone)  # final classifier removed
 
-        self.mood_head = nn.Linear(512, num_moods)
-        self.scene_head = nn.Linear(512, num_scenes)
+        self.mood_head = nn.Linear(feature_dim, num_moods)
+        self.scene_head = nn.Linear(feature_dim, num_scenes)
 
     def forward(self, x):
         features = self.base(x)
@@ -34,13 +65,40 @@ class DriveModel(nn.Module):
         return mood_logits, scene_logits
 
 
+def infer_architecture(state_dict):
+    """(backbone, num_moods, num_scenes) of a saved DriveModel state_dict."""
+    num_moods = state_dict["mood_head.weight"].shape[0]
+    num_scenes = state_dict["scene_head.weight"].shape[0]
+    keys = set(state_dict)
+    for backbone in BACKBONES:
+        if set(DriveModel(num_moods, num_scenes, backbone=backbone).state_dict()) == keys:
+            return backbone, num_moods, num_scenes
+    raise ValueError("state_dict does not match any DriveModel backbone")
+
+
+def load_drive_model(path, map_location="cpu"):
+    """
+    Load a model.pth saved from any DriveModel backbone (trained or
+    distilled student), in eval mode. The checkpoint stays a plain
+    state_dict; the backbone is recognised from its keys. weights_only:
+    a model file never needs to (and must not be able to) run pickled code.
+    """
+    state_dict = torch.load(path, map_location=map_location, weights_only=True)
+    backbone, num_moods, num_scenes = infer_architecture(state_dict)
+    model = DriveModel(num_moods, num_scenes, backbone=backbone)
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
+
+
 # -------------------------------
 # Dataset Loader
 # -------------------------------
 class DriveDataset(Dataset):
     def __init__(self, mapping_file, frame_dir):
-        with open(mapping_file, "r") as f:
-            self.data = json.load(f)
+        self.data = FrameIndex.load(mapping_file)
+        self.data.check_complete(telemetry=False)
+        self.data.check_frame_files()
 
         self.frame_dir = frame_dir
 
@@ -56,7 +114,7 @@ class DriveDataset(Dataset):
         entry = self.data[idx]
 
         img_path = os.path.join(self.frame_dir, entry["frame"])
-        img = Image.open(img_path).convert("RGB")
+        img = load_rgb(img_path)
         img = self.tf(img)
 
         mood = entry["mood_label"]
@@ -65,10 +123,56 @@ class DriveDataset(Dataset):
         return img, mood, scene
 
 
+# -------------------------------
+# Resumable shuffling
+# -------------------------------
+class ResumableSampler(Sampler):
+    """
+    Shuffles like DataLoader(shuffle=True), but the order of each epoch is a
+    pure function of (seed, epoch), so a run can resume mid-epoch by
+    skipping the samples it has already consumed.
+
+    With num_replicas > 1 it shards like DistributedSampler: the permutation
+    is padded to a multiple of num_replicas and rank r takes every
+    num_replicas-th index, so every rank sees the same number of samples.
+    """
+
+    def __init__(self, num_samples, seed=0, num_replicas=1, rank=0):
+        self.num_samples = num_samples
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.per_replica = math.ceil(num_samples / num_replicas)
+        self.epoch = 0
+        self.start = 0
+
+    def set_position(self, epoch, start=0):
+        """start counts samples of this rank's shard, not of the whole dataset."""
+        self.epoch = epoch
+        self.start = start
+
+    def __iter__(self):
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        order = torch.randperm(self.num_samples, generator=g).tolist()
+
+        total = self.per_replica * self.num_replicas
+        order += order[:total - len(order)]
+        shard = order[self.rank:total:self.num_replicas]
+        return iter(shard[self.start:])
+
+    def __len__(self):
+        return self.per_replica - self.start
+
+
 # -------------------------------
 # Load all datasets into one
 # -------------------------------
-def load_all_datasets():
+def load_all_datasets(source="frames", video_stride=None, video_match="timestamp", shuffle_buffer=0, seed=0):
+    """
+    source="frames": frame_N.jpg files referenced by the mapping (map-style)
+    source="video":  decode each folder's video file directly (streaming)
+    """
     datasets = []
 
     for folder in FOLDERS:
@@ -79,45 +183,264 @@ def load_all_datasets():
             print(f"⚠ Missing mapping_hardcoded.json for {folder}, skipping")
             continue
 
-        datasets.append(DriveDataset(mapping_path, folder_path))
+        if source == "video":
+            video_path = find_video(folder_path)
+            if video_path is None:
+                print(f"⚠ No video file in {folder}, skipping")
+                continue
+            tf = transforms.Compose([
+                transforms.Resize((224, 224)),
+                transforms.ToTensor()
+            ])
+            datasets.append(VideoDriveDataset(video_path, mapping_path, tf, stride=video_stride,
+                                              match=video_match, shuffle_buffer=shuffle_buffer, seed=seed))
+        else:
+            datasets.append(DriveDataset(mapping_path, folder_path))
 
     # Combine datasets
+    if source == "video":
+        return torch.utils.data.ChainDataset(datasets)
     return torch.utils.data.ConcatDataset(datasets)
 
 
 # -------------------------------
 # Training
 # -------------------------------
-if __name__ == "__main__":
-    dataset = load_all_datasets()
-    loader = DataLoader(dataset, batch_size=16, shuffle=True)
-
-    model = DriveModel()
-    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+def train(local_rank, args):
+    """
+    One training process. With world_size > 1 this is one rank of a
+    torch.distributed (gloo) data-parallel job; gradients are averaged by
+    DistributedDataParallel and only rank 0 logs, checkpoints and saves.
+    """
+    world_size = args.nnodes * args.nproc
+    rank = args.node_rank * args.nproc + local_rank
+    distributed = world_size > 1
+    is_main = rank == 0
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if distributed:
+        dist.init_process_group(
+            "gloo",
+            init_method=f"tcp://{args.master_addr}:{args.master_port}",
+            rank=rank,
+            world_size=world_size
+        )
+
+    dataset = load_all_datasets(args.source, video_stride=args.video_stride, video_match=args.video_match,
+                                shuffle_buffer=args.shuffle_buffer, seed=args.seed)
+    streaming = args.source == "video"
+
+    if streaming:
+        # Streaming video has no random access, so no sampler: order comes from
+        # each dataset's seeded shuffle buffer, and resume skips batches.
+        if distributed:
+            raise SystemExit("❌ --source video does not support data-parallel training yet")
+        sampler = None
+        loader = DataLoader(dataset, batch_size=args.batch_size, num_workers=args.num_workers)
+        # Each DataLoader worker batches its own video slices (a short last batch
+        # per worker) and batches are handed out round-robin in a fixed order,
+        # so count per worker; skipping start_batch batches then lands on the
+        # same sample as long as num_workers is unchanged.
+        workers = max(args.num_workers, 1)
+        per_worker = [sum(d.worker_counts(workers)[w] for d in dataset.datasets) for w in range(workers)]
+        batches_per_epoch = sum(math.ceil(n / args.batch_size) for n in per_worker)
+    else:
+        sampler = ResumableSampler(len(dataset), seed=args.seed, num_replicas=world_size, rank=rank)
+        loader = DataLoader(dataset, batch_size=args.batch_size, sampler=sampler,
+                            num_workers=args.num_workers)
+        batches_per_epoch = math.ceil(sampler.per_replica / args.batch_size)
+
+    model = DriveModel(backbone=args.backbone)
+    if args.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
     criterion = nn.CrossEntropyLoss()
 
-    EPOCHS = 4
+    # --------------------
+    # RESUME
+    # --------------------
+    start_epoch, start_batch = 0, 0
+    running_loss = 0.0
+    opt_steps = 0   # across epochs; sets the checkpoint cadence
+
+    # Every rank loads the same checkpoint, so all replicas start identical
+    if args.resume and os.path.exists(args.checkpoint_path):
+        ckpt = torch.load(args.checkpoint_path, map_location="cpu", weights_only=False)
+        if ckpt.get("world_size", 1) != world_size:
+            raise SystemExit(f"❌ Checkpoint was written with world_size={ckpt.get('world_size', 1)}, "
+                             f"this run has {world_size}")
+        if streaming and ckpt.get("num_workers", 0) != args.num_workers:
+            # worker slices and shuffle seeds depend on it: the batch order would differ
+            raise SystemExit(f"❌ Checkpoint was written with --num-workers {ckpt.get('num_workers', 0)}; "
+                             f"resume --source video with the same value")
+        model.load_state_dict(ckpt["model"])
+        optimizer.load_state_dict(ckpt["optimizer"])
+        restore_rng_state(ckpt["rng"])
+        if sampler is not None:
+            sampler.seed = ckpt["seed"]
+        start_epoch, start_batch = ckpt["epoch"], ckpt["batch"]
+        running_loss = ckpt["running_loss"]
+        opt_steps = ckpt.get("opt_steps", 0)
+        if is_main:
+            print(f"♻️  Resumed from {args.checkpoint_path} at epoch {start_epoch}, batch {start_batch}")
+    elif args.resume and is_main:
+        print(f"⚠ No checkpoint at {args.checkpoint_path}, starting from scratch")
+
+    checkpointer = AsyncCheckpointer(args.checkpoint_path) if args.checkpoint_every and is_main else None
+
+    def save_checkpoint(epoch, batch, running_loss):
+        checkpointer.save({
+            "model": model.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "epoch": epoch,
+            "batch": batch,              # batches of `epoch` already consumed (per rank)
+            "seed": sampler.seed if sampler is not None else args.seed,
+            "world_size": world_size,
+            "num_workers": args.num_workers,
+            "running_loss": running_loss,
+            "opt_steps": opt_steps,
+            "rng": capture_rng_state(),
+        })
+
+    # DDP wraps the (possibly channels_last) module; state_dict() is still
+    # taken from `model` so saved keys have no "module." prefix.
+    ddp_model = DistributedDataParallel(model) if distributed else model
+
+    # Compile a wrapper but keep `model` for state_dict(), so the saved keys
+    # stay loadable by the server (no "_orig_mod." prefix).
+    train_model = torch.compile(ddp_model) if args.compile else ddp_model
+
+    if is_main:
+        print(f"⚙️  world_size={world_size} bf16={args.bf16} channels_last={args.channels_last} "
+              f"compile={args.compile} batch={args.batch_size} x accum={args.accum_steps} x ranks={world_size} "
+              f"(effective {args.batch_size * args.accum_steps * world_size})")
+
+    for epoch in range(start_epoch, args.epochs):
+        model.train()
+        if start_batch == 0:
+            running_loss = 0.0
+        epoch_samples = 0
+        epoch_start = time.perf_counter()
+
+        if streaming:
+            for video_dataset in dataset.datasets:
+                video_dataset.set_epoch(epoch)
+            batches = itertools.islice(loader, start_batch, None)
+        else:
+            sampler.set_position(epoch, start_batch * args.batch_size)
+            batches = loader
+
+        optimizer.zero_grad()
+
+        for step, (imgs, mood, scene) in enumerate(batches, start=start_batch + 1):
+            if args.channels_last:
+                imgs = imgs.contiguous(memory_format=torch.channels_last)
+
+            boundary = step % args.accum_steps == 0 or step == batches_per_epoch
+
+            # Skip the gradient all-reduce until the accumulation window closes
+            sync = ddp_model.no_sync() if distributed and not boundary else contextlib.nullcontext()
+
+            with sync:
+                with torch.autocast("cpu", dtype=torch.bfloat16, enabled=args.bf16):
+                    mood_logits, scene_logits = train_model(imgs)
+
+                    loss_mood = criterion(mood_logits, mood)
+                    loss_scene = criterion(scene_logits, scene)
+                    loss = loss_mood + loss_scene
+
+                # Average over the accumulation window so lr means the same thing
+                (loss / args.accum_steps).backward()
 
-    for epoch in range(EPOCHS):
-        running_loss = 0.0
+            running_loss += loss.item()
+            epoch_samples += imgs.size(0)
 
-        for imgs, mood, scene in loader:
-            optimizer.zero_grad()
+            if boundary:
+                optimizer.step()
+                optimizer.zero_grad()
+                opt_steps += 1
 
-            mood_logits, scene_logits = model(imgs)
+                # Only on accumulation boundaries, so no partial gradients are lost
+                if checkpointer and opt_steps % args.checkpoint_every == 0 and step < batches_per_epoch:
+                    save_checkpoint(epoch, step, running_loss)
 
-            loss_mood = criterion(mood_logits, mood)
-            loss_scene = criterion(scene_logits, scene)
-            loss = loss_mood + loss_scene
+        elapsed = time.perf_counter() - epoch_start
 
-            loss.backward()
-            optimizer.step()
+        if distributed:
+            totals = torch.tensor([running_loss, float(epoch_samples)], dtype=torch.float64)
+            dist.all_reduce(totals)
+            epoch_loss, total_samples = totals[0].item() / world_size, totals[1].item()
+        else:
+            epoch_loss, total_samples = running_loss, epoch_samples
 
-            running_loss += loss.item()
+        if is_main:
+            print(f"Epoch {epoch} | Loss: {epoch_loss:.4f} | "
+                  f"{total_samples / elapsed:.1f} samples/s ({elapsed:.1f}s)")
+        start_batch = 0
 
-        print(f"Epoch {epoch} | Loss: {running_loss:.4f}")
+        if checkpointer:
+            save_checkpoint(epoch + 1, 0, 0.0)
+
+    if checkpointer:
+        checkpointer.close()
 
     # Save model
-    out_path = os.path.join(SCRIPT_DIR, "model.pth")
-    torch.save(model.state_dict(), out_path)
-    print(f"✅ Saved model to {out_path}")
+    if is_main:
+        out_path = os.path.join(SCRIPT_DIR, "model.pth")
+        torch.save(model.state_dict(), out_path)
+        print(f"✅ Saved model to {out_path}")
+
+    if distributed:
+        dist.barrier()
+        dist.destroy_process_group()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the Drive Sense model on folders A–D")
+    parser.add_argument("--epochs", type=int, default=4)
+    parser.add_argument("--backbone", choices=BACKBONES, default="resnet18",
+                        help="image backbone (smaller ones trade accuracy for CPU latency)")
+    parser.add_argument("--batch-size", type=int, default=16, help="per-process batch size")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--num-workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast on CPU")
+    parser.add_argument("--channels-last", action="store_true", help="channels_last memory format")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the model")
+    parser.add_argument("--accum-steps", type=int, default=1,
+                        help="gradient accumulation steps (effective batch = batch-size x accum-steps)")
+    parser.add_argument("--seed", type=int, default=0, help="shuffle seed")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="write a checkpoint every N optimizer steps (0 = off)")
+    parser.add_argument("--checkpoint-path", default=os.path.join(SCRIPT_DIR, "checkpoint.pt"))
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint-path")
+
+    # Frame source
+    parser.add_argument("--source", choices=["frames", "video"], default="frames",
+                        help="read extracted frame_N.jpg files, or decode each folder's video directly")
+    parser.add_argument("--video-stride", type=int,
+                        help="decode every N-th video frame (default: ~one frame per telemetry entry)")
+    parser.add_argument("--video-match", choices=["timestamp", "index"], default="timestamp",
+                        help="match video frames to telemetry by time or by frame_N index")
+    parser.add_argument("--shuffle-buffer", type=int, default=512,
+                        help="--source video: samples held for streaming shuffle")
+
+    # Data-parallel (torch.distributed, gloo backend)
+    parser.add_argument("--nproc", type=int, default=1, help="training processes on this node")
+    parser.add_argument("--nnodes", type=int, default=1, help="number of nodes")
+    parser.add_argument("--node-rank", type=int, default=0, help="rank of this node (0 .. nnodes-1)")
+    parser.add_argument("--master-addr", default="127.0.0.1", help="address of node 0")
+    parser.add_argument("--master-port", type=int, default=29500)
+    parser.add_argument("--threads", type=int,
+                        help="PyTorch threads per process (default: cores / nproc when nproc > 1)")
+    args = parser.parse_args()
+
+    if args.nproc > 1 and args.threads is None:
+        args.threads = max(1, (os.cpu_count() or 1) // args.nproc)
+
+    if args.nproc * args.nnodes > 1:
+        mp.spawn(train, args=(args,), nprocs=args.nproc, join=True)
+    else:
+        train(0, args)
@@ -0,0 +1,294 @@
+import os
+import glob
+import queue
+import random
+import threading
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import IterableDataset, get_worker_info
+
+from frame_index import FrameIndex, META_FIELDS
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+MAPPING_FRAME_INTERVAL = 0.33   # seconds between frame_N.jpg files in the mapping
+
+_END = object()  # end-of-stream marker on the decode queue
+
+
+def find_video(folder_path):
+    """First video file in a dataset folder, or None."""
+    for ext in VIDEO_EXTENSIONS:
+        matches = sorted(glob.glob(os.path.join(folder_path, f"*{ext}")))
+        if matches:
+            return matches[0]
+    return None
+
+
+def auto_stride(fps, frame_interval=MAPPING_FRAME_INTERVAL):
+    """Stride that decodes about one video frame per telemetry entry (10 at 30 fps)."""
+    return max(1, round(fps * frame_interval))
+
+
+# -------------------------------
+# Decoding
+# -------------------------------
+class VideoFrameSource:
+    """
+    Decodes frames straight from a video file on a background thread.
+
+    Iterating yields (video_frame_index, timestamp_s, frame_bgr) for every
+    `stride`-th frame between start_frame and end_frame (stride None: about
+    one frame per telemetry entry, see auto_stride). Skipped frames are
+    only grab()bed (demuxed, not converted), so a large stride is cheap.
+    A bounded queue keeps the decoder at most `queue_size` frames ahead.
+    """
+
+    def __init__(self, video_path, stride=None, start_frame=0, end_frame=None, queue_size=32):
+        self.video_path = video_path
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.queue_size = queue_size
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video: {video_path}")
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        self.stride = auto_stride(self.fps) if stride is None else max(1, stride)
+
+    @property
+    def frame_period(self):
+        """Seconds between two yielded frames."""
+        return self.stride / self.fps
+
+    def __iter__(self):
+        frames = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        thread = threading.Thread(target=self._decode, args=(frames, stop), daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                item = frames.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # unblock the decoder if it is waiting on a full queue
+            while thread.is_alive():
+                try:
+                    frames.get_nowait()
+                except queue.Empty:
+                    thread.join(timeout=0.1)
+
+    def _decode(self, frames, stop):
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            if self.start_frame:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+
+            index = self.start_frame
+            while not stop.is_set():
+                if self.end_frame is not None and index >= self.end_frame:
+                    break
+                if not cap.grab():
+                    break
+
+                if (index - self.start_frame) % self.stride == 0:
+                    ok, frame = cap.retrieve()
+                    if not ok:
+                        break
+                    frames.put((index, index / self.fps, frame))
+                index += 1
+        except Exception as e:
+            frames.put(e)
+        finally:
+            cap.release()
+            frames.put(_END)
+
+
+# -------------------------------
+# Telemetry matching
+# -------------------------------
+class TelemetryIndex:
+    """
+    Matches decoded video frames to rows of a FrameIndex (telemetry + labels).
+
+    match="index":     video frame N  <-> mapping entry frame_N.jpg
+    match="timestamp": time is cut into slots of frame_period (the time
+                       between decoded frames, stride / fps). An entry
+                       belongs to the slot nearest its time, and a frame
+                       matches the nearest entry in its own slot.
+
+    So every entry matches at most one decoded frame, however much denser
+    the video is than the telemetry (a 30 fps video doesn't turn each
+    0.33 s entry into ~10 duplicate samples), and every frame at most one
+    entry. Slots are integers, so frames on a slot boundary can't match twice.
+
+    Works on the index's columns (two sorted numpy arrays: key + row), so
+    matching costs no per-entry Python objects. Entry times are the
+    mapping's "timestamp", else frame_N * frame_interval.
+    """
+
+    def __init__(self, index, match="timestamp", frame_interval=MAPPING_FRAME_INTERVAL, frame_period=None):
+        self.index = index
+        self.match = match
+        self.period = frame_period or frame_interval
+
+        numbers = index.frame_numbers
+        if match == "index":
+            keys = numbers.astype(np.float64)
+            valid = numbers >= 0
+        elif match == "timestamp":
+            keys = np.where(np.isnan(index.timestamps), numbers * frame_interval, index.timestamps)
+            valid = ~np.isnan(index.timestamps) | (numbers >= 0)
+        else:
+            raise ValueError(f"unknown match mode: {match}")
+
+        rows = np.flatnonzero(valid)
+        self.rows = rows[np.argsort(keys[rows], kind="stable")]
+        self.keys = keys[self.rows]
+        self.slots = self.slot(self.keys)
+
+    def slot(self, t):
+        """Slot of time(s) `t`: nearest multiple of the period, halves rounding up (entries and frames alike)."""
+        return np.floor(np.asarray(t, dtype=np.float64) / self.period + 0.5).astype(np.int64)
+
+    def lookup_row(self, frame_index, timestamp):
+        """Index row for a decoded frame, or None if nothing matches."""
+        if self.match == "index":
+            pos = int(np.searchsorted(self.keys, frame_index))
+            if pos < len(self.keys) and self.keys[pos] == frame_index:
+                return int(self.rows[pos])
+            return None
+
+        slot = int(self.slot(timestamp))
+        lo, hi = np.searchsorted(self.slots, [slot, slot + 1])
+        if lo == hi:
+            return None
+        nearest = lo + int(np.argmin(np.abs(self.keys[lo:hi] - timestamp)))
+        return int(self.rows[nearest])
+
+    def lookup(self, frame_index, timestamp):
+        """Mapping entry (FrameRecord) for a decoded frame, or None if nothing matches."""
+        row = self.lookup_row(frame_index, timestamp)
+        return None if row is None else self.index[row]
+
+
+def iter_matched_frames(source, telemetry):
+    """(frame_index, timestamp_s, frame_bgr, entry) for decoded frames that have telemetry."""
+    for frame_index, timestamp, frame in source:
+        entry = telemetry.lookup(frame_index, timestamp)
+        if entry is not None:
+            yield frame_index, timestamp, frame, entry
+
+
+# -------------------------------
+# Training dataset
+# -------------------------------
+def meta_vector(m):
+    return torch.tensor([m[field] for field in META_FIELDS], dtype=torch.float32)
+
+
+class VideoDriveDataset(IterableDataset):
+    """
+    Streams (img, mood, scene) — or (img, meta, mood, scene) with
+    with_meta=True, like dataset.DriveDataset — straight from a video file,
+    with labels/telemetry from the mapping JSON.
+
+    DataLoader workers each decode a contiguous slice of the video. Order is
+    randomised with a shuffle buffer seeded by (seed, epoch), so an epoch's
+    order is reproducible.
+    """
+
+    def __init__(self, video_path, mapping_path, transform, stride=None, match="timestamp",
+                 with_meta=False, shuffle_buffer=0, seed=0):
+        entries = FrameIndex.load(mapping_path)
+        entries.check_complete(labels=True, telemetry=with_meta)
+
+        self.video_path = video_path
+        self.transform = transform
+        self.with_meta = with_meta
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = 0
+
+        probe = VideoFrameSource(video_path, stride=stride)
+        self.stride = probe.stride
+        self.frame_count = probe.frame_count
+        self.telemetry = TelemetryIndex(entries, match=match, frame_period=probe.frame_period)
+
+        # Exact sample count without decoding: which strided frames have telemetry
+        self.matched_frames = np.array([
+            index for index in range(0, self.frame_count, self.stride)
+            if self.telemetry.lookup_row(index, index / probe.fps) is not None
+        ], dtype=np.int64)
+        self.num_samples = len(self.matched_frames)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def worker_range(self, worker_id, num_workers):
+        """[start, end) video frames DataLoader worker `worker_id` decodes (stride-aligned slices)."""
+        per_worker = -(-self.frame_count // num_workers)
+        per_worker += (-per_worker) % self.stride
+        start = worker_id * per_worker
+        return start, min(self.frame_count, start + per_worker)
+
+    def worker_counts(self, num_workers):
+        """Samples each of `num_workers` DataLoader workers yields per epoch."""
+        counts = []
+        for worker_id in range(num_workers):
+            start, end = self.worker_range(worker_id, num_workers)
+            lo, hi = np.searchsorted(self.matched_frames, [start, end])
+            counts.append(int(hi - lo))
+        return counts
+
+    def _sample(self, frame, entry):
+        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if self.transform:
+            img = self.transform(img)
+
+        mood = torch.tensor(entry["mood_label"], dtype=torch.long)
+        scene = torch.tensor(entry["scene_label"], dtype=torch.long)
+
+        if self.with_meta:
+            return img, meta_vector(entry["metadata"]), mood, scene
+        return img, mood, scene
+
+    def __iter__(self):
+        # Split the video into contiguous, stride-aligned slices per worker
+        worker = get_worker_info()
+        num_workers, worker_id = (1, 0) if worker is None else (worker.num_workers, worker.id)
+        start, end = self.worker_range(worker_id, num_workers)
+
+        source = VideoFrameSource(self.video_path, stride=self.stride, start_frame=start, end_frame=end)
+        samples = (self._sample(frame, entry)
+                   for _, _, frame, entry in iter_matched_frames(source, self.telemetry))
+
+        if not self.shuffle_buffer:
+            yield from samples
+            return
+
+        rng = random.Random(self.seed * 1_000_003 + self.epoch * 1_009 + worker_id)
+        buffer = []
+        for sample in samples:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            k = rng.randrange(len(buffer))
+            yield buffer[k]
+            buffer[k] = sample
+        rng.shuffle(buffer)
+        yield from buffer